@@ -0,0 +1,80 @@
+"""Times the farm phase with the HarvestScheduler against the sequential path.
+
+Run from the src/benchmarks directory with src on the PYTHONPATH:
+
+    python harvest_scaling.py [num_pixels] [num_households] [years]
+
+A synthetic valley of num_pixels (default 4 * 10^6) is populated with
+num_households (default 5000) households. Every configuration farms the same
+claims from the same state for the given number of years (default 3), and
+the best of five runs is reported.
+
+The only machine this was measured on has a single CPU, where the threads can
+only add overhead and no speedup was measured (defaults, 2450x1632 map):
+
+     threads     seconds   speedup
+  sequential      0.191s     1.00x
+           1      0.185s     1.03x
+           2      0.313s     0.61x
+
+Whether the scheduler pays off with several CPUs is still to be measured.
+"""
+import copy
+import os
+import random
+import sys
+import time
+
+from simulation.config import Config
+from simulation.environment import Environment
+from simulation.harvest import HarvestScheduler
+from simulation.synthetic import synthetic_maps
+from simulation import simulation_driver
+
+
+def time_farm(households, environment, years, scheduler=None, repeats=5):
+    """Returns the best seconds taken by years farm phases and the grain harvested."""
+    best = None
+    for _ in range(repeats):
+        run_households, run_environment = copy.deepcopy((households, environment))
+        simulation = simulation_driver.Simulation(run_households, run_environment, years,
+                                                  scheduler=scheduler)
+        elapsed = 0.0
+        for year in range(years):
+            random.seed(year)
+            start = time.perf_counter()
+            simulation.farm_phase()
+            elapsed += time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, sum(house.grain for house in simulation.households)
+
+
+def main():
+    num_pixels = int(float(sys.argv[1])) if len(sys.argv) > 1 else 4 * 10**6
+    num_households = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    years = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    ncols = int((num_pixels * 2 / 3) ** 0.5)
+    shape = (num_pixels // ncols, ncols)
+    config = Config.load('../var_config.yml', '../const_config.yml',
+                         num_households=num_households)
+    river_map, fertility_map, shape = synthetic_maps(shape, seed=0)
+    environment = Environment(river_map, fertility_map, shape, config)
+    random.seed(0)
+    households = simulation_driver.setup_households(environment, config)
+
+    sequential, grain = time_farm(households, environment, years)
+    print('{0}x{1} map, {2} households, {3} years, {4} CPUs'.format(
+        shape[0], shape[1], num_households, years, os.cpu_count()))
+    print('{0:>12}{1:>12}{2:>10}'.format('threads', 'seconds', 'speedup'))
+    print('{0:>12}{1:>11.3f}s{2:>9.2f}x'.format('sequential', sequential, 1.0))
+    threads = 1
+    while threads <= 2 * (os.cpu_count() or 1):
+        with HarvestScheduler(threads, min_batch=1) as scheduler:
+            seconds, scheduled_grain = time_farm(households, environment, years, scheduler)
+        assert scheduled_grain == grain
+        print('{0:>12}{1:>11.3f}s{2:>9.2f}x'.format(threads, seconds, sequential / seconds))
+        threads *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Reports the memory used per Household object.
+
+Run from the src/benchmarks directory with src on the PYTHONPATH:
+
+    python household_memory.py [num_households]
+"""
+import sys
+import tracemalloc
+import uuid
+
+import numpy as np
+
+from model.agent_model import AgentModel
+from simulation.environment import Environment
+from simulation.household import Household, HouseholdConstants
+from simulation import simulation_driver
+
+
+def measure_household_memory(num_households, const_config, var_config, environment):
+    """Creates num_households households and returns the bytes used per household.
+
+    The shared model and constants objects are created before tracing starts,
+    so the result reflects the marginal cost of each additional household,
+    including its id and position tuple.
+    """
+    model = AgentModel()
+    constants = HouseholdConstants.from_config(const_config)
+    household_config = var_config['households']
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    households = [Household(model, uuid.uuid1(), household_config['num_workers'],
+                            household_config['grain'], household_config['worker_capability'],
+                            household_config['min_competency'], household_config['min_ambition'],
+                            constants, environment)
+                  for _ in range(num_households)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / len(households)
+
+
+def main():
+    num_households = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    var_config = simulation_driver.load_config('../var_config.yml')
+    const_config = simulation_driver.load_config('../const_config.yml')
+    river_map = np.zeros((600, 400), dtype=np.float32)
+    environment = Environment(river_map, np.copy(river_map), river_map.shape, const_config)
+    per_household = measure_household_memory(num_households, const_config, var_config,
+                                             environment)
+    print('{0} households: {1:.1f} bytes per household'.format(num_households, per_household))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Times map generation, river distances, setup and flooding on synthetic valleys.
+
+Run from the src/benchmarks directory with src on the PYTHONPATH:
+
+    python map_scaling.py [max_pixels]
+
+The maps grow from 10^5 pixels by factors of ten up to max_pixels (default
+10^6). Maps of 10^8 pixels and more are memory mapped in a temporary
+directory.
+"""
+import sys
+import tempfile
+import time
+
+from simulation.config import Config
+from simulation.environment import Environment, distance_to_river
+from simulation.synthetic import synthetic_maps
+
+# Maps with at least this many pixels are generated into memory mapped files.
+MEMMAP_PIXELS = 10**8
+
+
+def time_map(num_pixels, const_config, directory=None):
+    """Returns the shape of a map and the seconds taken by each stage."""
+    ncols = int((num_pixels * 2 / 3) ** 0.5)
+    nrows = num_pixels // ncols
+    start = time.perf_counter()
+    river_map, fertility_map, shape = synthetic_maps((nrows, ncols), seed=0,
+                                                     directory=directory)
+    generated = time.perf_counter()
+    river_distance = distance_to_river(river_map)
+    measured = time.perf_counter()
+    environment = Environment(river_map, fertility_map, shape, const_config,
+                              river_distance=river_distance)
+    created = time.perf_counter()
+    environment.FLOOD_FREQ = 1
+    environment.flood(0)
+    flooded = time.perf_counter()
+    return (shape, generated - start, measured - generated, created - measured,
+            flooded - created)
+
+
+def main():
+    max_pixels = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**6
+    const_config = Config.load('../var_config.yml', '../const_config.yml')
+    print('{0:>14}{1:>12}{2:>12}{3:>12}{4:>12}'.format('shape', 'generate', 'distance',
+                                                     'setup', 'flood'))
+    num_pixels = 10**5
+    while num_pixels <= max_pixels:
+        with tempfile.TemporaryDirectory() as directory:
+            shape, *seconds = time_map(
+                num_pixels, const_config, directory if num_pixels >= MEMMAP_PIXELS else None)
+        print('{0:>14}{1:>11.3f}s{2:>11.3f}s{3:>11.3f}s{4:>11.3f}s'.format(
+            '{0}x{1}'.format(*shape), *seconds))
+        num_pixels *= 10
+
+
+if __name__ == "__main__":
+    main()
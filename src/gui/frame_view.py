@@ -4,6 +4,9 @@ import matplotlib.colors as mcolors
 import matplotlib.pyplot as plt
 import numpy as np
 
+from gui.render_policy import RenderPolicy
+from simulation.metrics import GiniCoefficient
+
 
 class FrameView():
     """Acts upon data from the presenter and saves data in the relevant format.
@@ -14,14 +17,24 @@ class FrameView():
             of the simulation.
         gini_df: pandas DataFrame containing gini-coefficient statistics for
             every year of the simulation.
+        render_policy: RenderPolicy that decides which years are rendered.
+        renderer: Optional rasterizer.Rasterizer that renders headless map
+            frames instead of the matplotlib figure.
+        frames: List of the generations for which a frame has been saved.
     """
 
-    def __init__(self, presenter):
+    def __init__(self, presenter, render_policy=None, renderer=None):
         """Initialise FrameView attributes upon object instantiation.
 
         The presenter has the FrameView as an attribute and the FrameView has
         the presenter as an attribute. This is to facilitate the flow of
         information between these two layers.
+
+        Args:
+            presenter: Presenter singleton object.
+            render_policy: RenderPolicy that decides which years are rendered.
+                Defaults to rendering every year.
+            renderer: Optional rasterizer.Rasterizer used by save_frame.
         """
         self._FRAME_PATH = '../../resources/frames/'
         self._RIVER_BLUE = (102, 178, 255)
@@ -31,14 +44,43 @@ class FrameView():
         self.presenter = presenter
         self.pop_df = pd.DataFrame(columns=['generation', 'population'])
         self.gini_df = pd.DataFrame(columns=['generation', 'gini-coefficient'])
+        self._gini = GiniCoefficient()
+        self.render_policy = render_policy or RenderPolicy()
+        self.renderer = renderer
+        self.frames = []
 
-    def save_frame(self):
+    def update(self):
+        """Records the statistics of the current year and renders it if due.
+
+        Statistics are recorded every year, whereas a frame is only saved when
+        the render_policy selects the current year.
+        """
+        statistics = self.presenter.statistics()
+        self.record_population(statistics)
+        self.record_gini(statistics)
+        generation = self.presenter.get_generation()
+        num_generations = self.presenter.get_num_generations()
+        if self.render_policy.should_render(generation, num_generations, self):
+            self.save_frame(statistics)
+
+    def save_frame(self, statistics=None):
         """Save household and landscape information as a frame.
 
         The relevant information is plotted as a matplotlib figure which is then
-        saved as a png file under the resources/frames folder.
+        saved as a png file under the resources/frames folder. The population
+        and gini-coefficient graphs show the statistics recorded so far.
+
+        Args:
+            statistics: Household statistics of the current year. Retrieved
+                from the presenter if not supplied.
         """
-        statistics = self.presenter.statistics()
+        if statistics is None:
+            statistics = self.presenter.statistics()
+        if self.renderer is not None:
+            generation = self.presenter.get_generation()
+            self.renderer.save_frame(statistics, self.presenter.fertility_map(), generation)
+            self.frames.append(generation)
+            return
         river_map = self.presenter.river_map()
         fertility_map = self.presenter.fertility_map()
         river_img = self.river_img(river_map)
@@ -59,13 +101,11 @@ class FrameView():
         sim_axis.scatter(x_pos, y_pos, s=area, color=rgba, edgecolors=edges)
         sim_axis.imshow(display)
 
-        self.record_population(statistics)
         graph_1_axis = plt.subplot(grid[0, 1])
         graph_1_axis.set_title('Total Population')
         graph_1_axis.set_xlim([0, self.presenter.get_num_generations() - 1])
         graph_1_axis.plot(self.pop_df['generation'], self.pop_df['population'])
 
-        self.record_gini(statistics)
         graph_2_axis = plt.subplot(grid[1, 1])
         graph_2_axis.set_title('Gini-coefficient')
         graph_2_axis.set_xlim([0, self.presenter.get_num_generations() - 1])
@@ -75,6 +115,7 @@ class FrameView():
         path = self._FRAME_PATH + 'yr_{0}'.format(self.presenter.get_generation())
         plt.savefig(path)
         plt.close('all')
+        self.frames.append(self.presenter.get_generation())
 
     def river_img(self, river_map):
         """Converts river_map into river_img and returns as numpy.ndarray.
@@ -161,13 +202,6 @@ class FrameView():
     def record_gini(self, statistics):
         """Generates and updates gini-coefficient statistic."""
         generation = self.presenter.get_generation()
-        total_grain = statistics['grain'].sum()
-        grain = np.sort(statistics['grain'])
-        wealth_prop = grain/total_grain if total_grain else grain * 0
-        num_households = len(statistics)
-        pop_prop = np.ones(num_households)/num_households
-        richer_prop = np.linspace(num_households - 1, 0, num=num_households)/num_households
-        score = wealth_prop * (pop_prop + 2 * richer_prop)
-        gini = 1 - score.sum()
+        gini = self._gini(statistics['grain'].to_numpy(dtype=np.float64))
         row = {'generation':generation, 'gini-coefficient':gini}
         self.gini_df = self.gini_df.append(row, ignore_index=True)
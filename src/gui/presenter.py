@@ -4,6 +4,7 @@ import tkinter as tk
 import pandas as pd
 
 from gui.frame_view import FrameView
+from gui.pyramid import FertilityPyramid
 from gui.user_view import UserView
 
 class Presenter:
@@ -23,13 +24,24 @@ class Presenter:
         root: Parameter for UserView instantiation.
         progress_var: Parameter for UserView instantiation.
         user_view: Main window of the application.
+        pyramid: FertilityPyramid backing the zoomable map view, built when
+            the map is first viewed.
     """
 
-    def __init__(self, simulation):
-        """Initialise presenter attributes upon object instantiation."""
+    def __init__(self, simulation, render_policy=None, renderer=None):
+        """Initialise presenter attributes upon object instantiation.
+
+        Args:
+            simulation: The singleton simulation object.
+            render_policy: RenderPolicy that decides which years the
+                frame_view renders. Defaults to rendering every year.
+            renderer: Optional rasterizer.Rasterizer that the frame_view
+                renders headless map frames with instead of matplotlib.
+        """
         self.simulation = simulation
         self.columns = simulation.households[0].columns
-        self.frame_view = FrameView(self)
+        self.frame_view = FrameView(self, render_policy, renderer)
+        self.pyramid = None
         self.root = tk.Tk()
         self.progress_var = tk.IntVar()
         self.user_view = UserView(self, self.progress_var, master=self.root)
@@ -37,7 +49,7 @@ class Presenter:
     def start_application(self):
         """Initialises the main window of the application."""
         self.root.wm_title("Egypt Application")
-        self.root.geometry("300x360")
+        self.root.geometry("300x410")
         self.root.style = ttk.Style()
         self.root.style.theme_use("clam")
         self.root.mainloop()
@@ -62,10 +74,50 @@ class Presenter:
         """Retrieves and returns fertility_map from the environment."""
         return self.simulation.environment.fertility_map
 
+    def map_shape(self):
+        """Retrieves and returns the shape of the environment's maps."""
+        return self.simulation.environment.shape
+
+    def map_view(self, bounds, width, height):
+        """Returns an RGB image of a region of the current fertility_map.
+
+        Args:
+            bounds: Tuple (x_start, y_start, x_end, y_end) of the region in
+                map pixels.
+            width: Width of the image in pixels.
+            height: Height of the image in pixels.
+        """
+        environment = self.simulation.environment
+        if self.pyramid is None:
+            self.pyramid = FertilityPyramid(environment)
+        else:
+            self.pyramid.refresh(environment)
+        return self.pyramid.view(*bounds, width, height)
+
     def update(self):
-        """Tells the frame_view to save the current simulation state as a frame."""
+        """Tells the frame_view to record the current year and render it if due."""
+        self.frame_view.update()
+
+    def observe(self, simulation):
+        """Allows the presenter to be used as an observer of Simulation.run."""
+        self.update()
+
+    def capture_frame(self):
+        """Saves the current simulation state as a frame regardless of policy."""
         self.frame_view.save_frame()
 
+    def set_render_policy(self, render_policy):
+        """Replaces the policy that decides which years are rendered."""
+        self.frame_view.render_policy = render_policy
+
+    def memory_report(self):
+        """Returns a memory.MemoryReport of the simulation and the views."""
+        return self.simulation.memory_report(self)
+
+    def get_frames(self):
+        """Retrieves and returns the generations that have been rendered."""
+        return self.frame_view.frames
+
     def get_num_generations(self):
         """Retrieves and returns the number of generations in the simulation."""
         return self.simulation.num_generations
@@ -0,0 +1,258 @@
+"""Multi-resolution pyramids of the fertility_map for zoomable map viewing.
+
+Level 0 of a FertilityPyramid is the fertility_map itself. Every further level
+halves the resolution of the one below it by averaging blocks of 2x2 pixels,
+until a level fits within a single tile. A view of any region of the map is
+composed from the tiles of the one level whose resolution matches the view,
+so its cost depends on the size of the view rather than of the map.
+
+The pyramid is refreshed incrementally: only the tiles whose fertility the
+Environment has changed (harvested, regenerated or flooded) since the
+previous refresh, as recorded in its tile_changes, are recomputed.
+"""
+import math
+
+import numpy as np
+
+from gui.rasterizer import RIVER_BLUE, fertility_lut
+
+# Fraction of changed tiles above which a level is rebuilt in one pass.
+REBUILD_FRACTION = 0.25
+
+
+def reduce_block(source, y_start, y_end, x_start, x_end):
+    """Returns the 2x2 block means of source for a rectangle of the next level.
+
+    The rectangle is given in the coordinates of the next level. Blocks that
+    extend beyond an odd-sized source repeat its last row or column.
+    """
+    nrows, ncols = source.shape
+    rows = np.minimum(np.arange(2 * y_start, 2 * y_end), nrows - 1)
+    cols = np.minimum(np.arange(2 * x_start, 2 * x_end), ncols - 1)
+    if 2 * y_end <= nrows and 2 * x_end <= ncols:
+        block = source[2 * y_start:2 * y_end, 2 * x_start:2 * x_end]
+    else:
+        block = source[rows[:, None], cols[None, :]]
+    height, width = y_end - y_start, x_end - x_start
+    return block.reshape(height, 2, width, 2).mean(axis=(1, 3), dtype=np.float32)
+
+
+def build_levels(base, tile_size):
+    """Returns the levels above base, halving until a level fits in a tile."""
+    levels = []
+    level = base
+    while max(level.shape) > tile_size:
+        nrows, ncols = level.shape
+        level = reduce_block(level, 0, -(-nrows // 2), 0, -(-ncols // 2))
+        levels.append(level)
+    return levels
+
+
+class FertilityPyramid:
+    """Keeps a mip-map pyramid of a fertility_map and composes views from it.
+
+    Attributes:
+        tile_size: Side length in pixels of the tiles views are composed of.
+        levels: List of the levels, level 0 being the fertility_map.
+        river_levels: List of the levels of the river_map, whose pixels hold
+            the fraction of river they cover.
+        tiles_fetched: Number of fertility and river tiles read by the last
+            view.
+    """
+
+    def __init__(self, environment, tile_size=256):
+        """Builds every level of the pyramid of an environment's maps."""
+        self.tile_size = tile_size
+        fertility_map = environment.fertility_map
+        self.levels = [fertility_map] + build_levels(fertility_map, tile_size)
+        river_map = np.asarray(environment.river_map, dtype=np.float32)
+        self.river_levels = [river_map] + build_levels(river_map, tile_size)
+        self.tiles_fetched = 0
+        self._changes = environment.changes
+        self._env_tile_size = environment.TILE_SIZE
+        self._lut = fertility_lut().astype(np.uint8)
+
+    @property
+    def num_levels(self):
+        """Accesses the number of levels."""
+        return len(self.levels)
+
+    def refresh(self, environment):
+        """Recomputes the tiles of every level that changed since the last refresh.
+
+        Returns:
+            The number of environment tiles that were recomputed.
+        """
+        changed = environment.tile_changes > self._changes
+        self._changes = environment.changes
+        self.levels[0] = environment.fertility_map
+        num_changed = int(changed.sum())
+        if not num_changed:
+            return 0
+        size = self._env_tile_size
+        for level in range(1, self.num_levels):
+            source, target = self.levels[level - 1], self.levels[level]
+            if changed.mean() > REBUILD_FRACTION:
+                target[:] = reduce_block(source, 0, target.shape[0], 0, target.shape[1])
+            else:
+                # Rectangles of the changed tiles in the coordinates of this level.
+                scale = 2**level
+                for tile_row, tile_col in zip(*np.nonzero(changed)):
+                    y_start = tile_row * size // scale
+                    x_start = tile_col * size // scale
+                    y_end = min(target.shape[0], -(-(tile_row + 1) * size // scale))
+                    x_end = min(target.shape[1], -(-(tile_col + 1) * size // scale))
+                    target[y_start:y_end, x_start:x_end] = reduce_block(
+                        source, y_start, y_end, x_start, x_end)
+            if size // 2**level <= 1:
+                # From here on several tiles share a pixel: merge them.
+                changed = self._coarsen(changed)
+                size *= 2
+        return num_changed
+
+    @staticmethod
+    def _coarsen(changed):
+        """Merges blocks of 2x2 tiles of a tile mask."""
+        nrows, ncols = changed.shape
+        padded = np.zeros((nrows + nrows % 2, ncols + ncols % 2), dtype=bool)
+        padded[:nrows, :ncols] = changed
+        return padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).any(axis=(1, 3))
+
+    def level_for(self, scale):
+        """Returns the coarsest level with at least one pixel per view pixel.
+
+        Args:
+            scale: Number of map pixels shown per view pixel.
+        """
+        if scale <= 1:
+            return 0
+        return min(self.num_levels - 1, int(math.floor(math.log2(scale))))
+
+    def tile(self, level, tile_row, tile_col, river=False):
+        """Returns a tile of a level (smaller at the bottom and right edges)."""
+        size = self.tile_size
+        levels = self.river_levels if river else self.levels
+        return levels[level][tile_row * size:(tile_row + 1) * size,
+                             tile_col * size:(tile_col + 1) * size]
+
+    def region(self, level, y_start, y_end, x_start, x_end, river=False):
+        """Composes a rectangle of a level from the tiles that overlap it."""
+        size = self.tile_size
+        region = np.empty((y_end - y_start, x_end - x_start), dtype=np.float32)
+        for tile_row in range(y_start // size, -(-y_end // size)):
+            for tile_col in range(x_start // size, -(-x_end // size)):
+                tile = self.tile(level, tile_row, tile_col, river)
+                self.tiles_fetched += 1
+                top, left = tile_row * size, tile_col * size
+                rows = slice(max(y_start, top), min(y_end, top + tile.shape[0]))
+                cols = slice(max(x_start, left), min(x_end, left + tile.shape[1]))
+                region[rows.start - y_start:rows.stop - y_start,
+                       cols.start - x_start:cols.stop - x_start] = tile[
+                           rows.start - top:rows.stop - top, cols.start - left:cols.stop - left]
+        return region
+
+    def view(self, x_start, y_start, x_end, y_end, width, height):
+        """Returns an RGB image of a region of the map.
+
+        Args:
+            x_start, y_start, x_end, y_end: Region in map (level 0) pixels.
+            width, height: Size of the image in pixels.
+
+        Returns:
+            (height, width, 3) uint8 array coloured as the frames of the
+            FrameView.
+        """
+        self.tiles_fetched = 0
+        scale = max((x_end - x_start) / width, (y_end - y_start) / height)
+        level = self.level_for(scale)
+        nrows, ncols = self.levels[level].shape
+        factor = 2**level
+        level_y0, level_x0 = y_start // factor, x_start // factor
+        level_y1 = min(nrows, max(level_y0 + 1, -(-y_end // factor)))
+        level_x1 = min(ncols, max(level_x0 + 1, -(-x_end // factor)))
+        fertility = self.region(level, level_y0, level_y1, level_x0, level_x1)
+        river = self.region(level, level_y0, level_y1, level_x0, level_x1, river=True)
+
+        # Nearest neighbour sampling of the region at the centre of each view pixel.
+        rows = ((y_start + (np.arange(height) + 0.5) * (y_end - y_start) / height) / factor
+                - level_y0).astype(np.int64)
+        cols = ((x_start + (np.arange(width) + 0.5) * (x_end - x_start) / width) / factor
+                - level_x0).astype(np.int64)
+        rows = np.clip(rows, 0, fertility.shape[0] - 1)
+        cols = np.clip(cols, 0, fertility.shape[1] - 1)
+        fertility = fertility[rows[:, None], cols[None, :]]
+        river = river[rows[:, None], cols[None, :]] >= 0.5
+
+        levels = np.clip((255 * (1 - fertility)).astype(np.int32), 0, 255)
+        image = self._lut[levels]
+        image[(image == 0).all(axis=2)] = 255
+        image[river] = RIVER_BLUE
+        return image
+
+
+class Viewport:
+    """The region of the map shown by a zoomable, pannable view.
+
+    Attributes:
+        map_shape: Tuple of the number of rows and columns of the map.
+        width: Width of the view in pixels.
+        height: Height of the view in pixels.
+        centre_x: Map column at the centre of the view.
+        centre_y: Map row at the centre of the view.
+        scale: Number of map pixels per view pixel.
+    """
+
+    def __init__(self, map_shape, width, height):
+        """Initialises a viewport that shows the whole map."""
+        self.map_shape = map_shape[:2]
+        self.width = width
+        self.height = height
+        self.centre_x = map_shape[1] / 2
+        self.centre_y = map_shape[0] / 2
+        self.scale = self.max_scale
+        self.min_scale = 1 / 8
+
+    @property
+    def max_scale(self):
+        """Accesses the scale at which the whole map fits in the view."""
+        return max(self.map_shape[1] / self.width, self.map_shape[0] / self.height)
+
+    def zoom(self, factor, view_x=None, view_y=None):
+        """Zooms in by factor (out if below 1), keeping a view pixel fixed."""
+        view_x = self.width / 2 if view_x is None else view_x
+        view_y = self.height / 2 if view_y is None else view_y
+        map_x, map_y = self.to_map(view_x, view_y)
+        self.scale = min(self.max_scale, max(self.min_scale, self.scale / factor))
+        self.centre_x = map_x - (view_x - self.width / 2) * self.scale
+        self.centre_y = map_y - (view_y - self.height / 2) * self.scale
+        self.clamp()
+
+    def pan(self, view_dx, view_dy):
+        """Moves the map by a number of view pixels."""
+        self.centre_x -= view_dx * self.scale
+        self.centre_y -= view_dy * self.scale
+        self.clamp()
+
+    def to_map(self, view_x, view_y):
+        """Returns the map coordinates of a view pixel."""
+        return (self.centre_x + (view_x - self.width / 2) * self.scale,
+                self.centre_y + (view_y - self.height / 2) * self.scale)
+
+    def clamp(self):
+        """Keeps the centre within the map."""
+        nrows, ncols = self.map_shape
+        half_width, half_height = self.width * self.scale / 2, self.height * self.scale / 2
+        self.centre_x = min(max(self.centre_x, min(half_width, ncols / 2)),
+                            max(ncols - half_width, ncols / 2))
+        self.centre_y = min(max(self.centre_y, min(half_height, nrows / 2)),
+                            max(nrows - half_height, nrows / 2))
+
+    def bounds(self):
+        """Returns the visible (x_start, y_start, x_end, y_end) in whole map pixels."""
+        nrows, ncols = self.map_shape
+        x_start, y_start = self.to_map(0, 0)
+        x_end, y_end = self.to_map(self.width, self.height)
+        x_start, y_start = max(0, int(x_start)), max(0, int(y_start))
+        x_end = min(ncols, max(x_start + 1, int(math.ceil(x_end))))
+        y_end = min(nrows, max(y_start + 1, int(math.ceil(y_end))))
+        return x_start, y_start, x_end, y_end
@@ -0,0 +1,171 @@
+"""Composes headless map frames directly in NumPy and writes them with Pillow.
+
+The Rasterizer is an alternative to the matplotlib frame of FrameView.save_frame
+for runs that need a frame every year. The map is coloured exactly as
+FrameView.river_img and FrameView.fertility_img do, through a 256 entry colour
+lookup table, and the households are drawn as discs of knowledge_radius pixels
+with the colours of FrameView.get_rgba and the edge colours of
+FrameView.get_edges. The population and gini-coefficient graphs are not drawn.
+"""
+import os
+
+import matplotlib
+import matplotlib.cm
+import numpy as np
+from PIL import Image
+
+RIVER_BLUE = (102, 178, 255)
+PLUNDER_EDGE = (255, 0, 0)
+COLLABORATE_EDGE = (0, 0, 255)
+
+
+def fertility_lut():
+    """Returns the (256, 3) uint8 colours of the inverted fertility levels.
+
+    Level 255 (no fertility) is black, as in FrameView.fertility_img.
+    """
+    levels = np.arange(256)
+    lut = np.stack([levels, np.full(256, 255), levels], axis=1)
+    lut[255] = 0
+    return lut.astype(np.int32)
+
+
+def plasma_lut():
+    """Returns the (256, 3) colours of the plasma colormap in [0, 1].
+
+    The colormap registry is read without importing pyplot, which would select
+    a GUI backend.
+    """
+    if hasattr(matplotlib, 'colormaps'):
+        cmap = matplotlib.colormaps['plasma']
+    else:
+        # matplotlib < 3.5 has no colormap registry.
+        cmap = matplotlib.cm.get_cmap('plasma')
+    return cmap(np.arange(256))[:, :3]
+
+
+class Rasterizer:
+    """Renders frames of the map and its households as RGB arrays.
+
+    The Rasterizer can be passed to a FrameView as its renderer or used
+    directly as a Simulation observer.
+
+    Attributes:
+        river_map: river_map of the simulation.
+        frame_path: Directory the frames are written to.
+        image_format: 'png' for PNG files or 'raw' for raw RGB bytes.
+        cadence: Number of years between frames when used as an observer.
+        frames: List of the generations that have been written.
+    """
+
+    def __init__(self, river_map, frame_path='../../resources/frames/', image_format='png',
+                 cadence=1):
+        if image_format not in ('png', 'raw'):
+            raise ValueError('image_format must be png or raw, not {0!r}'.format(image_format))
+        self.river_map = river_map
+        self.frame_path = frame_path
+        self.image_format = image_format
+        self.cadence = cadence
+        self.frames = []
+        self._river_layer = np.where((river_map == 1.0)[:, :, None],
+                                     np.array(RIVER_BLUE, dtype=np.int32), 0)
+        self._fertility_lut = fertility_lut()
+        self._plasma_lut = plasma_lut()
+
+    def background(self, fertility_map):
+        """Returns the (rows, cols, 3) uint8 image of the river and fertility."""
+        levels = (255 * (1 - fertility_map)).astype(np.int32)
+        np.clip(levels, 0, 255, out=levels)
+        image = self._fertility_lut[levels] + self._river_layer
+        image[(image == 0).all(axis=2)] = 255
+        return np.minimum(image, 255).astype(np.uint8)
+
+    def household_colours(self, columns):
+        """Returns the (n, 3) fill colours in [0, 1] and (n,) alpha values.
+
+        The colours follow FrameView.get_rgba: the plasma colour of the
+        household's ambition relative to its competency, and an opacity that
+        grows with its grain per worker.
+        """
+        competency = np.asarray(columns['competency'], dtype=np.float64)
+        ambition = np.asarray(columns['ambition'], dtype=np.float64)
+        grain = np.asarray(columns['grain'], dtype=np.float64)
+        num_workers = np.asarray(columns['num_workers'], dtype=np.float64)
+        ratio = ambition / (ambition + competency)
+        colours = self._plasma_lut[np.clip((ratio * 256).astype(np.int64), 0, 255)]
+        # Households without workers count as having no grain per worker.
+        grain_per_worker = np.divide(grain, num_workers, out=np.zeros_like(grain),
+                                     where=num_workers > 0)
+        alpha = np.interp(grain_per_worker, (grain_per_worker.min(), grain_per_worker.max()),
+                          (0.2, 1.0))
+        return colours, alpha
+
+    def render(self, columns, fertility_map):
+        """Returns the RGB uint8 frame of a year.
+
+        Args:
+            columns: Mapping with x_pos, y_pos, knowledge_radius, num_workers,
+                grain, competency, ambition and interaction columns, such as
+                the presenter's statistics DataFrame.
+            fertility_map: fertility_map of the year.
+        """
+        image = self.background(fertility_map)
+        if not len(columns['x_pos']):
+            return image
+        canvas = image.astype(np.float32) / 255
+        colours, alpha = self.household_colours(columns)
+        interaction = np.asarray(columns['interaction'])
+        x_pos = np.asarray(columns['x_pos'], dtype=np.int64)
+        y_pos = np.asarray(columns['y_pos'], dtype=np.int64)
+        radii = np.asarray(columns['knowledge_radius'], dtype=np.float64)
+        nrows, ncols = canvas.shape[:2]
+        for index in range(len(x_pos)):
+            self.splat(canvas, x_pos[index], y_pos[index], radii[index], colours[index],
+                       alpha[index], interaction[index], nrows, ncols)
+        return (canvas * 255 + 0.5).astype(np.uint8)
+
+    def splat(self, canvas, x_pos, y_pos, radius, colour, alpha, interaction, nrows, ncols):
+        """Alpha blends a single household disc and its one pixel edge onto canvas."""
+        reach = int(np.ceil(radius))
+        x_start, x_end = max(0, x_pos - reach), min(ncols, x_pos + reach + 1)
+        y_start, y_end = max(0, y_pos - reach), min(nrows, y_pos + reach + 1)
+        if x_start >= x_end or y_start >= y_end:
+            return
+        square_dist = ((np.arange(y_start, y_end) - y_pos)[:, None]**2
+                       + (np.arange(x_start, x_end) - x_pos)[None, :]**2)
+        disc = square_dist <= max(radius, 0.5)**2
+        edge = disc & (square_dist > max(radius - 1, 0)**2)
+        if interaction < 0:
+            edge_colour = np.array(PLUNDER_EDGE) / 255
+        elif interaction > 0:
+            edge_colour = np.array(COLLABORATE_EDGE) / 255
+        else:
+            edge_colour = colour
+        window = canvas[y_start:y_end, x_start:x_end]
+        fill = disc & ~edge
+        window[fill] = window[fill] * (1 - alpha) + colour * alpha
+        window[edge] = window[edge] * (1 - alpha) + edge_colour * alpha
+
+    def write(self, image, generation):
+        """Writes a frame and returns its path."""
+        os.makedirs(self.frame_path, exist_ok=True)
+        if self.image_format == 'png':
+            path = os.path.join(self.frame_path, 'yr_{0}.png'.format(generation))
+            Image.fromarray(image).save(path)
+        else:
+            path = os.path.join(self.frame_path, 'yr_{0}.rgb'.format(generation))
+            image.tofile(path)
+        self.frames.append(generation)
+        return path
+
+    def save_frame(self, columns, fertility_map, generation):
+        """Renders and writes the frame of a year and returns its path."""
+        return self.write(self.render(columns, fertility_map), generation)
+
+    def observe(self, simulation):
+        """Writes the frame of the current year of a simulation."""
+        snapshot = simulation.snapshot()
+        households = simulation.households
+        knowledge_ratio = households[0].constants.KNOWLEDGE_RATIO if households else 0
+        columns = dict(snapshot, knowledge_radius=knowledge_ratio * snapshot['num_workers'])
+        self.save_frame(columns, simulation.environment.fertility_map, simulation.generation)
@@ -0,0 +1,94 @@
+"""Policies that decide which simulated years are rendered as frames.
+
+Statistics are recorded by the FrameView every year regardless of the policy;
+a policy only decides whether the comparatively expensive frame render happens
+for the current year.
+"""
+
+
+class RenderPolicy:
+    """Renders a frame every year.
+
+    Subclasses override should_render to produce frames selectively.
+    """
+
+    def should_render(self, generation, num_generations, frame_view):
+        """Returns whether the current generation should be rendered.
+
+        Args:
+            generation: Current generation of the simulation.
+            num_generations: Total number of generations in the simulation.
+            frame_view: FrameView whose pop_df and gini_df already contain the
+                statistics of the current generation.
+        """
+        return True
+
+
+class EveryNthYear(RenderPolicy):
+    """Renders every n-th year as well as the final year."""
+
+    def __init__(self, n):
+        self.n = n
+
+    def should_render(self, generation, num_generations, frame_view):
+        """Overrides superclass method."""
+        return generation % self.n == 0 or generation == num_generations - 1
+
+
+class NeverRender(RenderPolicy):
+    """Renders no frames; statistics are still recorded every year."""
+
+    def should_render(self, generation, num_generations, frame_view):
+        """Overrides superclass method."""
+        return False
+
+
+class FinalYear(RenderPolicy):
+    """Renders only the final year of the simulation."""
+
+    def should_render(self, generation, num_generations, frame_view):
+        """Overrides superclass method."""
+        return generation == num_generations - 1
+
+
+class PopulationCrash(RenderPolicy):
+    """Renders years in which the population fell by at least a given fraction."""
+
+    def __init__(self, fraction=0.25):
+        self.fraction = fraction
+
+    def should_render(self, generation, num_generations, frame_view):
+        """Overrides superclass method."""
+        population = frame_view.pop_df['population']
+        if len(population) < 2:
+            return False
+        previous, current = population.iloc[-2], population.iloc[-1]
+        return previous > 0 and (previous - current) / previous >= self.fraction
+
+
+class GiniThreshold(RenderPolicy):
+    """Renders years in which the gini-coefficient crosses a threshold."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+
+    def should_render(self, generation, num_generations, frame_view):
+        """Overrides superclass method."""
+        gini = frame_view.gini_df['gini-coefficient']
+        if not len(gini):
+            return False
+        above = gini.iloc[-1] >= self.threshold
+        was_above = len(gini) > 1 and gini.iloc[-2] >= self.threshold
+        return above != was_above
+
+
+class AnyOf(RenderPolicy):
+    """Renders a year if any of the supplied policies would render it."""
+
+    def __init__(self, *policies):
+        self.policies = policies
+
+    def should_render(self, generation, num_generations, frame_view):
+        """Overrides superclass method."""
+        return any(policy.should_render(generation, num_generations, frame_view)
+                   for policy in self.policies)
@@ -1,11 +1,12 @@
 import tkinter as tk
 from tkinter import ttk
 import time
-import yaml
 from ruamel.yaml import YAML
 
 from PIL import Image, ImageTk
 
+from gui.pyramid import Viewport
+
 class UserView(tk.Frame):
     """Encapsulates all gui functionality."""
 
@@ -33,18 +34,7 @@ class UserView(tk.Frame):
         self.buttons = []
 
         with open("../var_config.yml") as f:
-            self.var_config = yaml.load(f)
-
-        # Assigns default values
-        self.var_config['num_households'] = 15
-        self.var_config['households']['num_workers'] = 15
-        self.var_config['households']['grain'] = 3000
-        self.var_config['households']['worker_capability'] = 1000
-        self.var_config['households']['min_competency'] = 0.2
-        self.var_config['households']['min_ambition'] = 0.2
-
-        with open("../var_config.yml", "w") as f:
-            YAML().dump(self.var_config, f)
+            self.var_config = YAML().load(f)
 
         load = Image.open(self.PIC_DIR + "iris.png")
         render = ImageTk.PhotoImage(load)
@@ -71,6 +61,11 @@ class UserView(tk.Frame):
         config_button.pack(side=tk.TOP, padx=4, pady=(5, 20))
         self.buttons.append(config_button)
 
+        map_button = tk.Button(self, text="Map", command=self.click_map_button)
+        map_button.config(width=15)
+        map_button.pack(pady=(0, 20))
+        self.buttons.append(map_button)
+
         self.progress_bar = ttk.Progressbar(self, variable=self.progress_var, orient="horizontal",
                                             length=200, mode="determinate")
         self.progress_bar["maximum"] = self.presenter.get_num_generations() - 1
@@ -181,18 +176,26 @@ class UserView(tk.Frame):
     def click_view_button(self):
         """Displays the simulation frames in a pop-up window.
 
-        The first frame is displayed in the pop-up window after which it is
-        updated every SEC_PER_FRAME (as per the next_year_frame method).
+        The first rendered frame is displayed in the pop-up window after which
+        it is updated every SEC_PER_FRAME (as per the next_year_frame method).
+        Only the years selected by the presenter's render policy have frames.
         """
+        frames = self.presenter.get_frames()
+        if not frames:
+            return
         window = tk.Toplevel(self.master)
         window.wm_title("Egypt Simulation")
-        load = Image.open(self.FRAME_DIR + "yr_0.png")
+        load = Image.open(self.FRAME_DIR + "yr_{0}.png".format(frames[0]))
         render = ImageTk.PhotoImage(load)
         img = tk.Label(window, image=render, borderwidth=0)
         img.image = render
         img.pack()
-        gen = 1
-        img.after(self.SEC_PER_FRAME, self.next_year_frame, img, gen)
+        index = 1
+        img.after(self.SEC_PER_FRAME, self.next_year_frame, img, index)
+
+    def click_map_button(self):
+        """Opens a zoomable, pannable view of the live fertility map."""
+        MapViewer(self.presenter, self.master)
 
     def progress(self):
         """Continuously simulates a year and updates the progress variable."""
@@ -205,12 +208,81 @@ class UserView(tk.Frame):
             end = time.time()
             print("Finished	in %.3f seconds" % (end - self.start))
 
-    def next_year_frame(self, img, gen):
+    def next_year_frame(self, img, index):
         """Continuously loads and presents frames to the pop-up window."""
-        if gen < self.presenter.get_num_generations():
-            load = Image.open(self.FRAME_DIR + "yr_{0}.png".format(gen))
+        frames = self.presenter.get_frames()
+        if index < len(frames):
+            load = Image.open(self.FRAME_DIR + "yr_{0}.png".format(frames[index]))
             render = ImageTk.PhotoImage(load)
             img.configure(image=render)
             img.image = render
-            gen += 1
-            img.after(self.SEC_PER_FRAME, self.next_year_frame, img, gen)
+            index += 1
+            img.after(self.SEC_PER_FRAME, self.next_year_frame, img, index)
+
+
+class MapViewer(tk.Toplevel):
+    """Pop-up window with a zoomable, pannable view of the live fertility map.
+
+    The view is composed by the presenter from the tiles of a single level of
+    the fertility pyramid, so it stays fast whatever the size of the map. The
+    mouse wheel zooms about the pointer and dragging pans the map.
+    """
+
+    def __init__(self, presenter, master=None, size=600, refresh_ms=500):
+        """Initialises the window and draws the whole map.
+
+        Args:
+            presenter: Presenter singleton object.
+            master: Root window of the application.
+            size: Length in pixels of the longer side of the view.
+            refresh_ms: Milliseconds between redraws of the live map.
+        """
+        tk.Toplevel.__init__(self, master)
+        self.wm_title("Fertility Map")
+        self.presenter = presenter
+        self.refresh_ms = refresh_ms
+        nrows, ncols = presenter.map_shape()[:2]
+        scale = size / max(nrows, ncols)
+        self.viewport = Viewport((nrows, ncols), max(1, round(ncols * scale)),
+                                 max(1, round(nrows * scale)))
+        self.drag_start = None
+        self.img = tk.Label(self, borderwidth=0)
+        self.img.pack()
+        self.img.bind("<MouseWheel>", lambda event: self.zoom(event, 1.25 if event.delta > 0
+                                                               else 0.8))
+        self.img.bind("<Button-4>", lambda event: self.zoom(event, 1.25))
+        self.img.bind("<Button-5>", lambda event: self.zoom(event, 0.8))
+        self.img.bind("<ButtonPress-1>", self.start_drag)
+        self.img.bind("<B1-Motion>", self.drag)
+        self.redraw()
+        self.after(self.refresh_ms, self.refresh)
+
+    def redraw(self):
+        """Draws the visible region of the map."""
+        viewport = self.viewport
+        image = self.presenter.map_view(viewport.bounds(), viewport.width, viewport.height)
+        render = ImageTk.PhotoImage(Image.fromarray(image))
+        self.img.configure(image=render)
+        self.img.image = render
+
+    def refresh(self):
+        """Redraws the live map periodically while the window is open."""
+        if self.winfo_exists():
+            self.redraw()
+            self.after(self.refresh_ms, self.refresh)
+
+    def zoom(self, event, factor):
+        """Zooms about the pointer."""
+        self.viewport.zoom(factor, event.x, event.y)
+        self.redraw()
+
+    def start_drag(self, event):
+        """Records where a pan starts."""
+        self.drag_start = (event.x, event.y)
+
+    def drag(self, event):
+        """Pans the map with the pointer."""
+        if self.drag_start is not None:
+            self.viewport.pan(event.x - self.drag_start[0], event.y - self.drag_start[1])
+            self.drag_start = (event.x, event.y)
+            self.redraw()
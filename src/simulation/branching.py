@@ -0,0 +1,177 @@
+"""Forks what-if branches from the current state of a running simulation.
+
+Each branch is run in a child process created with fork, so it starts from an
+exact copy of the parent's state without recomputing the shared prefix of the
+run. Memory pages are shared copy-on-write: the river_map, the pristine
+flood_map and the other read-only maps are never written by a branch and are
+therefore never duplicated, while the fertility_map is only copied page by page
+as a branch farms it. The parent simulation is left untouched.
+
+Every branch applies its own parameter overrides and seeds its own random
+number stream before running.
+"""
+import multiprocessing
+import os
+import random
+import traceback
+from multiprocessing.connection import wait
+
+from simulation.config import Config
+from simulation.environment import silt_diffusion
+
+# Config keys that map onto HouseholdConstants fields.
+CONSTANT_KEYS = {
+    'knowledge_ratio': 'KNOWLEDGE_RATIO',
+    'claim_ratio': 'CLAIM_RATIO',
+    'maximum_potential_yield': 'MAX_POTENTIAL_YIELD',
+    'worker_appetite': 'WORKER_APPETITE',
+    'growth_rate': 'GROWTH_RATE',
+    'generational_variance': 'GENERATIONAL_VAR',
+    'capability_variance': 'CAPABILITY_VAR',
+    'survival_probability': 'SURVIVAL_PROBABILITY',
+}
+
+# Config keys that map onto Environment attributes.
+ENVIRONMENT_KEYS = {
+    'flood_frequency': 'FLOOD_FREQ',
+    'regeneration_rate': 'REGENERATION_RATE',
+    'silt_rate': 'SILT_RATE',
+    'silt_spread': 'SILT_SPREAD',
+}
+
+OVERRIDE_KEYS = set(CONSTANT_KEYS) | set(ENVIRONMENT_KEYS) | {'num_generations'}
+
+
+def validate_overrides(overrides):
+    """Returns the overrides converted and checked as Config.replace does.
+
+    Raises:
+        ValueError: If a key cannot be overridden or a value is invalid.
+    """
+    unknown = set(overrides) - OVERRIDE_KEYS
+    if unknown:
+        raise ValueError('Cannot override: {0}'.format(', '.join(sorted(unknown))))
+    return Config.validate_overrides(overrides)
+
+
+def apply_overrides(simulation, overrides):
+    """Applies configuration overrides to a simulation in place.
+
+    Args:
+        simulation: Simulation to modify.
+        overrides: Dictionary of config keys (see OVERRIDE_KEYS) and values.
+
+    Raises:
+        ValueError: If a key cannot be overridden or a value is invalid.
+    """
+    overrides = validate_overrides(overrides)
+    environment = simulation.environment
+    for key, attr in ENVIRONMENT_KEYS.items():
+        if key in overrides:
+            setattr(environment, attr, overrides[key])
+    if environment.SILT_RATE and (environment.silt_map is None or 'silt_spread' in overrides):
+        environment.silt_map = silt_diffusion(environment.river_map, environment.SILT_SPREAD)
+    if 'num_generations' in overrides:
+        simulation.num_generations = overrides['num_generations']
+
+    constants = {CONSTANT_KEYS[key]: value for key, value in overrides.items()
+                 if key in CONSTANT_KEYS}
+    if constants:
+        replaced = {}
+        for house in simulation.households:
+            old = house.constants
+            if id(old) not in replaced:
+                replaced[id(old)] = old._replace(**constants)
+            house.constants = replaced[id(old)]
+
+
+def branch_seeds(count, seed=None):
+    """Returns count seeds for the random streams of the branches.
+
+    The parent's random stream is not consumed. Without a seed the branch
+    seeds are drawn from the operating system.
+    """
+    generator = random.Random(seed) if seed is not None else random.SystemRandom()
+    return [generator.getrandbits(64) for _ in range(count)]
+
+
+def _run_branch(connection, simulation, overrides, seed, n_years, collect, observers):
+    """Runs a single branch in a forked child process and sends its result."""
+    try:
+        random.seed(seed)
+        simulation.events = None
+        simulation.observers = list(observers)
+        apply_overrides(simulation, overrides)
+        simulation.run(n_years)
+        connection.send(('ok', collect(simulation)))
+    except Exception:
+        connection.send(('error', traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+def branch(simulation, overrides, n_years=None, collect=None, seed=None, observers=None,
+           max_workers=None):
+    """Runs a branch of the simulation for every dictionary of overrides.
+
+    Args:
+        simulation: Simulation to branch from. It is not modified.
+        overrides: List of override dictionaries, one per branch.
+        n_years: Maximum number of years each branch runs for. Defaults to all
+            remaining generations.
+        collect: Callable that receives a finished branch Simulation and
+            returns its picklable result. Defaults to Simulation.summary.
+        seed: Optional seed that makes the branch random streams
+            reproducible.
+        observers: Optional callable that receives the index of a branch and
+            returns its list of observers. Branches do not inherit the
+            parent's observers or event trace.
+        max_workers: Maximum number of branches running at the same time.
+            Defaults to the number of CPUs.
+
+    Returns:
+        List of the collected results in the order of overrides.
+
+    Raises:
+        ValueError: If an override is invalid. Overrides are validated before
+            any branch is forked.
+        RuntimeError: If fork is unavailable or a branch fails.
+    """
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        raise RuntimeError('Branching requires the fork start method')
+    overrides = [validate_overrides(branch_overrides) for branch_overrides in overrides]
+    collect = collect or (lambda branch_simulation: branch_simulation.summary())
+    max_workers = max(1, max_workers or os.cpu_count() or 1)
+    context = multiprocessing.get_context('fork')
+    seeds = branch_seeds(len(overrides), seed)
+
+    results = [None] * len(overrides)
+    running = {}
+    pending = list(enumerate(overrides))
+    while pending or running:
+        while pending and len(running) < max_workers:
+            index, branch_overrides = pending.pop(0)
+            parent, child = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_run_branch, daemon=True,
+                args=(child, simulation, branch_overrides, seeds[index], n_years, collect,
+                      observers(index) if observers else []))
+            process.start()
+            child.close()
+            running[parent] = (index, process)
+        for connection in wait(list(running)):
+            index, process = running.pop(connection)
+            try:
+                status, result = connection.recv()
+            except EOFError:
+                status, result = 'error', 'Branch process exited unexpectedly'
+            connection.close()
+            process.join()
+            if status == 'error':
+                for other_connection, (_, other) in running.items():
+                    other.terminate()
+                    other.join()
+                    other_connection.close()
+                raise RuntimeError('Branch {0} failed:\n{1}'.format(index, result))
+            results[index] = result
+    return results
@@ -0,0 +1,188 @@
+"""Typed, validated and immutable simulation configuration.
+
+The Config is built once per run from var_config.yml, const_config.yml and
+optional overrides, and is then passed to every component. It is a namedtuple,
+so it is immutable, hashable (e.g. to cache results per configuration) and
+cheap to construct. Components written against the configuration dictionaries
+keep working, as config['key'] and config.get('key', default) are supported.
+"""
+from collections import namedtuple
+
+import yaml
+
+# Field name, type, default (None for required fields) and allowed range.
+HOUSEHOLD_FIELDS = (
+    ('num_workers', int, None, (0, None)),
+    ('grain', float, None, (0, None)),
+    ('worker_capability', float, None, (0, None)),
+    ('min_competency', float, None, (0, 1)),
+    ('min_ambition', float, None, (0, 1)),
+)
+
+FIELDS = (
+    ('pixel_to_km', float, None, (0, None)),
+    ('knowledge_ratio', float, None, (0, None)),
+    ('claim_ratio', float, None, (0, None)),
+    ('worker_appetite', float, None, (0, None)),
+    ('maximum_potential_yield', float, None, (0, None)),
+    ('growth_rate', float, None, (None, None)),
+    ('capability_variance', float, None, (0, None)),
+    ('generational_variance', float, None, (0, 1)),
+    ('flood_frequency', int, None, (0, None)),
+    ('regeneration_rate', float, 0.0, (0, None)),
+    ('silt_rate', float, 0.0, (0, 1)),
+    ('silt_spread', float, 10.0, (0, None)),
+    ('survival_probability', float, None, (0, 1)),
+    ('num_generations', int, None, (0, None)),
+    ('memory_budget', float, 0.0, (0, None)),
+    ('metrics_port', int, 0, (0, 65535)),
+    ('harvest_threads', int, 0, (0, None)),
+    ('array_engine', int, 0, (0, 1)),
+    ('single_precision', int, 0, (0, 1)),
+    ('field_ownership', int, 0, (0, 1)),
+    ('num_households', int, None, (0, None)),
+)
+
+
+class _Mapping:
+    """Dictionary style access to the fields of a namedtuple."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def get(self, key, default=None):
+        """Returns the value of a field, or default if there is no such field."""
+        return getattr(self, key, default) if isinstance(key, str) else default
+
+    def keys(self):
+        """Returns the field names."""
+        return self._fields
+
+
+class HouseholdConfig(_Mapping, namedtuple('HouseholdConfig',
+                                           [name for name, _, _, _ in HOUSEHOLD_FIELDS])):
+    """Start parameters of every household (the households section of var_config)."""
+
+    __slots__ = ()
+
+    def to_dict(self):
+        """Returns the parameters as a plain dictionary."""
+        return dict(self._asdict())
+
+
+class Config(_Mapping, namedtuple('Config', [name for name, _, _, _ in FIELDS] + ['households'])):
+    """Complete configuration of a simulation run.
+
+    The fields are the keys of const_config.yml and var_config.yml. The
+    households section is held as a HouseholdConfig.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def load(cls, var_file='../var_config.yml', const_file='../const_config.yml', **overrides):
+        """Reads both configuration files and returns a validated Config.
+
+        Args:
+            var_file: Path to the yaml file with the varying parameters.
+            const_file: Path to the yaml file with the constant parameters.
+            overrides: Values replacing those read from the files. Household
+                parameters are given as households={'grain': ...} or as
+                households__grain=....
+
+        Raises:
+            ValueError: If a value is missing, unknown, of the wrong type or
+                out of range.
+        """
+        with open(var_file) as stream:
+            var_config = yaml.safe_load(stream) or {}
+        with open(const_file) as stream:
+            const_config = yaml.safe_load(stream) or {}
+        return cls.from_dicts(var_config, const_config, **overrides)
+
+    @classmethod
+    def from_dicts(cls, *configs, **overrides):
+        """Returns a validated Config built from configuration dictionaries.
+
+        Later dictionaries and the overrides take precedence over earlier ones.
+        """
+        values = {}
+        households = {}
+        for config in configs + (overrides,):
+            for key, value in dict(config).items():
+                if key == 'households':
+                    households.update(value)
+                elif key.startswith('households__'):
+                    households[key[len('households__'):]] = value
+                else:
+                    values[key] = value
+        values['households'] = HouseholdConfig(**_validate(households, HOUSEHOLD_FIELDS,
+                                                           'households.'))
+        return cls(households=values.pop('households'), **_validate(values, FIELDS, ''))
+
+    def replace(self, **overrides):
+        """Returns a validated copy of the Config with some values replaced."""
+        return self.from_dicts(self.to_dict(), **overrides)
+
+    @classmethod
+    def validate_overrides(cls, overrides):
+        """Returns top-level overrides converted and checked as replace does.
+
+        Only the given keys are validated, so no base Config is needed, e.g.
+        for the overrides of a running simulation.
+
+        Raises:
+            ValueError: If a key is unknown or a value is of the wrong type or
+                out of range.
+        """
+        return _validate(overrides, [field for field in FIELDS if field[0] in overrides], '')
+
+    def to_dict(self):
+        """Returns the configuration as nested plain dictionaries."""
+        config = dict(self._asdict())
+        config['households'] = self.households.to_dict()
+        return config
+
+
+def _validate(values, fields, prefix):
+    """Returns values converted to the types of fields.
+
+    Raises:
+        ValueError: If a value is missing, unknown, of the wrong type or out
+            of range.
+    """
+    unknown = set(values) - {name for name, _, _, _ in fields}
+    if unknown:
+        raise ValueError('Unknown configuration keys: {0}'.format(
+            ', '.join(prefix + key for key in sorted(unknown))))
+    validated = {}
+    for name, kind, default, (low, high) in fields:
+        value = values.get(name, default)
+        if value is None:
+            raise ValueError('Missing configuration key: {0}{1}'.format(prefix, name))
+        if isinstance(value, bool) and kind is int and (low, high) == (0, 1):
+            # Flags may be written as true/false in the YAML files.
+            value = int(value)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError('{0}{1} must be a number, not {2!r}'.format(prefix, name, value))
+        if kind is int:
+            if value != int(value):
+                raise ValueError('{0}{1} must be an integer, not {2!r}'.format(prefix, name, value))
+            value = int(value)
+        else:
+            value = float(value)
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise ValueError('{0}{1} must lie within [{2}, {3}], not {4!r}'.format(
+                prefix, name, low, high if high is not None else 'inf', value))
+        validated[name] = value
+    return validated
@@ -0,0 +1,439 @@
+"""Runs a single simulation across several processes by splitting the map.
+
+The map is split into horizontal strips of rows, each owned by a worker
+process that runs an ordinary Simulation over the households living in its
+strip. The fertility_map is held in shared memory, so fields that straddle a
+strip boundary are farmed directly by the owning worker.
+
+Every year is divided into phases that all workers complete before the next
+phase starts:
+
+    farm      Strips farm in two rounds, first the even and then the odd
+              strips, so no two strips that farm at the same time can reach
+              the same pixels.
+    interact  Each boundary is handled by the strip above it, in two rounds
+              (even boundaries, then odd boundaries). The strip below lends a
+              halo of the households within reach of the boundary, which are
+              interacted with as ghosts and handed back afterwards.
+    grow      Households grow and relocate. Households that relocate out of
+              their strip migrate to the strip now containing them.
+
+The landscape is regenerated and flooded by the coordinating process between
+years. A decomposed run follows the same rules as a Simulation but not the
+same sequence of random numbers, so it is statistically rather than exactly
+equivalent. Strips that farm in the same round are separated by a strip,
+which must be at least twice the field_reach of the largest household for
+the round to be free of conflicts. The number of strips is capped at start
+up, and in a year in which households have outgrown the strips, the strips
+farm one at a time.
+"""
+import bisect
+import logging
+import math
+import multiprocessing
+import os
+import random
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from simulation.simulation_driver import Simulation
+
+logger = logging.getLogger(__name__)
+
+
+def strip_bounds(nrows, num_strips):
+    """Returns the row at which each of num_strips equal strips starts."""
+    return [nrows * index // num_strips for index in range(num_strips)]
+
+
+def field_reach(constants, num_workers):
+    """Returns the number of rows a household's field can reach from its own row.
+
+    A field is centred within the knowledge radius of the household and
+    extends half the side of the claimed area (at most CLAIM_RATIO per worker)
+    around its centre.
+    """
+    return int(math.ceil(constants.KNOWLEDGE_RATIO * num_workers
+                         + math.sqrt(constants.CLAIM_RATIO * num_workers) / 2))
+
+
+def max_strips(nrows, min_height):
+    """Returns the largest number of strips that are at least min_height rows tall.
+
+    Up to two strips are always allowed, as they never farm in the same round.
+    """
+    return max(2, nrows // max(1, min_height))
+
+
+class StripWorker:
+    """State of a worker process that owns the households of one strip.
+
+    Attributes:
+        simulation: Simulation over the households of the strip.
+        row_start: First row of the strip.
+        row_end: Row after the last row of the strip.
+    """
+
+    def __init__(self, simulation, row_start, row_end):
+        self.simulation = simulation
+        self.row_start = row_start
+        self.row_end = row_end
+
+    def farm(self):
+        """Runs the farm phase and returns the largest knowledge radius."""
+        self.simulation.farm_phase()
+        return max((house.knowledge_radius for house in self.simulation.households), default=0)
+
+    def halo(self, rows):
+        """Returns the households within rows of the top of the strip."""
+        limit = self.row_start + rows
+        return [house for house in self.simulation.households if house.position[1] < limit]
+
+    def interact(self, ghosts):
+        """Interacts the strip's households with each other and with ghosts.
+
+        Returns:
+            The ghosts after the interactions, including those that died.
+        """
+        simulation = self.simulation
+        num_owned = len(simulation.households)
+        simulation.households.extend(ghosts)
+        simulation.interact(num_owned)
+        ghost_ids = {house.id for house in ghosts}
+        simulation.households[:] = [house for house in simulation.households
+                                    if house.id not in ghost_ids]
+        return ghosts
+
+    def merge(self, ghosts):
+        """Replaces lent households with the ghosts returned by a neighbour."""
+        returned = {house.id: house for house in ghosts}
+        households = self.simulation.households
+        households[:] = [returned.get(house.id, house) for house in households]
+        households[:] = [house for house in households if house.num_workers > 0]
+
+    def grow(self):
+        """Runs the growth phase and returns the households that left the strip.
+
+        Returns:
+            A tuple of the emigrating households and the dirty_tiles of the
+            year, after which the local dirty_tiles are cleared.
+        """
+        simulation = self.simulation
+        simulation.growth_phase()
+        households = simulation.households
+        emigrants = [house for house in households
+                     if not self.row_start <= house.position[1] < self.row_end]
+        if emigrants:
+            households[:] = [house for house in households
+                             if self.row_start <= house.position[1] < self.row_end]
+        dirty_tiles = np.copy(simulation.environment.dirty_tiles)
+        simulation.environment.dirty_tiles[:] = False
+        return emigrants, dirty_tiles
+
+    def accept(self, immigrants):
+        """Adds households that relocated into the strip."""
+        self.simulation.households.extend(immigrants)
+
+    def households(self):
+        """Returns the households of the strip."""
+        return self.simulation.households
+
+    def count(self):
+        """Returns the number of households of the strip."""
+        return len(self.simulation.households)
+
+    def snapshot(self):
+        """Returns the household columns of the strip."""
+        return self.simulation.snapshot()
+
+    def max_workers(self):
+        """Returns the largest num_workers of the strip's households."""
+        return max((house.num_workers for house in self.simulation.households), default=0)
+
+
+def _run_worker(connection, environment, shm_name, households, num_generations, engine,
+                row_start, row_end, seed):
+    """Serves the commands of the coordinator in a worker process."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    fertility_map = environment.fertility_map
+    environment.fertility_map = np.ndarray(fertility_map.shape, dtype=fertility_map.dtype,
+                                           buffer=shm.buf)
+    random.seed(seed)
+    worker = StripWorker(Simulation(households, environment, num_generations, engine=engine),
+                         row_start, row_end)
+    try:
+        while True:
+            command, args = connection.recv()
+            if command == 'close':
+                break
+            try:
+                connection.send(('ok', getattr(worker, command)(*args)))
+            except Exception:
+                connection.send(('error', traceback.format_exc()))
+    finally:
+        environment.fertility_map = fertility_map
+        del worker
+        shm.close()
+        connection.close()
+
+
+class DecomposedSimulation(Simulation):
+    """Simulation whose households are distributed over worker processes.
+
+    The DecomposedSimulation can be used wherever a Simulation is run:
+    run_year_simulation, run, summary, observers and stopping criteria work
+    unchanged. The households property returns copies gathered from the
+    workers and is therefore read-only. As gathering them is costly, run and
+    summary only ask the workers for their counts and columns. Event tracing
+    is not supported.
+
+    Attributes:
+        num_strips: Number of strips and worker processes.
+        row_starts: First row of every strip.
+        constants: HouseholdConstants of the households, or None without
+            households.
+    """
+
+    def __init__(self, households, environment, num_generations, num_strips=None,
+                 observers=None, engine=None, stopping=None):
+        """Distributes the households and starts the worker processes.
+
+        Args:
+            households: List of Household objects.
+            environment: Environment whose fertility_map is moved into shared
+                memory for the lifetime of the simulation.
+            num_generations: An integer that refers to the number of
+                generations in the simulation.
+            num_strips: Number of strips. Defaults to the number of CPUs,
+                capped so that every strip is at least twice the field_reach
+                of the largest household.
+            observers: Optional list of observers.
+            engine: Optional kernels.ArrayEngine used by every worker for the
+                farm phase.
+            stopping: Optional list of stopping.StoppingCriterion objects.
+
+        Raises:
+            ValueError: If num_strips strips would be less than twice the
+                field_reach of the largest household.
+        """
+        super().__init__([], environment, num_generations, observers, stopping=stopping)
+        nrows, _ = environment.shape
+        self.constants = households[0].constants if households else None
+        limit = max_strips(nrows, self.min_strip_height(
+            max((house.num_workers for house in households), default=0)))
+        if num_strips is not None and num_strips > limit:
+            raise ValueError('{0} strips of {1} rows are thinner than twice the reach of the '
+                             'largest field; use at most {2}'.format(
+                                 num_strips, nrows // num_strips, limit))
+        self.num_strips = max(1, min(num_strips or os.cpu_count() or 1, nrows, limit))
+        self.row_starts = strip_bounds(nrows, self.num_strips)
+        self._households = None
+
+        fertility_map = environment.fertility_map
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, fertility_map.nbytes))
+        shared = np.ndarray(fertility_map.shape, dtype=fertility_map.dtype, buffer=self._shm.buf)
+        shared[:] = fertility_map
+        environment.fertility_map = shared
+
+        strips = [[] for _ in range(self.num_strips)]
+        for house in households:
+            strips[self.strip_of(house.position[1])].append(house)
+
+        row_ends = self.row_starts[1:] + [nrows]
+        self._connections = []
+        self._processes = []
+        for index in range(self.num_strips):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_run_worker, daemon=True,
+                args=(child, environment, self._shm.name, strips[index], num_generations,
+                      engine, self.row_starts[index], row_ends[index],
+                      random.getrandbits(64)))
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    @property
+    def households(self):
+        """Accesses copies of the living households of all strips."""
+        if self._households is None:
+            self._households = [house for strip in self.broadcast('households')
+                                for house in strip]
+        return self._households
+
+    @households.setter
+    def households(self, households):
+        """Replaces the list of households; only supported before start up."""
+        if hasattr(self, '_connections'):
+            raise AttributeError('The households of a DecomposedSimulation are read-only')
+        Simulation.households.fset(self, households)
+
+    def num_households(self):
+        """Returns the number of living households without gathering them."""
+        if self._households is not None:
+            return len(self._households)
+        return sum(self.broadcast('count'))
+
+    def summary(self):
+        """Returns a dictionary summarising the current state of the run."""
+        snapshot = self.snapshot()
+        return {'generation': self.generation,
+                'num_households': len(snapshot['id']),
+                'population': float(snapshot['num_workers'].sum()),
+                'total_grain': float(snapshot['grain'].sum()),
+                'stop_reason': self.stop_reason}
+
+    def add_household(self, household):
+        """Adds a new household to the strip containing it."""
+        self.call(self.strip_of(household.position[1]), 'accept', [household])
+        self._households = None
+
+    def min_strip_height(self, max_workers):
+        """Returns the rows a strip needs to separate two strips farming together."""
+        if self.constants is None:
+            return 1
+        return 2 * field_reach(self.constants, max_workers)
+
+    def farm_rounds(self, max_workers):
+        """Returns the lists of strips that farm concurrently, round by round.
+
+        The even and then the odd strips farm together, unless households
+        with max_workers could reach across the strip between them, in which
+        case every strip farms on its own.
+        """
+        height = min(end - start for start, end in zip(
+            self.row_starts, self.row_starts[1:] + [self.environment.shape[0]]))
+        if self.num_strips <= 2 or height >= self.min_strip_height(max_workers):
+            return [list(range(parity, self.num_strips, 2)) for parity in (0, 1)]
+        logger.warning('Households with %d workers reach across strips of %d rows; '
+                       'farming the strips one at a time', max_workers, height)
+        return [[index] for index in range(self.num_strips)]
+
+    def strip_of(self, y_pos):
+        """Returns the index of the strip that contains row y_pos."""
+        return bisect.bisect_right(self.row_starts, y_pos) - 1
+
+    def send(self, index, command, *args):
+        """Sends a command to the worker of strip index."""
+        self._connections[index].send((command, args))
+
+    def receive(self, index):
+        """Returns the result of the last command sent to the worker of strip index."""
+        status, result = self._connections[index].recv()
+        if status == 'error':
+            raise RuntimeError('Strip {0} failed:\n{1}'.format(index, result))
+        return result
+
+    def call(self, index, command, *args):
+        """Runs a command in the worker of strip index and returns its result."""
+        self.send(index, command, *args)
+        return self.receive(index)
+
+    def broadcast(self, command, indices=None, args=None):
+        """Runs a command in several workers concurrently.
+
+        Args:
+            command: Name of a StripWorker method.
+            indices: Strips to run the command in. Defaults to all strips.
+            args: Optional list with a tuple of arguments for every strip.
+
+        Returns:
+            List of the results in the order of indices.
+        """
+        if indices is None:
+            indices = range(self.num_strips)
+        indices = list(indices)
+        for position, index in enumerate(indices):
+            self.send(index, command, *(args[position] if args else ()))
+        return [self.receive(index) for index in indices]
+
+    def step(self, presenter=None, observers=()):
+        """Advances the decomposed simulation by exactly one year.
+
+        Args:
+            presenter: Optional presenter whose update method is called once
+                the interactions of the year have completed.
+            observers: Observers notified at the same point, subject to their
+                cadence.
+        """
+        clock = time.perf_counter
+        start = clock()
+        self._households = None
+        radii = [0] * self.num_strips
+        max_workers = max(self.broadcast('max_workers'))
+        for indices in self.farm_rounds(max_workers):
+            for index, radius in zip(indices, self.broadcast('farm', indices)):
+                radii[index] = radius
+        farmed = clock()
+
+        last = self.num_strips - 1
+        for parity in (0, 1):
+            boundaries = list(range(parity, last, 2))
+            halos = self.broadcast('halo', [index + 1 for index in boundaries],
+                                   [(radii[index] + radii[index + 1],) for index in boundaries])
+            indices = boundaries
+            if last % 2 == parity:
+                # The last strip has no boundary below it and no ghosts.
+                indices = boundaries + [last]
+                halos = halos + [[]]
+            ghosts = self.broadcast('interact', indices, [(halo,) for halo in halos])
+            self.broadcast('merge', [index + 1 for index in boundaries],
+                           [(returned,) for returned in ghosts[:len(boundaries)]])
+        interacted = clock()
+
+        if presenter is not None:
+            presenter.update()
+        self.notify(observers)
+        observed = clock()
+
+        migrants = [[] for _ in range(self.num_strips)]
+        for emigrants, dirty_tiles in self.broadcast('grow'):
+            self.environment.dirty_tiles |= dirty_tiles
+            self.environment.touch(dirty_tiles)
+            for house in emigrants:
+                migrants[self.strip_of(house.position[1])].append(house)
+        indices = [index for index in range(self.num_strips) if migrants[index]]
+        self.broadcast('accept', indices, [(migrants[index],) for index in indices])
+        grown = clock()
+
+        self.environment_phase()
+        self.phase_times = {'farm': farmed - start, 'interact': interacted - farmed,
+                            'observe': observed - interacted, 'growth': grown - observed,
+                            'environment': clock() - grown}
+        self.generation += 1
+        self._households = None
+
+    def snapshot(self):
+        """Returns the household columns of all strips as numpy arrays."""
+        if self._observing and self._snapshot is not None:
+            return self._snapshot
+        parts = self.broadcast('snapshot')
+        columns = {column: np.concatenate([part[column] for part in parts])
+                   for column in parts[0]}
+        if self._observing:
+            self._snapshot = columns
+        return columns
+
+    def close(self):
+        """Stops the workers and moves the fertility_map out of shared memory."""
+        if self._shm is None:
+            return
+        for connection in self._connections:
+            connection.send(('close', ()))
+        for process, connection in zip(self._processes, self._connections):
+            process.join()
+            connection.close()
+        self.environment.fertility_map = np.copy(self.environment.fertility_map)
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
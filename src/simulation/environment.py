@@ -1,10 +1,24 @@
+import functools
+
 import numpy as np
 
+try:
+    from scipy import ndimage
+except ImportError:
+    ndimage = None
+
 class Environment:
     """Represents the simulation landscape (the Nile River).
 
     Attributes:
         FLOOD_FREQ: Frequency in which a flood replenishes the land.
+        REGENERATION_RATE: Annual logistic recovery rate of harvested land
+            towards its original fertility (0.0 disables recovery).
+        SILT_RATE: Annual fraction of the fertility deficit restored by silt
+            spreading from the river (0.0 disables silt deposits).
+        SILT_SPREAD: Width in pixels of the silt field around the river.
+        TILE_SIZE: Side length in pixels of the tiles used to track which parts
+            of the fertility_map differ from the original fertility.
         river_map: numpy.ndarray in which river pixels have a value of 1.0 and
             the remaining pixels have a value of 0.0.
         fertility_map: numpy.ndarray in which fertility values vary between 0.0
@@ -12,9 +26,30 @@ class Environment:
         self.flood_map: numpy.ndarray that stores the original fertility_map.
         self.shape: A tuple recording the number of rows and columns of all
             maps.
+        silt_map: numpy.ndarray between 0.0 and 1.0 holding how strongly the
+            river's silt reaches every land pixel, or None if SILT_RATE is 0.
+        dirty_tiles: Boolean numpy.ndarray with one entry per tile that is set
+            when the tile has been harvested since it was last fully restored.
+        changes: Number of changes made to the fertility_map so far.
+        tile_changes: Integer numpy.ndarray with one entry per tile holding
+            the value of changes when the tile's fertility last changed, so
+            that tiles changed since any earlier point can be found.
+        river_distance: numpy.ndarray holding the Euclidean distance in pixels
+            from every pixel to the nearest river pixel.
+        region_map: Optional integer numpy.ndarray that labels every pixel
+            with its region (e.g. a nome), numbered from 0. Negative labels
+            mark pixels outside any region.
+        num_regions: Number of regions labelled in region_map (0 without a
+            region_map).
+        ownership: int32 numpy.ndarray holding the index of the field that
+            owns every pixel, or -1 for unowned pixels. None until fields have
+            been assigned.
     """
 
-    def __init__(self, river_map, fertility_map, shape, const_config):
+    TILE_SIZE = 32
+
+    def __init__(self, river_map, fertility_map, shape, const_config, river_distance=None,
+                 region_map=None):
         """Initialises environment attributes upon instantiation.
 
         Args:
@@ -26,16 +61,358 @@ class Environment:
                 environment (all maps have the same shape).
             const_config: A dictionary containing the constant start parameters
                 of the simulation.
+            river_distance: Optional precomputed distance_to_river of
+                river_map, e.g. loaded from a cache file. Otherwise it is
+                computed on first access.
+            region_map: Optional integer label raster with the same shape as
+                the other maps.
         """
         self.FLOOD_FREQ = const_config['flood_frequency']
+        self.REGENERATION_RATE = const_config.get('regeneration_rate', 0.0)
+        self.SILT_RATE = const_config.get('silt_rate', 0.0)
+        self.SILT_SPREAD = const_config.get('silt_spread', 10)
         self.river_map = river_map
         self.fertility_map = fertility_map
         self.flood_map = np.copy(fertility_map)
         self.shape = shape
+        self._river_distance = river_distance
+        self.region_map = None
+        self.num_regions = 0
+        if region_map is not None:
+            self.load_regions(region_map)
 
+        nrows, ncols = shape
+        tile_rows = -(-nrows // self.TILE_SIZE)
+        tile_cols = -(-ncols // self.TILE_SIZE)
+        self.dirty_tiles = np.zeros((tile_rows, tile_cols), dtype=bool)
+        self.changes = 0
+        self.tile_changes = np.zeros((tile_rows, tile_cols), dtype=np.int64)
+        self.ownership = None
+        self._fields = []
+        self.silt_map = None
+        if self.SILT_RATE:
+            self.silt_map = silt_diffusion(river_map, self.SILT_SPREAD)
 
     def flood(self, generation):
-        """Resets the fertility_map to its original fertility values."""
+        """Resets the fertility_map to its original fertility values.
+
+        The fertility_map is restored in place, so it may live in shared
+        memory.
+
+        Returns:
+            True if a flood occurred in this generation, otherwise False.
+        """
         if self.FLOOD_FREQ and generation % self.FLOOD_FREQ == 0:
-            self.fertility_map = self.flood_map
-            self.flood_map = np.copy(self.fertility_map)
+            np.copyto(self.fertility_map, self.flood_map)
+            self.touch(self.dirty_tiles)
+            self.dirty_tiles[:] = False
+            return True
+        return False
+
+    @property
+    def river_distance(self):
+        """Accesses the distance_to_river of the river_map.
+
+        It is computed (or taken from the process cache) on first access.
+        """
+        if self._river_distance is None:
+            self._river_distance = cached_distance_to_river(self.river_map)
+        return self._river_distance
+
+    @river_distance.setter
+    def river_distance(self, river_distance):
+        self._river_distance = river_distance
+
+    def distance_to_river(self, x_pos, y_pos):
+        """Returns the distance in pixels from a position to the nearest river pixel."""
+        return self.river_distance[y_pos, x_pos]
+
+    def river_distances(self, x_pos, y_pos):
+        """Returns the distances to the river of arrays of x and y positions."""
+        return self.river_distance[np.asarray(y_pos), np.asarray(x_pos)]
+
+    def load_regions(self, region_map):
+        """Sets the label raster that assigns every pixel to a region."""
+        region_map = np.asarray(region_map)
+        if region_map.shape != tuple(self.shape[:2]):
+            raise ValueError('region_map has shape {0}, expected {1}'.format(
+                region_map.shape, tuple(self.shape[:2])))
+        if not np.issubdtype(region_map.dtype, np.integer):
+            raise ValueError('region_map must contain integer labels')
+        self.region_map = region_map.astype(np.int32)
+        self.num_regions = int(self.region_map.max()) + 1 if self.region_map.size else 0
+
+    def regions(self, x_pos, y_pos):
+        """Returns the region labels of arrays of x and y positions."""
+        return self.region_map[np.asarray(y_pos), np.asarray(x_pos)]
+
+    def mark_dirty(self, x_start, y_start, x_end, y_end):
+        """Records that the fertility of a rectangle of pixels has changed."""
+        size = self.TILE_SIZE
+        if x_end > x_start and y_end > y_start:
+            tiles = (slice(y_start // size, (y_end - 1) // size + 1),
+                     slice(x_start // size, (x_end - 1) // size + 1))
+            self.dirty_tiles[tiles] = True
+            self.changes += 1
+            self.tile_changes[tiles] = self.changes
+
+    def touch(self, tiles):
+        """Records that the fertility of a boolean mask of tiles has changed."""
+        self.changes += 1
+        self.tile_changes[tiles] = self.changes
+
+    def assign_fields(self, x_start, y_start, x_end, y_end):
+        """Resolves claimed fields into the ownership raster.
+
+        The fields are given in priority order (descending grain): a pixel
+        claimed by several fields belongs to the first of them. Only the
+        windows of the previously assigned fields are cleared, so the cost
+        follows the claimed area rather than the map.
+
+        Args:
+            x_start, y_start, x_end, y_end: Integer arrays of the field bounds,
+                as returned by Household.field_bounds.
+        """
+        if self.ownership is None:
+            self.ownership = np.full(self.shape[:2], -1, dtype=np.int32)
+        ownership = self.ownership
+        for x_0, y_0, x_1, y_1 in self._fields:
+            ownership[y_0:y_1, x_0:x_1] = -1
+        self._fields = list(zip(*(np.asarray(bounds, dtype=np.int64).tolist()
+                                  for bounds in (x_start, y_start, x_end, y_end))))
+        # Earlier fields are painted last, so they overwrite later ones.
+        for index in range(len(self._fields) - 1, -1, -1):
+            x_0, y_0, x_1, y_1 = self._fields[index]
+            ownership[y_0:y_1, x_0:x_1] = index
+
+    def owner(self, x_pos, y_pos):
+        """Returns the index of the field that owns a pixel, or -1."""
+        return -1 if self.ownership is None else int(self.ownership[y_pos, x_pos])
+
+    def owners(self, x_pos, y_pos):
+        """Returns the owning field indices of arrays of x and y positions."""
+        if self.ownership is None:
+            return np.full(np.shape(x_pos), -1, dtype=np.int32)
+        return self.ownership[np.asarray(y_pos), np.asarray(x_pos)]
+
+    def harvest_owned(self, capacity, competency, max_potential_yield):
+        """Harvests the fields last assigned by assign_fields.
+
+        Each field yields the same harvest as Household.farm on the pixels it
+        owns: its available grain, capped by its capacity and scaled by its
+        competency, is harvested and its pixels keep the unharvested share of
+        their fertility. Only the windows of the fields are visited.
+
+        Args:
+            capacity: Array of the grain each field's workers can harvest
+                (num_workers * worker_capability).
+            competency: Array of the competency of each field's household.
+            max_potential_yield: Grain harvested per unit of fertility.
+
+        Returns:
+            float64 array of the harvest of every field.
+        """
+        count = len(capacity)
+        fertility_map = self.fertility_map
+        windows = []
+        available = np.zeros(count)
+        for index, (x_0, y_0, x_1, y_1) in enumerate(self._fields):
+            window = (slice(y_0, y_1), slice(x_0, x_1))
+            owned = self.ownership[window] == index
+            windows.append((window, owned))
+            available[index] = fertility_map[window][owned].sum(dtype=np.float64)
+        available *= max_potential_yield
+        harvest = np.minimum(available, capacity) * competency
+        remaining = np.divide(available - harvest, available, out=np.ones(count),
+                              where=available > 0)
+        for index, (window, owned) in enumerate(windows):
+            if available[index] > 0:
+                fertility = fertility_map[window]
+                fertility[owned] = fertility[owned] * remaining[index]
+                self.mark_dirty(*self._fields[index])
+        return harvest
+
+    def regenerate(self):
+        """Partially restores the fertility of harvested land for a year.
+
+        Harvested land recovers logistically towards its original fertility
+        and additionally receives silt from the river. The silt field is
+        static: silt_diffusion computes it once from the river_map when the
+        Environment is built and no silt is diffused here, as the river does
+        not move. Only the dirty tiles are updated, one slice at a time, so the
+        cost follows the harvested area rather than the map; a tile is marked
+        clean again once it has fully recovered.
+
+        Returns:
+            True if any fertility was restored, otherwise False.
+        """
+        if not (self.REGENERATION_RATE or self.SILT_RATE) or not self.dirty_tiles.any():
+            return False
+        size = self.TILE_SIZE
+        self.touch(self.dirty_tiles)
+        for tile_row, tile_col in np.argwhere(self.dirty_tiles):
+            tile = (slice(tile_row * size, (tile_row + 1) * size),
+                    slice(tile_col * size, (tile_col + 1) * size))
+            fertility = self.fertility_map[tile]
+            pristine = self.flood_map[tile]
+            deficit = pristine - fertility
+            if self.REGENERATION_RATE:
+                relative = np.divide(fertility, pristine, out=np.ones_like(fertility),
+                                     where=pristine > 0)
+                fertility += self.REGENERATION_RATE * fertility * (1 - relative)
+            if self.silt_map is not None:
+                fertility += self.SILT_RATE * self.silt_map[tile] * deficit
+            np.minimum(fertility, pristine, out=fertility)
+            np.subtract(pristine, fertility, out=deficit)
+            if deficit.max() <= 1e-6:
+                self.dirty_tiles[tile_row, tile_col] = False
+        return True
+
+
+def band_regions(shape, num_regions):
+    """Returns a label raster of num_regions equal bands of rows.
+
+    As the river runs from the top to the bottom of the map, the bands divide
+    the valley into consecutive stretches, similar to the nomes of Egypt.
+    """
+    nrows, ncols = shape[:2]
+    labels = (np.arange(nrows) * num_regions // nrows).astype(np.int32)
+    return np.repeat(labels[:, None], ncols, axis=1)
+
+
+def lower_envelope(values):
+    """Computes the 1-D squared distance transform of every row of values.
+
+    Uses the lower envelope of parabolas of Felzenszwalb and Huttenlocher, in
+    time linear in the number of columns. The rows are processed in lockstep,
+    so every step is a numpy operation over all rows.
+
+    Args:
+        values: Finite float64 array of shape (rows, cols).
+
+    Returns:
+        float64 array whose element [r, p] is the minimum over q of
+        values[r, q] + (p - q)**2.
+    """
+    nrows, ncols = values.shape
+    rows = np.arange(nrows)
+    squares = np.arange(ncols, dtype=np.float64)**2
+    # Columns of the parabolas of the envelope and the boundaries between them.
+    vertices = np.zeros((nrows, ncols), dtype=np.int64)
+    bounds = np.empty((nrows, ncols + 1), dtype=np.float64)
+    bounds[:, 0] = -np.inf
+    bounds[:, 1] = np.inf
+    top = np.zeros(nrows, dtype=np.int64)
+
+    def intersection(col, active):
+        vertex = vertices[active, top[active]]
+        return ((values[active, col] + squares[col] - values[active, vertex] - squares[vertex])
+                / (2.0 * (col - vertex)))
+
+    for col in range(1, ncols):
+        crossing = intersection(col, rows)
+        hidden = crossing <= bounds[rows, top]
+        while hidden.any():
+            active = rows[hidden]
+            top[active] -= 1
+            crossing[active] = intersection(col, active)
+            hidden[active] = crossing[active] <= bounds[active, top[active]]
+        top += 1
+        vertices[rows, top] = col
+        bounds[rows, top] = crossing
+        bounds[rows, top + 1] = np.inf
+
+    result = np.empty((nrows, ncols), dtype=np.float64)
+    top[:] = 0
+    for col in range(ncols):
+        behind = bounds[rows, top + 1] < col
+        while behind.any():
+            top[behind] += 1
+            behind[behind] = bounds[rows[behind], top[behind] + 1] < col
+        vertex = vertices[rows, top]
+        result[:, col] = (col - vertex)**2 + values[rows, vertex]
+    return result
+
+
+def distance_to_river(river_map, chunk_size=2**22):
+    """Computes the Euclidean distance transform of river_map.
+
+    Uses scipy.ndimage when it is installed. Otherwise the exact transform is
+    computed in two separable passes in time linear in the number of pixels:
+    the distance to the nearest river pixel within each column, followed by
+    the lower_envelope of every row, in blocks of about chunk_size pixels.
+
+    Returns:
+        A float32 numpy.ndarray with the distance in pixels from every pixel
+        to the nearest river pixel (0.0 on the river, inf without a river).
+    """
+    river = river_map > 0
+    if not river.any():
+        return np.full(river.shape, np.inf, dtype=np.float32)
+    if ndimage is not None:
+        return ndimage.distance_transform_edt(~river).astype(np.float32)
+
+    nrows, ncols = river.shape
+    rows = np.arange(nrows)[:, None]
+    # Columns without a river get a distance beyond any real one.
+    far = nrows + ncols
+    previous = np.maximum.accumulate(np.where(river, rows, -far), axis=0)
+    following = np.minimum.accumulate(np.where(river, rows, 2 * far)[::-1], axis=0)[::-1]
+    column_distance = np.minimum(rows - previous, following - rows).astype(np.float64)**2
+
+    distance = np.empty((nrows, ncols), dtype=np.float32)
+    chunk_rows = max(1, chunk_size // ncols)
+    for start in range(0, nrows, chunk_rows):
+        distance[start:start + chunk_rows] = np.sqrt(
+            lower_envelope(column_distance[start:start + chunk_rows]))
+    return distance
+
+
+def cached_distance_to_river(river_map):
+    """Returns distance_to_river(river_map), computing it once per river map.
+
+    The distances of the most recently used river maps are kept, keyed by the
+    contents of the river map, so Environments sharing a river map share the
+    distances.
+    """
+    river = np.ascontiguousarray(river_map > 0)
+    return _distance_to_packed_river(river.shape, np.packbits(river).tobytes())
+
+
+@functools.lru_cache(maxsize=4)
+def _distance_to_packed_river(shape, packed_river):
+    """Returns the read-only distance_to_river of a bit-packed river mask."""
+    river = np.unpackbits(np.frombuffer(packed_river, dtype=np.uint8),
+                          count=shape[0] * shape[1]).reshape(shape)
+    distance = distance_to_river(river)
+    distance.flags.writeable = False
+    return distance
+
+
+def silt_diffusion(river_map, spread):
+    """Returns how strongly silt from the river reaches every pixel.
+
+    The river mask is blurred with three passes of a separable box filter
+    along each axis, which approximates a Gaussian diffusion of width spread
+    pixels. The result is scaled to a maximum of 1.0 on land and is 0.0 on
+    river pixels.
+    """
+    silt = (river_map > 0).astype(np.float32)
+    radius = max(1, int(spread))
+    for axis in (0, 1):
+        for _ in range(3):
+            silt = _box_blur(silt, radius, axis)
+    silt[river_map > 0] = 0
+    peak = silt.max()
+    return silt / peak if peak else silt
+
+
+def _box_blur(values, radius, axis):
+    """Averages values over a window of 2 * radius + 1 pixels along axis."""
+    width = 2 * radius + 1
+    padding = [(0, 0), (0, 0)]
+    padding[axis] = (radius + 1, radius)
+    cumulative = np.cumsum(np.pad(values, padding, mode='edge'), axis=axis, dtype=np.float64)
+    upper = np.take(cumulative, np.arange(width, cumulative.shape[axis]), axis=axis)
+    lower = np.take(cumulative, np.arange(0, cumulative.shape[axis] - width), axis=axis)
+    return ((upper - lower) / width).astype(np.float32)
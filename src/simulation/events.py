@@ -0,0 +1,197 @@
+"""Compact binary event trace of a simulation run.
+
+Every state change of the households and the landscape is appended to a trace
+file as a fixed-size little-endian record:
+
+    year (uint32), kind (uint8), actor (uint32), target (uint32),
+    x (int32), y (int32), amount (float64), value (float64)
+
+Households are identified by small integer actor numbers that are assigned in
+the order in which households first appear in the trace. The trace is enough to
+rebuild the household state and fertility_map of every year offline (see
+simulation/replay.py). The Config of the run is saved next to the trace so
+that a replay uses the parameters the run was started with.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+from simulation.config import Config
+
+MAGIC = b'EGYPTEV1'
+HEADER = struct.Struct('<8sII')
+RECORD = struct.Struct('<IBIIiidd')
+RECORD_DTYPE = np.dtype([('year', '<u4'), ('kind', 'u1'), ('actor', '<u4'), ('target', '<u4'),
+                         ('x', '<i4'), ('y', '<i4'), ('amount', '<f8'), ('value', '<f8')])
+
+# Event kinds. The meaning of the x, y, amount and value fields of each kind is
+# documented on the EventWriter method that emits it.
+SPAWN = 0
+HARVEST = 1
+CONSUME = 2
+PLUNDER = 3
+COLLABORATE = 4
+DEATH = 5
+RELOCATE = 6
+GROW = 7
+ATTRIBUTE = 8
+FLOOD = 9
+CENSUS = 10
+REGENERATE = 11
+
+KIND_NAMES = ('spawn', 'harvest', 'consume', 'plunder', 'collaborate', 'death',
+              'relocate', 'grow', 'attribute', 'flood', 'census', 'regenerate')
+
+# Attribute codes stored in the target field of ATTRIBUTE events.
+ATTRIBUTES = ('worker_capability', 'competency', 'ambition', 'interaction')
+
+
+class EventWriter:
+    """Appends fixed-size event records to a trace file through a buffer.
+
+    Attributes:
+        path: Path to the trace file.
+        buffer_records: Number of buffered records that triggers a write.
+        actors: Dictionary mapping household ids to actor numbers.
+    """
+
+    def __init__(self, path, shape, buffer_records=65536, config=None):
+        """Opens the trace file and writes its header.
+
+        Args:
+            path: Path to the trace file. An existing file is overwritten.
+            shape: Tuple recording the number of rows and columns of the
+                environment.
+            buffer_records: Number of buffered records that triggers a write.
+            config: Config of the traced run, saved to path + '.config.json'.
+        """
+        self.path = path
+        self.buffer_records = buffer_records
+        self.actors = {}
+        self._buffer = bytearray()
+        self._buffer_limit = buffer_records * RECORD.size
+        self._file = open(path, 'wb')
+        nrows, ncols = shape
+        self._file.write(HEADER.pack(MAGIC, nrows, ncols))
+        if config is not None:
+            with open(path + '.config.json', 'w') as f:
+                json.dump(config.to_dict(), f)
+
+    def actor(self, household):
+        """Returns the actor number of a household, assigning one if needed."""
+        actor = self.actors.get(household.id)
+        if actor is None:
+            actor = self.actors[household.id] = len(self.actors)
+        return actor
+
+    def emit(self, year, kind, actor, target=0, x=0, y=0, amount=0.0, value=0.0):
+        """Appends a single record to the buffer."""
+        self._buffer += RECORD.pack(year, kind, actor, target, x, y, amount, value)
+        if len(self._buffer) >= self._buffer_limit:
+            self.flush()
+
+    def spawn(self, year, household):
+        """Records a new household: position, grain (amount) and workers (value)."""
+        actor = self.actor(household)
+        x_pos, y_pos = household.position
+        self.emit(year, SPAWN, actor, 0, x_pos, y_pos, household.grain, household.num_workers)
+        for code, attr in enumerate(ATTRIBUTES):
+            self.emit(year, ATTRIBUTE, actor, code, value=getattr(household, attr))
+
+    def harvest(self, year, household, claimed_field, harvest):
+        """Records a harvest: field centre (x, y), harvest (amount) and area (value)."""
+        (x_field, y_field), claimed_area = claimed_field
+        self.emit(year, HARVEST, self.actor(household), 0, x_field, y_field,
+                  harvest, claimed_area)
+
+    def consume(self, year, household):
+        """Records the grain (amount) and workers (value) left after consumption."""
+        self.emit(year, CONSUME, self.actor(household), amount=household.grain,
+                  value=household.num_workers)
+
+    def plunder(self, year, household, rival, stolen_grain, stolen_workers):
+        """Records a plunder of rival: stolen grain (amount) and workers (value)."""
+        self.emit(year, PLUNDER, self.actor(household), self.actor(rival),
+                  amount=stolen_grain, value=stolen_workers)
+
+    def collaborate(self, year, household, partner, gain):
+        """Records a collaboration: worker capability gained (amount)."""
+        self.emit(year, COLLABORATE, self.actor(household), self.actor(partner), amount=gain)
+
+    def death(self, year, household):
+        """Records the removal of a household without workers."""
+        self.emit(year, DEATH, self.actor(household))
+
+    def relocate(self, year, household):
+        """Records the new position (x, y) of a household."""
+        x_pos, y_pos = household.position
+        self.emit(year, RELOCATE, self.actor(household), 0, x_pos, y_pos)
+
+    def grow(self, year, household):
+        """Records the number of workers (value) after growth."""
+        self.emit(year, GROW, self.actor(household), value=household.num_workers)
+
+    def attribute(self, year, household, attr):
+        """Records the new value of one of the ATTRIBUTES."""
+        self.emit(year, ATTRIBUTE, self.actor(household), ATTRIBUTES.index(attr),
+                  value=getattr(household, attr))
+
+    def flood(self, year):
+        """Records a flood that restored the original fertility."""
+        self.emit(year, FLOOD, 0)
+
+    def regenerate(self, year):
+        """Records the annual regeneration of the fertility_map."""
+        self.emit(year, REGENERATE, 0)
+
+    def census(self, year):
+        """Records the point of the year at which the state is observed."""
+        self.emit(year, CENSUS, 0)
+
+    def flush(self):
+        """Writes the buffered records to the trace file."""
+        self._file.write(self._buffer)
+        self._buffer = bytearray()
+
+    def close(self):
+        """Flushes the buffer, closes the trace and saves the actor ids."""
+        self.flush()
+        self._file.close()
+        ids = {str(id): actor for id, actor in self.actors.items()}
+        with open(self.path + '.ids.json', 'w') as f:
+            json.dump(ids, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_trace(path):
+    """Reads a trace file and returns its shape and records.
+
+    Returns:
+        A tuple containing the (nrows, ncols) shape of the environment and a
+        numpy structured array of records with RECORD_DTYPE fields. The records
+        are memory mapped rather than loaded.
+    """
+    with open(path, 'rb') as f:
+        magic, nrows, ncols = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError('{0} is not an event trace'.format(path))
+    if os.path.getsize(path) == HEADER.size:
+        return (nrows, ncols), np.empty(0, dtype=RECORD_DTYPE)
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size)
+    return (nrows, ncols), records
+
+
+def read_config(path):
+    """Returns the Config saved next to a trace, or None if there is none."""
+    config_path = path + '.config.json'
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path) as f:
+        return Config.from_dicts(json.load(f))
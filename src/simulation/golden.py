@@ -0,0 +1,305 @@
+"""Records golden traces of a simulation and checks other engines against them.
+
+A GoldenTrace holds one TraceRecord per phase of every simulated year: a hash
+of the complete state (every household and the fertility_map) and a few key
+aggregates. A trace recorded from the reference Simulation under a fixed seed
+is the golden trace. A faster engine is equivalent if its own trace matches:
+
+    exactly           every state hash is identical,
+    within tolerance  every aggregate agrees within rtol and atol, or
+    statistically     across many seeds, the mean of every yearly aggregate
+                      agrees within a number of standard errors.
+
+Each check reports the first diverging year, phase and aggregate. Household
+ids are uuid1 values that differ between runs, so they are not hashed. The
+households are hashed in a canonical order, so engines that keep their
+households in a different order still match.
+
+    python golden.py record trace.json seed years
+    python golden.py check trace.json scheduler|array|decomposed
+
+The check runs the engine under the seed of the golden trace: the
+HarvestScheduler must match it exactly and the ArrayEngine within ENGINE_RTOL.
+A DecomposedSimulation is compared statistically with the reference over
+DECOMPOSED_SEEDS seeds for as many years as the golden trace covers.
+"""
+import hashlib
+import json
+import random
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from simulation.config import Config
+from simulation.environment import Environment
+from simulation.harvest import HarvestScheduler
+from simulation.kernels import ArrayEngine
+from simulation import simulation_driver
+
+PHASES = ('farm', 'interact', 'growth', 'environment')
+AGGREGATES = ('num_households', 'population', 'grain', 'worker_capability', 'fertility')
+COLUMNS = ('num_workers', 'grain', 'worker_capability', 'competency', 'ambition')
+ENGINES = ('scheduler', 'array', 'decomposed')
+# Relative tolerance of the aggregates of the ArrayEngine.
+ENGINE_RTOL = 1e-5
+# Seeds over which a DecomposedSimulation is compared with the reference.
+DECOMPOSED_SEEDS = 16
+
+
+class TraceRecord(namedtuple('TraceRecord', ('year', 'phase', 'state_hash') + AGGREGATES)):
+    """The state of a simulation at the end of a phase of a year."""
+
+    __slots__ = ()
+
+
+class Divergence(namedtuple('Divergence', ['year', 'phase', 'field', 'expected', 'actual'])):
+    """The first point at which a trace differs from the golden trace."""
+
+    __slots__ = ()
+
+    def __str__(self):
+        return 'Diverged in year {0}, phase {1}: {2} expected {3!r}, got {4!r}'.format(
+            self.year, self.phase, self.field, self.expected, self.actual)
+
+
+def state_columns(simulation):
+    """Returns the household columns of a simulation in a canonical order."""
+    households = simulation.households
+    count = len(households)
+    columns = [np.fromiter((house.position[axis] for house in households), dtype=np.float64,
+                           count=count) for axis in (0, 1)]
+    columns += [np.fromiter((float(getattr(house, column)) for house in households),
+                            dtype=np.float64, count=count) for column in COLUMNS]
+    order = np.lexsort(columns[::-1])
+    return [column[order] for column in columns]
+
+
+def state_hash(simulation):
+    """Returns a sha1 hex digest of the households and the fertility_map."""
+    digest = hashlib.sha1()
+    for column in state_columns(simulation):
+        digest.update(np.ascontiguousarray(column).tobytes())
+    digest.update(np.ascontiguousarray(simulation.environment.fertility_map).tobytes())
+    return digest.hexdigest()
+
+
+def trace_record(simulation, year, phase):
+    """Returns the TraceRecord of the current state of a simulation."""
+    households = simulation.households
+    return TraceRecord(
+        year, phase, state_hash(simulation), len(households),
+        float(sum(house.num_workers for house in households)),
+        float(sum(house.grain for house in households)),
+        float(sum(house.worker_capability for house in households)),
+        float(simulation.environment.fertility_map.sum(dtype=np.float64)))
+
+
+class GoldenTrace:
+    """The per-phase state hashes and aggregates of a simulation run.
+
+    Attributes:
+        records: List of TraceRecord objects in the order they were recorded.
+        seed: Seed the run was recorded under, or None.
+    """
+
+    def __init__(self, records, seed=None):
+        self.records = list(records)
+        self.seed = seed
+
+    @classmethod
+    def record(cls, simulation, n_years, seed=None):
+        """Runs a simulation for n_years and returns its trace.
+
+        A Simulation is stepped phase by phase in the order of Simulation.step
+        (observers are not notified), with a record after every phase.
+        Engines that override step, such as DecomposedSimulation, are stepped
+        a year at a time and only the environment phase, which ends the year,
+        is recorded.
+        """
+        records = []
+        by_phase = type(simulation).step is simulation_driver.Simulation.step
+        for _ in range(n_years):
+            year = simulation.generation
+            if by_phase:
+                simulation.farm_phase()
+                records.append(trace_record(simulation, year, 'farm'))
+                simulation.interact()
+                records.append(trace_record(simulation, year, 'interact'))
+                simulation.growth_phase()
+                records.append(trace_record(simulation, year, 'growth'))
+                simulation.environment_phase()
+                simulation.generation += 1
+            else:
+                simulation.step()
+            records.append(trace_record(simulation, year, 'environment'))
+        return cls(records, seed)
+
+    @classmethod
+    def from_factory(cls, build, seed, n_years):
+        """Seeds the random module, builds a simulation and records its trace.
+
+        Args:
+            build: Callable that receives the seed and returns a new
+                simulation. It is called after random.seed(seed), so the
+                households it creates depend on the seed.
+            seed: Seed of the run.
+            n_years: Number of years to record.
+        """
+        random.seed(seed)
+        return cls.record(build(seed), n_years, seed)
+
+    def year_ends(self):
+        """Returns the records that end each year."""
+        return [record for record in self.records if record.phase == 'environment']
+
+    def compare(self, other, rtol=0.0, atol=0.0):
+        """Returns the first Divergence of another trace, or None if it matches.
+
+        Only the phases recorded in the other trace are compared. Without
+        tolerances, the state hashes must be identical. The reported field is
+        the first aggregate that differs, or state_hash if only the hash
+        differs. With a tolerance, only the aggregates are compared.
+        """
+        golden = {(record.year, record.phase): record for record in self.records}
+        exact = not rtol and not atol
+        for record in other.records:
+            expected = golden.get((record.year, record.phase))
+            if expected is None:
+                return Divergence(record.year, record.phase, 'record', None, record)
+            if exact and expected.state_hash == record.state_hash:
+                continue
+            for field in AGGREGATES:
+                expected_value, actual = getattr(expected, field), getattr(record, field)
+                if not np.isclose(actual, expected_value, rtol=rtol, atol=atol):
+                    return Divergence(record.year, record.phase, field, expected_value, actual)
+            if exact:
+                return Divergence(record.year, record.phase, 'state_hash', expected.state_hash,
+                                  record.state_hash)
+        years = {record.year for record in other.records}
+        missing = [record for record in self.year_ends() if record.year not in years]
+        if missing:
+            return Divergence(missing[0].year, missing[0].phase, 'record', missing[0], None)
+        return None
+
+    def save(self, path):
+        """Writes the trace to a json file."""
+        with open(path, 'w') as trace_file:
+            json.dump({'seed': self.seed, 'fields': TraceRecord._fields,
+                       'records': [list(record) for record in self.records]}, trace_file)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a trace written by save."""
+        with open(path) as trace_file:
+            data = json.load(trace_file)
+        return cls([TraceRecord(*record) for record in data['records']], data['seed'])
+
+
+def compare_seeds(reference, candidate, seeds, n_years, z=4.0, atol=1e-9):
+    """Compares the yearly aggregates of two engines statistically across seeds.
+
+    For every year and aggregate, the difference between the mean over the
+    seeds of the two engines must be within z standard errors of the
+    difference.
+
+    Args:
+        reference: Callable that receives a seed and returns a reference
+            simulation (see GoldenTrace.from_factory).
+        candidate: Callable that receives a seed and returns a simulation of
+            the engine under test.
+        seeds: Seeds to run both engines under.
+        n_years: Number of years to run.
+        z: Number of standard errors the means may differ by.
+        atol: Absolute difference that is always accepted.
+
+    Returns:
+        The first Divergence, or None if the engines agree.
+    """
+    def yearly(build):
+        return np.array([[[getattr(record, field) for field in AGGREGATES]
+                          for record in GoldenTrace.from_factory(build, seed, n_years).year_ends()]
+                         for seed in seeds], dtype=np.float64)
+
+    expected, actual = yearly(reference), yearly(candidate)
+    num_seeds = len(seeds)
+    stderr = np.sqrt((expected.var(axis=0, ddof=1) + actual.var(axis=0, ddof=1)) / num_seeds)
+    expected_mean, actual_mean = expected.mean(axis=0), actual.mean(axis=0)
+    diverged = np.abs(expected_mean - actual_mean) > z * stderr + atol
+    if not diverged.any():
+        return None
+    year, field = np.argwhere(diverged)[0]
+    return Divergence(int(year), 'environment', AGGREGATES[field],
+                      float(expected_mean[year, field]), float(actual_mean[year, field]))
+
+
+def reference_simulation(seed, num_generations=None):
+    """Builds the reference Simulation from the default configuration and maps."""
+    config = Config.load('../var_config.yml', '../const_config.yml')
+    river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+    fertility_map, map_shape = simulation_driver.setup_map(
+        '../../resources/maps/fertility_map.png')
+    environment = Environment(river_map, fertility_map, map_shape, config)
+    households = simulation_driver.setup_households(environment, config)
+    return simulation_driver.Simulation(households, environment,
+                                       num_generations or config.num_generations)
+
+
+def check(golden, engine):
+    """Checks an engine against a golden trace of the reference Simulation.
+
+    Args:
+        golden: GoldenTrace recorded from reference_simulation.
+        engine: One of ENGINES.
+
+    Returns:
+        The first Divergence, or None if the engine is equivalent.
+    """
+    n_years = len(golden.year_ends())
+
+    def build(seed, **options):
+        reference = reference_simulation(seed, n_years)
+        return simulation_driver.Simulation(reference.households, reference.environment,
+                                           n_years, **options)
+
+    if engine == 'scheduler':
+        with HarvestScheduler() as scheduler:
+            return golden.compare(GoldenTrace.from_factory(
+                lambda seed: build(seed, scheduler=scheduler), golden.seed, n_years))
+    if engine == 'array':
+        trace = GoldenTrace.from_factory(lambda seed: build(seed, engine=ArrayEngine()),
+                                         golden.seed, n_years)
+        return golden.compare(trace, rtol=ENGINE_RTOL)
+    if engine == 'decomposed':
+        # decomposition imports simulation_driver, which imports this module.
+        from simulation.decomposition import DecomposedSimulation
+        simulations = []
+
+        def decomposed(seed):
+            reference = reference_simulation(seed, n_years)
+            simulations.append(DecomposedSimulation(reference.households,
+                                                    reference.environment, n_years))
+            return simulations[-1]
+
+        try:
+            return compare_seeds(build, decomposed, range(DECOMPOSED_SEEDS), n_years)
+        finally:
+            for simulation in simulations:
+                simulation.close()
+    raise ValueError('Unknown engine {0!r}, expected one of {1}'.format(
+        engine, ', '.join(ENGINES)))
+
+
+def main():
+    if sys.argv[1] == 'record':
+        path, seed, n_years = sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+        GoldenTrace.from_factory(reference_simulation, seed, n_years).save(path)
+    else:
+        golden = GoldenTrace.load(sys.argv[2])
+        engine = sys.argv[3]
+        print(check(golden, engine) or '{0} is equivalent for {1} years'.format(
+            engine, len(golden.year_ends())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Harvests the claimed fields concurrently or through an ownership raster.
+
+Households farm in descending order of grain because overlapping fields share
+fertility: the later household harvests what the earlier one left. Fields that
+do not overlap are independent, so only the order of overlapping fields
+matters.
+
+The claimed rectangles form an overlap graph whose edges point from each field
+to every later field it overlaps. A field's level is one more than the highest
+level of the earlier fields it overlaps, so the fields of a level are pairwise
+disjoint and every edge points to a higher level. The levels are harvested one
+after the other. The fields of a level are split into batches that are
+harvested concurrently, and the numpy slice arithmetic of Household.farm
+releases the GIL. The edges are never materialised: the levels are found by
+painting each field's level onto a raster of the map, which costs no more than
+the harvest itself. The raster is kept by the scheduler and only the painted
+windows are cleared, so no pass over the whole map is made. The harvests, the
+fertility_map and the dirty tiles match the sequential path exactly.
+
+An OwnershipHarvester instead gives every pixel to the first field that claims
+it (exclusive land tenure) in the ownership raster of the Environment, and
+harvests the pixels each field owns within its window. Where fields do not
+overlap this matches the sequential path up to rounding. Where they do, the
+later household harvests nothing from the shared pixels instead of what the
+earlier one left, so it is a different model rather than a faster path.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from simulation.household import Household
+
+
+def field_levels(bounds, shape, raster=None):
+    """Returns the harvest level of every field.
+
+    Args:
+        bounds: Sequence of (x_start, y_start, x_end, y_end) field bounds in
+            harvest order, as returned by Household.field_bounds.
+        shape: Tuple of the number of rows and columns of the map.
+        raster: Optional zeroed int32 array of the map's shape to paint the
+            levels on. It is zeroed again before returning, by resetting only
+            the painted windows, so it can be reused every year.
+
+    Returns:
+        int64 array in which overlapping fields have increasing levels in
+        harvest order, and fields of the same level do not overlap.
+    """
+    levels = np.zeros(len(bounds), dtype=np.int64)
+    if raster is None:
+        raster = np.zeros(shape[:2], dtype=np.int32)
+    painted = []
+    for index, (x_start, y_start, x_end, y_end) in enumerate(bounds):
+        if x_end <= x_start or y_end <= y_start:
+            continue
+        window = raster[y_start:y_end, x_start:x_end]
+        level = int(window.max())
+        window[:] = level + 1
+        levels[index] = level
+        painted.append(window)
+    for window in painted:
+        window[:] = 0
+    return levels
+
+
+class HarvestScheduler:
+    """Farms claimed fields level by level with a pool of threads.
+
+    Attributes:
+        max_workers: Number of threads harvesting at the same time.
+        min_batch: Smallest number of fields harvested by a single thread.
+            Smaller levels are harvested without the pool.
+        num_levels: Number of levels of the last harvest (1 when a single
+            thread harvests in order).
+    """
+
+    def __init__(self, max_workers=None, min_batch=8):
+        """Initialises the scheduler.
+
+        Args:
+            max_workers: Number of threads. Defaults to the number of CPUs.
+            min_batch: Smallest number of fields harvested by a single thread.
+        """
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.min_batch = max(1, min_batch)
+        self.num_levels = 0
+        self._executor = None
+        self._pid = None
+        self._raster = None
+
+    def batches(self, indices):
+        """Splits the field indices of a level into one batch per thread."""
+        num_batches = min(self.max_workers, max(1, len(indices) // self.min_batch))
+        return [batch for batch in np.array_split(indices, num_batches) if len(batch)]
+
+    def harvest(self, households, claimed_fields, environment):
+        """Farms the claimed field of every household.
+
+        Args:
+            households: List of Household objects in harvest order.
+            claimed_fields: The claimed field of each household, as returned
+                by Household.claim_field.
+            environment: Environment whose fertility_map is harvested.
+
+        Returns:
+            List of the harvest of each household.
+        """
+        if self.max_workers == 1:
+            # A single thread harvests in order; the levels would not help.
+            self.num_levels = 1 if households else 0
+            return [house.farm(claimed_field, environment)
+                    for house, claimed_field in zip(households, claimed_fields)]
+        shape = environment.shape
+        bounds = [Household.field_bounds(claimed_field, shape)
+                  for claimed_field in claimed_fields]
+        if self._raster is None or self._raster.shape != tuple(shape[:2]):
+            self._raster = np.zeros(shape[:2], dtype=np.int32)
+        levels = field_levels(bounds, shape, self._raster)
+        self.num_levels = int(levels.max()) + 1 if len(levels) else 0
+        harvests = [0] * len(households)
+
+        def farm(batch):
+            for index in batch:
+                harvests[index] = households[index].farm(claimed_fields[index], environment)
+
+        order = np.argsort(levels, kind='stable')
+        starts = np.searchsorted(levels[order], np.arange(self.num_levels + 1))
+        for level in range(self.num_levels):
+            batches = self.batches(order[starts[level]:starts[level + 1]])
+            if len(batches) == 1:
+                for batch in batches:
+                    farm(batch)
+                continue
+            if self._executor is None or self._pid != os.getpid():
+                # A forked child (e.g. a branch) does not inherit the threads.
+                self._executor = ThreadPoolExecutor(self.max_workers,
+                                                    thread_name_prefix='harvest')
+                self._pid = os.getpid()
+            for future in [self._executor.submit(farm, batch) for batch in batches]:
+                future.result()
+        return harvests
+
+    def close(self):
+        """Shuts the thread pool down."""
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown()
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class OwnershipHarvester:
+    """Farms claimed fields through the Environment's ownership raster.
+
+    It has the harvest method of a HarvestScheduler, so it can be passed as the
+    scheduler of a Simulation.
+    """
+
+    def harvest(self, households, claimed_fields, environment):
+        """Farms the pixels owned by the claimed field of every household.
+
+        Args:
+            households: List of Household objects in priority (harvest) order.
+            claimed_fields: The claimed field of each household, as returned
+                by Household.claim_field.
+            environment: Environment whose fertility_map is harvested.
+
+        Returns:
+            List of the harvest of each household.
+        """
+        count = len(households)
+        shape = environment.shape
+        bounds = np.array([Household.field_bounds(claimed_field, shape)
+                           for claimed_field in claimed_fields], dtype=np.int64).reshape(count, 4)
+        environment.assign_fields(*bounds.T)
+        capacity = np.fromiter((house.num_workers * house.worker_capability
+                                for house in households), dtype=np.float64, count=count)
+        competency = np.fromiter((house.competency for house in households),
+                                 dtype=np.float64, count=count)
+        max_potential_yield = households[0].constants.MAX_POTENTIAL_YIELD if count else 0
+        harvests = environment.harvest_owned(capacity, competency, max_potential_yield).tolist()
+        for house, harvest in zip(households, harvests):
+            house.grain = house.grain + harvest
+        return harvests
+
+    def close(self):
+        """Does nothing: the harvester holds no resources."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
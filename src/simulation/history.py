@@ -0,0 +1,190 @@
+"""Streams per-generation household history to chunked columnar files.
+
+Each generation's household snapshot is appended to in-memory column buffers
+that are flushed to disk as compressed numpy archives once a bounded number of
+rows has accumulated. An index file records the generations held by every
+chunk so that a single column or range of years can later be read back without
+loading the whole history.
+"""
+import json
+import os
+
+import numpy as np
+
+
+class HistoryWriter:
+    """Appends household snapshots to chunked, compressed columnar files.
+
+    The writer is a Simulation observer: every call to observe records the
+    current state of all households. At most chunk_rows rows (plus a single
+    generation) are held in memory at any time.
+
+    Attributes:
+        COLUMNS: Household columns recorded for every generation.
+        directory: Path to the directory that holds the chunk files and index.
+        chunk_rows: Number of buffered rows that triggers a flush to disk.
+        chunks: List of dictionaries describing the chunks written so far.
+    """
+
+    COLUMNS = ('id', 'x_pos', 'y_pos', 'num_workers', 'grain',
+               'worker_capability', 'competency', 'ambition', 'interaction')
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, directory, chunk_rows=100000):
+        """Initialises writer attributes upon instantiation.
+
+        Args:
+            directory: Path to the directory in which history is stored. It is
+                created if it does not exist.
+            chunk_rows: Number of buffered rows that triggers a flush to disk.
+        """
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.chunks = []
+        self._buffer = {column: [] for column in ('generation',) + self.COLUMNS}
+        self._buffered_rows = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def observe(self, simulation):
+        """Records the current generation of the simulation."""
+        self.append(simulation.generation, simulation.snapshot())
+
+    def append(self, generation, snapshot):
+        """Buffers a generation's household columns and flushes if needed.
+
+        Args:
+            generation: Generation (year) the snapshot belongs to.
+            snapshot: Dictionary mapping column names to numpy arrays with one
+                entry per household.
+        """
+        num_rows = len(snapshot['id'])
+        if not num_rows:
+            return
+        self._buffer['generation'].append(np.full(num_rows, generation, dtype=np.int64))
+        for column in self.COLUMNS:
+            self._buffer[column].append(np.array(snapshot[column], copy=True))
+        self._buffered_rows += num_rows
+        if self._buffered_rows >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """Writes all buffered rows to a new compressed chunk file."""
+        if not self._buffered_rows:
+            return
+        name = 'chunk_{0:06d}.npz'.format(len(self.chunks))
+        columns = {column: np.concatenate(arrays) for column, arrays in self._buffer.items()}
+        np.savez_compressed(os.path.join(self.directory, name), **columns)
+        generations = columns['generation']
+        self.chunks.append({'file': name, 'rows': self._buffered_rows,
+                            'first_generation': int(generations[0]),
+                            'last_generation': int(generations[-1])})
+        for arrays in self._buffer.values():
+            arrays.clear()
+        self._buffered_rows = 0
+        self._write_index()
+
+    def buffered_bytes(self):
+        """Returns the bytes of the rows buffered in memory."""
+        return sum(array.nbytes for arrays in self._buffer.values() for array in arrays)
+
+    def close(self):
+        """Flushes any remaining rows and finalises the index."""
+        self.flush()
+        self._write_index()
+
+    def _write_index(self):
+        """Saves the chunk index alongside the chunk files."""
+        index = {'columns': ['generation'] + list(self.COLUMNS), 'chunks': self.chunks}
+        with open(os.path.join(self.directory, self.INDEX_FILE), 'w') as f:
+            json.dump(index, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HistoryReader:
+    """Lazily reads household history written by a HistoryWriter.
+
+    Only the chunks that overlap a requested range of generations are opened,
+    and only the requested column is decompressed from each of them.
+
+    Attributes:
+        directory: Path to the directory that holds the chunk files and index.
+        columns: Names of the columns available in the history.
+        chunks: List of dictionaries describing the chunks on disk.
+    """
+
+    def __init__(self, directory):
+        """Reads the chunk index upon instantiation."""
+        self.directory = directory
+        with open(os.path.join(directory, HistoryWriter.INDEX_FILE)) as f:
+            index = json.load(f)
+        self.columns = index['columns']
+        self.chunks = index['chunks']
+
+    def iter_column(self, column, start=None, stop=None):
+        """Yields a column chunk by chunk for generations in [start, stop).
+
+        Args:
+            column: Name of the column to read.
+            start: First generation to include. Defaults to the first recorded.
+            stop: Generation at which to stop (exclusive). Defaults to the end.
+
+        Yields:
+            numpy.ndarray slices of the column, in generation order.
+        """
+        if column not in self.columns:
+            raise KeyError(column)
+        for chunk in self.chunks:
+            if start is not None and chunk['last_generation'] < start:
+                continue
+            if stop is not None and chunk['first_generation'] >= stop:
+                break
+            with np.load(os.path.join(self.directory, chunk['file'])) as data:
+                values = data[column]
+                if start is None and stop is None:
+                    yield values
+                    continue
+                generations = data['generation']
+                mask = np.ones(len(generations), dtype=bool)
+                if start is not None:
+                    mask &= generations >= start
+                if stop is not None:
+                    mask &= generations < stop
+                yield values[mask]
+
+    def column(self, column, start=None, stop=None):
+        """Returns a column for generations in [start, stop) as one array."""
+        parts = list(self.iter_column(column, start, stop))
+        if not parts:
+            return np.array([])
+        return np.concatenate(parts)
+
+    def generation(self, generation):
+        """Returns every column for a single generation as a dictionary."""
+        return {column: self.column(column, generation, generation + 1)
+                for column in self.columns}
+
+    def trajectory(self, household_id, column, start=None, stop=None):
+        """Returns (generations, values) of a column for a single household.
+
+        Args:
+            household_id: UUID of the household.
+            column: Name of the column to follow.
+            start: First generation to include.
+            stop: Generation at which to stop (exclusive).
+        """
+        key = household_id.bytes
+        generations, values = [], []
+        for ids, gens, vals in zip(self.iter_column('id', start, stop),
+                                   self.iter_column('generation', start, stop),
+                                   self.iter_column(column, start, stop)):
+            mask = ids == key
+            generations.append(gens[mask])
+            values.append(vals[mask])
+        if not generations:
+            return np.array([]), np.array([])
+        return np.concatenate(generations), np.concatenate(values)
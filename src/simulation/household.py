@@ -1,12 +1,13 @@
 import math
 import random
 import statistics
+from collections import namedtuple
 
-class Household:
-    """Represents communities or households in the era of ancient Egypt.
 
-    This class encompasses all actions, interactions and attributes of an
-    autonomous agent in the ABMS (Agent-based Model Simulation).
+class HouseholdConstants(namedtuple('HouseholdConstants', [
+        'KNOWLEDGE_RATIO', 'CLAIM_RATIO', 'MAX_POTENTIAL_YIELD', 'WORKER_APPETITE',
+        'GROWTH_RATE', 'GENERATIONAL_VAR', 'CAPABILITY_VAR', 'SURVIVAL_PROBABILITY'])):
+    """Immutable constants shared by every household of a simulation.
 
     Attributes:
         KNOWLEDGE_RATIO: The knowledge radius of a single worker.
@@ -20,6 +21,31 @@ class Household:
             capability.
         SURVIVAL_PROBABILITY: Probability that a worker will survive if they
             have no food or should the worker be stolen by another household.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_config(cls, const_config):
+        """Creates and returns the constants from the constant configuration."""
+        return cls(const_config['knowledge_ratio'], const_config['claim_ratio'],
+                   const_config['maximum_potential_yield'], const_config['worker_appetite'],
+                   const_config['growth_rate'], const_config['generational_variance'],
+                   const_config['capability_variance'], const_config['survival_probability'])
+
+
+class Household:
+    """Represents communities or households in the era of ancient Egypt.
+
+    This class encompasses all actions, interactions and attributes of an
+    autonomous agent in the ABMS (Agent-based Model Simulation).
+
+    Households use __slots__ and share a single HouseholdConstants object (and,
+    as the AgentModel is stateless, usually a single model) to keep the per
+    household memory overhead small.
+
+    Attributes:
+        constants: HouseholdConstants shared by all households.
         model: Household's memory and decision making system.
         id: UUID that identifies the household.
         num_workers: Number of workers in the household.
@@ -33,8 +59,14 @@ class Household:
             statistics.
     """
 
+    __slots__ = ('constants', 'model', 'id', 'num_workers', 'grain', 'worker_capability',
+                 'interaction', 'competency', 'ambition', 'position')
+
+    columns = ['id', 'num_workers', 'grain', 'worker_capability',
+               'interaction', 'competency', 'ambition']
+
     def __init__(self, model, id, num_workers, grain, worker_capability,
-                 min_competency, min_ambition, const_config, env):
+                 min_competency, min_ambition, constants, env):
         """Initialises household attributes upon instantiation.
 
         Args:
@@ -47,19 +79,14 @@ class Household:
             min_competency: Minimum competency level upon household
                 instantiation.
             min_ambition: Minimum ambition level upon household instantiation.
-            const_config: Dictionary containing constant simulation start
-                parameters.
+            constants: HouseholdConstants shared by all households. A
+                dictionary of constant simulation start parameters is also
+                accepted and converted.
             environment: Landscape of the simulation.
         """
-        self.KNOWLEDGE_RATIO = const_config['knowledge_ratio']
-        self.CLAIM_RATIO = const_config['claim_ratio']
-        self.MAX_POTENTIAL_YIELD = const_config['maximum_potential_yield']
-        self.WORKER_APPETITE = const_config['worker_appetite']
-        self.GROWTH_RATE = const_config['growth_rate']
-        self.GENERATIONAL_VAR = const_config['generational_variance']
-        self.CAPABILITY_VAR = const_config['capability_variance']
-        self.SURVIVAL_PROBABILITY = const_config['survival_probability']
-
+        if not isinstance(constants, HouseholdConstants):
+            constants = HouseholdConstants.from_config(constants)
+        self.constants = constants
         self.model = model
         self.id = id
         self.num_workers = num_workers
@@ -70,47 +97,56 @@ class Household:
         self.ambition = model.generate_ambition(min_ambition)
         self.position = model.generate_position(env)
 
-        self.columns = ['id', 'num_workers', 'grain', 'worker_capability',
-                        'interaction', 'competency', 'ambition']
-
     @property
     def knowledge_radius(self):
         """Accesses knowledge_radius attribute."""
-        return self.KNOWLEDGE_RATIO * self.num_workers
+        return self.constants.KNOWLEDGE_RATIO * self.num_workers
 
     def statistics(self):
         """Constructs and returns a dictionary of household attributes."""
         x_pos, y_pos = self.position
         data_dict = {'x_pos':x_pos, 'y_pos':y_pos, 'knowledge_radius': self.knowledge_radius}
-        for attr, value in self.__dict__.items():
-            if attr in self.columns:
-                data_dict[attr] = value
+        for attr in self.columns:
+            data_dict[attr] = getattr(self, attr)
         return data_dict
 
     def claim_field(self, environment):
         """Chooses and returns a position and area to be claimed in the environment."""
         field_coord = self.model.choose_claim_field(self.knowledge_radius,
                                                     self.position, environment)
-        available_area = self.CLAIM_RATIO * self.num_workers
+        available_area = self.constants.CLAIM_RATIO * self.num_workers
         claimed_area = available_area * self.ambition
         claimed_field = (field_coord, claimed_area)
         return claimed_field
 
-    def farm(self, claimed_field, environment):
-        """Harvests grain from the claimed_field."""
+    @staticmethod
+    def field_bounds(claimed_field, shape):
+        """Returns the (x_start, y_start, x_end, y_end) bounds of a claimed field.
+
+        Args:
+            claimed_field: Tuple of the field's centre coordinate and area, as
+                returned by claim_field.
+            shape: Tuple recording the number of rows and columns of the
+                environment.
+        """
         field_coord, available_area = claimed_field
         x_field, y_field = field_coord
         sqrt_area = math.sqrt(available_area)
 
-        nrows, ncols = environment.shape
+        nrows, ncols = shape
         diff = int(sqrt_area/2)
         x_start = max(0, x_field - diff)
         y_start = max(0, y_field - diff)
         x_end = min(ncols - 1, x_field + diff)
         y_end = min(nrows - 1, y_field + diff)
+        return x_start, y_start, x_end, y_end
+
+    def farm(self, claimed_field, environment):
+        """Harvests grain from the claimed_field and returns the harvest."""
+        x_start, y_start, x_end, y_end = self.field_bounds(claimed_field, environment.shape)
         fertility = environment.fertility_map[y_start:y_end, x_start:x_end]
 
-        field = fertility * self.MAX_POTENTIAL_YIELD
+        field = fertility * self.constants.MAX_POTENTIAL_YIELD
         available_harvest = field.sum()
         workers_capability = self.num_workers * self.worker_capability
         potential_harvest = min(available_harvest, workers_capability)
@@ -119,20 +155,22 @@ class Household:
             percentage_unharvested = (available_harvest - harvest) / available_harvest
             fertility = fertility * percentage_unharvested
             environment.fertility_map[y_start:y_end, x_start:x_end] = fertility
+            environment.mark_dirty(x_start, y_start, x_end, y_end)
         self.grain = self.grain + harvest
+        return harvest
 
     def consume_grain(self):
         """Consumes stored grain."""
-        self.grain = self.grain - self.num_workers * self.WORKER_APPETITE
+        self.grain = self.grain - self.num_workers * self.constants.WORKER_APPETITE
         if self.grain < 0:
             resiliency = self.competency * self.ambition
-            negative_workers = (self.grain / self.WORKER_APPETITE) * (1 - resiliency)
-            self.num_workers += math.floor(negative_workers * self.SURVIVAL_PROBABILITY)
+            negative_workers = (self.grain / self.constants.WORKER_APPETITE) * (1 - resiliency)
+            self.num_workers += math.floor(negative_workers * self.constants.SURVIVAL_PROBABILITY)
             self.grain = 0
 
     def grow(self):
         """Grows the num_workers according to the population GROWTH_RATE."""
-        increase = self.num_workers * self.GROWTH_RATE
+        increase = self.num_workers * self.constants.GROWTH_RATE
         new_workers = math.floor(increase)
         fraction = increase - new_workers
         if random.random() < fraction:
@@ -173,7 +211,7 @@ class Household:
             household.grain -= stolen_grain
             self.grain += stolen_grain
             household.num_workers -= stolen_workers
-            self.num_workers += stolen_workers * self.SURVIVAL_PROBABILITY
+            self.num_workers += stolen_workers * self.constants.SURVIVAL_PROBABILITY
 
     def collaborate(self, household):
         """Gains knowledge and farming expertise from the other household."""
@@ -187,12 +225,12 @@ class Household:
         """Varies household attributes"""
         self.competency += self.attribute_change(self.competency)
         self.ambition += self.attribute_change(self.ambition)
-        perc_change = random.uniform(-self.CAPABILITY_VAR, self.CAPABILITY_VAR)
+        perc_change = random.uniform(-self.constants.CAPABILITY_VAR, self.constants.CAPABILITY_VAR)
         self.worker_capability += self.worker_capability * perc_change
 
     def attribute_change(self, attr_value):
         """Varies and returns provided attr_value."""
-        variance = self.GENERATIONAL_VAR
+        variance = self.constants.GENERATIONAL_VAR
         variance = random.uniform(0, variance)
         inc_chance = random.random()
         if inc_chance >= 0.5:
@@ -0,0 +1,71 @@
+"""Tracks household deaths and births without reshaping the household list.
+
+Removing a household from a Python list while iterating over it is O(n) per
+removal and skips the following household. Instead, dead households are marked
+by clearing their slot, and the cleared slots are removed in a single pass at
+the end of a phase. Until then the cleared slots form a free list so that new
+households (e.g. from a household splitting in two) can be inserted in O(1).
+"""
+
+
+class HouseholdLifecycle:
+    """Owns the household list of a simulation and manages its slots.
+
+    During a phase the list may contain None entries for dead households. After
+    compact has been called it only contains living households, in their
+    original relative order.
+
+    Attributes:
+        households: List of Household objects and cleared (None) slots.
+        free: Stack of indices of cleared slots available for insertion.
+    """
+
+    def __init__(self, households):
+        """Initialises the lifecycle with a list of living households."""
+        self.households = households
+        self.free = []
+
+    def __len__(self):
+        """Returns the number of slots, including cleared slots."""
+        return len(self.households)
+
+    def kill(self, index):
+        """Marks the household in slot index as dead and frees its slot.
+
+        Returns:
+            The Household object that occupied the slot.
+        """
+        household = self.households[index]
+        self.households[index] = None
+        self.free.append(index)
+        return household
+
+    def insert(self, household):
+        """Inserts a household into a free slot, or appends it if none is free.
+
+        Returns:
+            The index of the slot the household was placed in.
+        """
+        if self.free:
+            index = self.free.pop()
+            self.households[index] = household
+            return index
+        self.households.append(household)
+        return len(self.households) - 1
+
+    def alive(self):
+        """Yields (index, household) for every occupied slot."""
+        for index, household in enumerate(self.households):
+            if household is not None:
+                yield index, household
+
+    def compact(self):
+        """Removes all cleared slots in a single pass and empties the free list.
+
+        The household list is compacted in place, so references to it remain
+        valid.
+        """
+        if self.free:
+            self.households[:] = [house for house in self.households if house is not None]
+            self.free.clear()
+        return self.households
@@ -0,0 +1,290 @@
+"""Accounts for the memory of a simulation and keeps runs within a budget.
+
+A MemoryReport splits the memory of a run between its subsystems (households,
+environment maps, observers such as history writers and metrics, and the
+statistics and frames of the presenter) using the nbytes of numpy arrays, the
+deep memory usage of pandas DataFrames and the size of a sample Household.
+When tracemalloc is tracing, the traced current and peak sizes are included.
+
+A MemoryBudget projects the footprint of a whole run before it starts. If the
+projection exceeds the limit, the cheapest downgrade that fits is made: the
+history writers' buffers are shrunk, then frames are rendered less often, and
+only then is rendering switched off. If no downgrade fits, the run is refused
+with a MemoryError.
+"""
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from gui.render_policy import EveryNthYear, NeverRender
+from simulation.history import HistoryWriter
+from simulation.metrics import MetricsEngine, RegionStatistics
+
+# Bytes per household of a Simulation.snapshot: id (16), positions (2 * 8),
+# interaction (1) and five float64 columns.
+SNAPSHOT_ROW_BYTES = 16 + 2 * 8 + 1 + 5 * 8
+# Bytes per pixel allocated while a frame is rendered: the river_img and
+# fertility_img arrays and the Python lists they are built from, the display
+# array and its recoloured copy.
+RENDER_BYTES_PER_PIXEL = 200
+# Bytes of the matplotlib figure of a frame.
+FIGURE_BYTES = 16 * 2**20
+# Bytes kept by the FrameView for every rendered frame (an int in its frames).
+FRAME_BYTES = 8 + 28
+# Bytes of a buffered HistoryWriter row: a snapshot row and its generation.
+HISTORY_ROW_BYTES = SNAPSHOT_ROW_BYTES + 8
+# Bytes of a row of the presenter's statistics DataFrame (ten object columns).
+STATISTICS_ROW_BYTES = 10 * (8 + 24)
+# Bytes added to the population and gini DataFrames of the FrameView per year.
+FRAME_VIEW_YEAR_BYTES = 2 * 2 * (8 + 24)
+
+
+def nbytes(value):
+    """Returns the bytes held by an array, DataFrame or a collection of them."""
+    if value is None:
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, dict):
+        return sum(nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(item) for item in value)
+    return 0
+
+
+def household_bytes(household):
+    """Returns the bytes used by a single Household object.
+
+    The constants and model shared by all households are not included.
+    """
+    total = sys.getsizeof(household)
+    for attr in ('id', 'num_workers', 'grain', 'worker_capability', 'competency',
+                 'ambition', 'position'):
+        total += sys.getsizeof(getattr(household, attr))
+    total += sum(sys.getsizeof(coord) for coord in household.position)
+    return total
+
+
+def environment_bytes(environment):
+    """Returns a dictionary of the bytes held by each map of an environment."""
+    maps = ('river_map', 'fertility_map', 'flood_map', 'river_distance', 'silt_map',
+            'region_map', 'dirty_tiles', 'tile_changes', 'ownership')
+    # The river_distance is computed lazily, so it is counted only once held.
+    held = vars(environment)
+    return {name: nbytes(held.get(name, held.get('_' + name))) for name in maps}
+
+
+def observer_bytes(observer):
+    """Returns the bytes currently held by a Simulation observer."""
+    if isinstance(observer, HistoryWriter):
+        return observer.buffered_bytes()
+    if isinstance(observer, (MetricsEngine, RegionStatistics)):
+        return sum(nbytes([value for _, value in record]) + 16 * len(record)
+                   for record in observer.records.values())
+    return 0
+
+
+class MemoryReport:
+    """Memory used by the subsystems of a simulation.
+
+    Attributes:
+        subsystems: Dictionary mapping subsystem names to bytes.
+        traced_current: Current size traced by tracemalloc, or None if
+            tracemalloc is not tracing.
+        traced_peak: Peak size traced by tracemalloc, or None.
+    """
+
+    def __init__(self, subsystems):
+        self.subsystems = subsystems
+        self.traced_current = None
+        self.traced_peak = None
+        if tracemalloc.is_tracing():
+            self.traced_current, self.traced_peak = tracemalloc.get_traced_memory()
+
+    @property
+    def total(self):
+        """Accesses the bytes accounted to all subsystems."""
+        return sum(self.subsystems.values())
+
+    def as_dict(self):
+        """Returns the report as a dictionary, e.g. to be logged as json."""
+        report = dict(self.subsystems, total=self.total)
+        if self.traced_current is not None:
+            report.update(traced_current=self.traced_current, traced_peak=self.traced_peak)
+        return report
+
+    def __str__(self):
+        lines = ['{0:<28}{1:>12.2f} MB'.format(name, size / 2**20)
+                 for name, size in self.subsystems.items()]
+        lines.append('{0:<28}{1:>12.2f} MB'.format('total', self.total / 2**20))
+        if self.traced_current is not None:
+            lines.append('{0:<28}{1:>12.2f} MB'.format('traced (tracemalloc)',
+                                                       self.traced_current / 2**20))
+            lines.append('{0:<28}{1:>12.2f} MB'.format('traced peak',
+                                                       self.traced_peak / 2**20))
+        return '\n'.join(lines)
+
+
+def memory_report(simulation, presenter=None):
+    """Returns a MemoryReport of a simulation and, optionally, its presenter."""
+    households = simulation.households
+    subsystems = {'households': len(households) * household_bytes(households[0])
+                  if households else 0}
+    for name, size in environment_bytes(simulation.environment).items():
+        subsystems['environment.' + name] = size
+    for observer in simulation.observers:
+        subsystems['observer.' + type(observer).__name__] = (
+            subsystems.get('observer.' + type(observer).__name__, 0) + observer_bytes(observer))
+    if presenter is not None:
+        frame_view = presenter.frame_view
+        subsystems['presenter.statistics'] = (nbytes(frame_view.pop_df)
+                                              + nbytes(frame_view.gini_df))
+        subsystems['presenter.frames'] = sys.getsizeof(frame_view.frames)
+    return MemoryReport(subsystems)
+
+
+class MemoryBudget:
+    """Projects the memory of a run and downgrades options to fit a limit.
+
+    Attributes:
+        limit: Maximum projected footprint in bytes.
+        min_chunk_rows: Smallest chunk_rows a HistoryWriter is shrunk to.
+        downgrades: Descriptions of the downgrades made by the last apply.
+    """
+
+    def __init__(self, limit, min_chunk_rows=1000):
+        """Initialises the budget.
+
+        Args:
+            limit: Maximum projected footprint in bytes.
+            min_chunk_rows: Smallest chunk_rows a HistoryWriter is shrunk to.
+        """
+        self.limit = limit
+        self.min_chunk_rows = min_chunk_rows
+        self.downgrades = []
+
+    def projection(self, simulation, presenter=None, render_policy=None):
+        """Returns the projected peak bytes of each subsystem over the run.
+
+        Households cannot multiply, so the projection assumes the current
+        number of households for the whole run.
+
+        Args:
+            simulation: Simulation of the run.
+            presenter: Optional Presenter whose frame_view renders the run.
+            render_policy: RenderPolicy to project instead of the one of the
+                presenter's frame_view.
+        """
+        households = simulation.households
+        num_households = len(households)
+        num_generations = simulation.num_generations
+        projection = {
+            'households': num_households * household_bytes(households[0]) if households else 0,
+            'environment': sum(environment_bytes(simulation.environment).values()),
+            'snapshot': num_households * SNAPSHOT_ROW_BYTES,
+        }
+        history = 0
+        for observer in simulation.observers:
+            if isinstance(observer, HistoryWriter):
+                # The buffer and its concatenated copy exist while flushing.
+                rows = observer.chunk_rows + num_households
+                history += 2 * rows * HISTORY_ROW_BYTES
+            elif isinstance(observer, MetricsEngine):
+                density = int(np.prod(observer.density_bins)) * 8
+                history += num_generations * 16 * len(observer.metrics)
+                if 'density' in observer.metrics:
+                    history += num_generations // observer.cadences.get('density', 1) * density
+            elif isinstance(observer, RegionStatistics):
+                history += (num_generations // observer.cadence * len(observer.STATISTICS)
+                            * 8 * max(1, simulation.environment.num_regions))
+        projection['history'] = history
+        if presenter is not None:
+            render_policy = render_policy or presenter.frame_view.render_policy
+            projection['statistics'] = (num_households * STATISTICS_ROW_BYTES
+                                        + num_generations * FRAME_VIEW_YEAR_BYTES)
+            if not isinstance(render_policy, NeverRender):
+                nrows, ncols = simulation.environment.shape[:2]
+                projection['render'] = (nrows * ncols * RENDER_BYTES_PER_PIXEL + FIGURE_BYTES
+                                        + rendered_years(render_policy, num_generations)
+                                        * FRAME_BYTES)
+        return projection
+
+    def apply(self, simulation, presenter=None):
+        """Makes the cheapest downgrade of a run whose projection fits the limit.
+
+        The downgrades are tried from the cheapest to the most expensive:
+        shrinking the buffers of the HistoryWriter observers (which only
+        flush more often), rendering every second, fourth, eighth, ... year
+        and finally switching rendering off. The buffers are only shrunk by
+        as many rows as needed. Nothing is changed if no downgrade fits.
+
+        Returns:
+            The final projection, as returned by projection.
+
+        Raises:
+            MemoryError: If the projection exceeds the limit even after all
+                downgrades.
+        """
+        self.downgrades = []
+        writers = [observer for observer in simulation.observers
+                   if isinstance(observer, HistoryWriter)]
+        spare_bytes = 2 * HISTORY_ROW_BYTES * sum(max(0, writer.chunk_rows - self.min_chunk_rows)
+                                                  for writer in writers)
+        for render_policy in self.render_downgrades(simulation, presenter):
+            projection = self.projection(simulation, presenter, render_policy)
+            excess = sum(projection.values()) - self.limit
+            if excess <= spare_bytes:
+                break
+        else:
+            total = sum(projection.values())
+            raise MemoryError('Projected memory of {0:.1f} MB exceeds the budget of {1:.1f} MB '
+                              '({2})'.format(total / 2**20, self.limit / 2**20, ', '.join(
+                                  '{0}: {1:.1f} MB'.format(name, size / 2**20)
+                                  for name, size in projection.items())))
+        if render_policy is not None:
+            presenter.set_render_policy(render_policy)
+            if isinstance(render_policy, NeverRender):
+                self.downgrades.append('rendering disabled')
+            else:
+                self.downgrades.append('rendering every {0} years'.format(render_policy.n))
+        for writer in writers:
+            if excess <= 0:
+                break
+            saved_rows = min(writer.chunk_rows - self.min_chunk_rows,
+                             -(-excess // (2 * HISTORY_ROW_BYTES)))
+            if saved_rows > 0:
+                writer.chunk_rows -= saved_rows
+                self.downgrades.append('history chunk_rows reduced to {0}'.format(
+                    writer.chunk_rows))
+                excess -= 2 * saved_rows * HISTORY_ROW_BYTES
+        return self.projection(simulation, presenter)
+
+    def render_downgrades(self, simulation, presenter):
+        """Returns the render policies to try, from the cheapest downgrade.
+
+        The first entry, None, keeps the current policy.
+        """
+        if presenter is None or isinstance(presenter.frame_view.render_policy, NeverRender):
+            return [None]
+        num_generations = simulation.num_generations
+        rendered = rendered_years(presenter.frame_view.render_policy, num_generations)
+        policies = [None]
+        n = 2
+        while n < num_generations:
+            if rendered_years(EveryNthYear(n), num_generations) < rendered:
+                policies.append(EveryNthYear(n))
+            n *= 2
+        return policies + [NeverRender()]
+
+
+def rendered_years(render_policy, num_generations):
+    """Returns the most years render_policy can render in num_generations."""
+    if isinstance(render_policy, NeverRender):
+        return 0
+    if isinstance(render_policy, EveryNthYear):
+        return min(num_generations, -(-num_generations // render_policy.n) + 1)
+    return num_generations
@@ -0,0 +1,261 @@
+"""Computes aggregate simulation statistics from household snapshots.
+
+The metrics in this module are independent of any rendering and operate purely
+on the numpy arrays returned by Simulation.snapshot, which makes them cheap
+enough to record every year of a headless run.
+"""
+import numpy as np
+
+
+class GiniCoefficient:
+    """Computes gini-coefficients while caching the population weights.
+
+    The weights only depend on the number of households, which changes slowly
+    between generations, so they are rebuilt only when that number changes.
+    """
+
+    def __init__(self):
+        self._num_households = None
+        self._weights = None
+
+    def __call__(self, grain):
+        """Returns the gini-coefficient of the supplied grain values."""
+        num_households = len(grain)
+        total_grain = grain.sum()
+        if not num_households or not total_grain:
+            # As in the original FrameView.record_gini, no grain (or no
+            # households) counts as complete inequality.
+            return 1.0
+        if num_households != self._num_households:
+            pop_prop = 1 / num_households
+            richer_prop = np.arange(num_households - 1, -1, -1) / num_households
+            self._weights = pop_prop + 2 * richer_prop
+            self._num_households = num_households
+        wealth_prop = np.sort(grain) / total_grain
+        return 1 - float(np.dot(wealth_prop, self._weights))
+
+
+def gini(grain):
+    """Returns the gini-coefficient of an array of household grain values."""
+    return GiniCoefficient()(np.asarray(grain, dtype=np.float64))
+
+
+class MetricsEngine:
+    """Records selected aggregate statistics of a Simulation every year.
+
+    The engine is a Simulation observer. Each metric is computed from the
+    household snapshot of the current year and appended to its own record.
+    Expensive metrics can be given a cadence so they are only computed every
+    n-th generation.
+
+    Attributes:
+        METRICS: Names of all the available metrics.
+        DEFAULT_CADENCE: Cadence applied to metrics not present in cadence.
+        metrics: Names of the metrics that are recorded.
+        cadences: Dictionary mapping metric names to the number of generations
+            between successive recordings.
+        percentiles: Grain percentiles recorded by the grain_percentiles metric.
+        density_bins: Number of (row, column) bins of the density histogram.
+        records: Dictionary mapping metric names to lists of
+            (generation, value) tuples.
+    """
+
+    METRICS = ('population', 'num_households', 'gini', 'grain_percentiles',
+               'mean_competency', 'mean_ambition', 'density', 'interaction_rate')
+    DEFAULT_CADENCE = {'density': 10}
+
+    def __init__(self, metrics=None, cadence=None, percentiles=(10, 50, 90),
+                 density_bins=(30, 20)):
+        """Initialises engine attributes upon instantiation.
+
+        Args:
+            metrics: Iterable of metric names to record. Defaults to METRICS.
+            cadence: Dictionary of per metric cadences that override
+                DEFAULT_CADENCE.
+            percentiles: Grain percentiles recorded by grain_percentiles.
+            density_bins: Number of (row, column) bins of the density
+                histogram.
+        """
+        self.metrics = tuple(metrics) if metrics is not None else self.METRICS
+        unknown = set(self.metrics) - set(self.METRICS)
+        if unknown:
+            raise ValueError('Unknown metrics: {0}'.format(sorted(unknown)))
+        self.cadences = dict(self.DEFAULT_CADENCE)
+        self.cadences.update(cadence or {})
+        self.percentiles = percentiles
+        self.density_bins = density_bins
+        self.records = {metric: [] for metric in self.metrics}
+        self._gini_coefficient = GiniCoefficient()
+
+    def observe(self, simulation):
+        """Records the metrics for the current generation of the simulation."""
+        generation = simulation.generation
+        if any(self.due(metric, generation) for metric in self.metrics):
+            self.update(generation, simulation.snapshot(), simulation.environment.shape)
+
+    def due(self, metric, generation):
+        """Returns whether a metric should be recorded in this generation."""
+        return generation % self.cadences.get(metric, 1) == 0
+
+    def update(self, generation, snapshot, shape):
+        """Computes and records the metrics that are due for a snapshot.
+
+        Args:
+            generation: Generation the snapshot belongs to.
+            snapshot: Dictionary of household columns as numpy arrays.
+            shape: Shape of the environment maps, used for density histograms.
+        """
+        for metric in self.metrics:
+            if self.due(metric, generation):
+                value = getattr(self, '_' + metric)(snapshot, shape)
+                self.records[metric].append((generation, value))
+
+    def latest(self, metric):
+        """Returns the most recently recorded value of a metric or None."""
+        record = self.records[metric]
+        return record[-1][1] if record else None
+
+    def series(self, metric):
+        """Returns (generations, values) numpy arrays for a metric."""
+        record = self.records[metric]
+        generations = np.array([generation for generation, _ in record], dtype=np.int64)
+        values = np.array([value for _, value in record])
+        return generations, values
+
+    def _population(self, snapshot, shape):
+        return float(snapshot['num_workers'].sum())
+
+    def _num_households(self, snapshot, shape):
+        return len(snapshot['num_workers'])
+
+    def _gini(self, snapshot, shape):
+        return self._gini_coefficient(snapshot['grain'])
+
+    def _grain_percentiles(self, snapshot, shape):
+        grain = snapshot['grain']
+        if not len(grain):
+            return np.full(len(self.percentiles), np.nan)
+        return np.percentile(grain, self.percentiles)
+
+    def _mean_competency(self, snapshot, shape):
+        competency = snapshot['competency']
+        return float(competency.mean()) if len(competency) else np.nan
+
+    def _mean_ambition(self, snapshot, shape):
+        ambition = snapshot['ambition']
+        return float(ambition.mean()) if len(ambition) else np.nan
+
+    def _density(self, snapshot, shape):
+        nrows, ncols = shape[:2]
+        density, _, _ = np.histogram2d(snapshot['y_pos'], snapshot['x_pos'],
+                                       bins=self.density_bins,
+                                       range=[[0, nrows], [0, ncols]])
+        return density
+
+    def _interaction_rate(self, snapshot, shape):
+        interaction = snapshot['interaction']
+        if not len(interaction):
+            return (0.0, 0.0)
+        plunder = np.count_nonzero(interaction < 0) / len(interaction)
+        collaborate = np.count_nonzero(interaction > 0) / len(interaction)
+        return (plunder, collaborate)
+
+
+class RegionStatistics:
+    """Records per region statistics of a Simulation every cadence years.
+
+    The statistics are reduced with np.bincount over the region labels of the
+    household positions and of the fertility_map pixels, so a year costs
+    O(households + pixels) regardless of the number of regions. The
+    environment of the observed simulation must have a region_map.
+
+    Attributes:
+        STATISTICS: Names of the recorded statistics.
+        cadence: Number of generations between successive recordings.
+        records: Dictionary mapping statistic names to lists of
+            (generation, values) tuples with one value per region.
+    """
+
+    STATISTICS = ('num_households', 'population', 'grain', 'fertility',
+                  'remaining_fertility')
+
+    def __init__(self, cadence=1):
+        """Initialises the recorder.
+
+        Args:
+            cadence: Number of generations between successive recordings.
+        """
+        self.cadence = cadence
+        self.records = {statistic: [] for statistic in self.STATISTICS}
+        self._environment = None
+        self._pixel_labels = None
+        self._pixel_mask = None
+        self._pristine = None
+
+    def observe(self, simulation):
+        """Records the statistics for the current generation of the simulation."""
+        statistics = self.compute(simulation.snapshot(), simulation.environment)
+        for statistic, values in statistics.items():
+            self.records[statistic].append((simulation.generation, values))
+
+    def compute(self, snapshot, environment):
+        """Returns a dictionary of per region statistics.
+
+        Args:
+            snapshot: Dictionary of household columns as numpy arrays.
+            environment: Environment with a region_map.
+
+        Returns:
+            A dictionary mapping every name in STATISTICS to a float64 array
+            with one entry per region.
+        """
+        if environment.region_map is None:
+            raise ValueError('RegionStatistics requires an Environment with a region_map')
+        num_regions = environment.num_regions
+        if environment is not self._environment:
+            self.prepare(environment)
+
+        labels = environment.regions(snapshot['x_pos'], snapshot['y_pos'])
+        inside = labels >= 0
+        if not inside.all():
+            labels = labels[inside]
+            snapshot = {column: values[inside] for column, values in snapshot.items()}
+        statistics = {
+            'num_households': np.bincount(labels, minlength=num_regions).astype(np.float64),
+            'population': np.bincount(labels, weights=snapshot['num_workers'],
+                                      minlength=num_regions),
+            'grain': np.bincount(labels, weights=snapshot['grain'], minlength=num_regions),
+        }
+        fertility = environment.fertility_map.ravel()
+        if self._pixel_mask is not None:
+            fertility = fertility[self._pixel_mask]
+        statistics['fertility'] = np.bincount(self._pixel_labels, weights=fertility,
+                                              minlength=num_regions)
+        statistics['remaining_fertility'] = np.divide(
+            statistics['fertility'], self._pristine, out=np.zeros(num_regions),
+            where=self._pristine > 0)
+        return statistics
+
+    def prepare(self, environment):
+        """Caches the pixel labels and pristine fertility of an environment."""
+        labels = environment.region_map.ravel()
+        self._pixel_mask = None
+        if (labels < 0).any():
+            self._pixel_mask = labels >= 0
+            labels = labels[self._pixel_mask]
+        pristine = environment.flood_map.ravel()
+        if self._pixel_mask is not None:
+            pristine = pristine[self._pixel_mask]
+        self._pixel_labels = labels
+        self._pristine = np.bincount(labels, weights=pristine, minlength=environment.num_regions)
+        self._environment = environment
+
+    def series(self, statistic):
+        """Returns (generations, values) numpy arrays for a statistic.
+
+        values has one row per recorded generation and one column per region.
+        """
+        record = self.records[statistic]
+        generations = np.array([generation for generation, _ in record], dtype=np.int64)
+        values = np.array([values for _, values in record])
+        return generations, values
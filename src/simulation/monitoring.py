@@ -0,0 +1,165 @@
+"""Publishes live metrics of a running simulation over local HTTP.
+
+The MetricsEndpoint is a Simulation observer. Every observed year it builds
+an immutable dictionary of metrics and replaces its reference to the previous
+one. A background thread serves the most recent dictionary:
+
+    /metrics       Prometheus text exposition format
+    /metrics.json  JSON
+
+Replacing a reference is atomic, so neither the simulation loop nor a scrape
+ever waits for the other.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from simulation import memory
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Name, help text and metric key of every published gauge.
+GAUGES = (
+    ('egypt_generation', 'Current simulation year.', 'generation'),
+    ('egypt_num_generations', 'Number of years to be simulated.', 'num_generations'),
+    ('egypt_years_per_second', 'Simulated years per second since the last observation.',
+     'years_per_second'),
+    ('egypt_population', 'Total number of workers.', 'population'),
+    ('egypt_households', 'Number of living households.', 'num_households'),
+    ('egypt_memory_accounted_bytes', 'Memory accounted to the simulation subsystems.',
+     'memory_accounted_bytes'),
+    ('egypt_max_rss_bytes', 'Peak resident set size of the process.', 'max_rss_bytes'),
+)
+
+
+def max_rss_bytes():
+    """Returns the peak resident set size of the process, or None if unknown."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def prometheus_text(metrics):
+    """Formats a metrics dictionary in the Prometheus text exposition format."""
+    lines = []
+    for name, help_text, key in GAUGES:
+        value = metrics.get(key)
+        if value is None:
+            continue
+        lines.append('# HELP {0} {1}'.format(name, help_text))
+        lines.append('# TYPE {0} gauge'.format(name))
+        lines.append('{0} {1!r}'.format(name, float(value)))
+    phase_times = metrics.get('phase_seconds') or {}
+    if phase_times:
+        lines.append('# HELP egypt_phase_seconds Duration of each phase of the last year.')
+        lines.append('# TYPE egypt_phase_seconds gauge')
+        for phase, seconds in phase_times.items():
+            lines.append('egypt_phase_seconds{{phase="{0}"}} {1!r}'.format(phase, float(seconds)))
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsEndpoint:
+    """Serves the latest metrics of a simulation from a background thread.
+
+    Attributes:
+        cadence: Number of years between metric updates.
+        host: Interface the server listens on.
+        port: Port the server listens on; 0 picks a free port on start.
+        include_memory: Whether the memory accounted to the subsystems is
+            computed at every update.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, cadence=1, include_memory=True):
+        self.host = host
+        self.port = port
+        self.cadence = cadence
+        self.include_memory = include_memory
+        self._metrics = {}
+        self._last = None
+        self._server = None
+        self._thread = None
+
+    @property
+    def metrics(self):
+        """Accesses the most recently published metrics dictionary."""
+        return self._metrics
+
+    def observe(self, simulation):
+        """Publishes the metrics of the current year of the simulation."""
+        now = time.perf_counter()
+        generation = simulation.generation
+        years_per_second = None
+        if self._last is not None:
+            last_generation, last_time = self._last
+            if now > last_time and generation > last_generation:
+                years_per_second = (generation - last_generation) / (now - last_time)
+        self._last = (generation, now)
+
+        snapshot = simulation.snapshot()
+        metrics = {
+            'generation': generation,
+            'num_generations': simulation.num_generations,
+            'years_per_second': years_per_second,
+            'population': float(snapshot['num_workers'].sum()),
+            'num_households': len(snapshot['num_workers']),
+            'phase_seconds': dict(simulation.phase_times),
+            'max_rss_bytes': max_rss_bytes(),
+            'time': time.time(),
+        }
+        if self.include_memory:
+            metrics['memory_accounted_bytes'] = memory.memory_report(simulation).total
+        self._metrics = metrics
+
+    def start(self):
+        """Starts serving in a daemon thread and returns the bound port."""
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                metrics = endpoint.metrics
+                if self.path == '/metrics':
+                    body = prometheus_text(metrics).encode()
+                    content_type = 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body = json.dumps(metrics).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True,
+                                        name='metrics-endpoint')
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        """Stops the server thread."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,146 @@
+"""Precision policies for the maps and household columns of a simulation.
+
+The maps of an Environment and the household columns of the ArrayEngine are
+numpy arrays whose dtype sets the memory bandwidth of the farm, flood and
+regeneration passes. A PrecisionPolicy fixes these dtypes:
+
+    DOUBLE  float64 maps and columns, worker counts as float64 (plunder can
+            leave fractional workers, as the Household methods do).
+    SINGLE  float32 maps and columns and int64 worker counts, which floor the
+            workers surviving a plunder. Maps and columns take half the bytes.
+
+The Household objects of the pure-Python path keep Python floats, so a policy
+only applies to the maps and to the ArrayEngine.
+
+An AccuracyReport runs the same seeds under two policies and compares the
+yearly aggregates of a golden trace (see golden.py).
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from simulation import golden
+from simulation import memory
+
+# Environment maps held in the dtype of a policy.
+MAPS = ('fertility_map', 'flood_map', 'river_map', 'silt_map')
+
+
+class PrecisionPolicy(namedtuple('PrecisionPolicy',
+                                 ['name', 'map_dtype', 'column_dtype', 'worker_dtype'])):
+    """The dtypes of the maps and household columns of a simulation.
+
+    Attributes:
+        name: Name of the policy.
+        map_dtype: dtype of the environment maps.
+        column_dtype: dtype of the grain, worker_capability, competency and
+            ambition columns.
+        worker_dtype: dtype of the num_workers column.
+    """
+
+    __slots__ = ()
+
+    def apply(self, environment):
+        """Converts the maps of an environment to the map dtype in place.
+
+        The fertility_map is copied into a new array, so this must be called
+        before the maps are shared with other processes.
+        """
+        for name in MAPS:
+            value = getattr(environment, name)
+            if value is not None and value.dtype != self.map_dtype:
+                setattr(environment, name, value.astype(self.map_dtype))
+        return environment
+
+
+DOUBLE = PrecisionPolicy('double', np.float64, np.float64, np.float64)
+SINGLE = PrecisionPolicy('single', np.float32, np.float32, np.int64)
+
+
+class AccuracyReport:
+    """Compares the yearly aggregates of runs under two precision policies.
+
+    Attributes:
+        policy: The PrecisionPolicy under test.
+        reference: The reference PrecisionPolicy.
+        seeds: Seeds the runs were made under.
+        expected: Array of the reference aggregates indexed by seed, year and
+            golden.AGGREGATES.
+        actual: Array of the aggregates under the policy, indexed alike.
+        map_bytes: Dictionary mapping the policy names to the bytes of their
+            environment maps.
+    """
+
+    def __init__(self, policy, reference, seeds, expected, actual, map_bytes):
+        self.policy = policy
+        self.reference = reference
+        self.seeds = list(seeds)
+        self.expected = expected
+        self.actual = actual
+        self.map_bytes = map_bytes
+
+    def relative_errors(self):
+        """Returns the relative error of every seed, year and aggregate."""
+        scale = np.maximum(np.abs(self.expected), np.finfo(np.float64).tiny)
+        return np.abs(self.actual - self.expected) / scale
+
+    def mean_relative_errors(self):
+        """Returns the relative error of the mean over the seeds per year and aggregate."""
+        expected = self.expected.mean(axis=0)
+        scale = np.maximum(np.abs(expected), np.finfo(np.float64).tiny)
+        return np.abs(self.actual.mean(axis=0) - expected) / scale
+
+    def as_dict(self):
+        """Returns the worst errors of every aggregate and the map bytes."""
+        errors = self.relative_errors()
+        mean_errors = self.mean_relative_errors()
+        report = {'policy': self.policy.name, 'reference': self.reference.name,
+                  'map_bytes': dict(self.map_bytes)}
+        for index, field in enumerate(golden.AGGREGATES):
+            report[field] = {'max_relative_error': float(errors[..., index].max()),
+                             'final_relative_error_of_mean': float(mean_errors[-1, index])}
+        return report
+
+    def __str__(self):
+        errors = self.relative_errors()
+        mean_errors = self.mean_relative_errors()
+        lines = ['{0} against {1} over {2} seeds'.format(self.policy.name, self.reference.name,
+                                                         len(self.seeds)),
+                 '{0:<20}{1:>16}{2:>16}'.format('aggregate', 'max error', 'error of mean')]
+        for index, field in enumerate(golden.AGGREGATES):
+            lines.append('{0:<20}{1:>16.3e}{2:>16.3e}'.format(field, errors[..., index].max(),
+                                                             mean_errors[-1, index]))
+        for name, size in self.map_bytes.items():
+            lines.append('{0:<20}{1:>13.2f} MB'.format(name + ' maps', size / 2**20))
+        return '\n'.join(lines)
+
+
+def accuracy_report(build, policy=SINGLE, reference=DOUBLE, seeds=range(5), n_years=20):
+    """Runs every seed under two policies and returns their AccuracyReport.
+
+    Args:
+        build: Callable that receives a seed and a PrecisionPolicy and returns
+            a new simulation using it, e.g. with policy.apply(environment) and
+            kernels.ArrayEngine(policy).
+        policy: The PrecisionPolicy under test.
+        reference: The PrecisionPolicy compared against.
+        seeds: Seeds to run.
+        n_years: Number of years to run.
+    """
+    map_bytes = {}
+
+    def yearly(run_policy):
+        def factory(seed):
+            simulation = build(seed, run_policy)
+            map_bytes[run_policy.name] = sum(
+                memory.nbytes(getattr(simulation.environment, name)) for name in MAPS)
+            return simulation
+
+        return np.array([[[getattr(record, field) for field in golden.AGGREGATES]
+                          for record in golden.GoldenTrace.from_factory(
+                              factory, seed, n_years).year_ends()]
+                         for seed in seeds], dtype=np.float64)
+
+    expected = yearly(reference)
+    actual = yearly(policy)
+    return AccuracyReport(policy, reference, seeds, expected, actual, map_bytes)
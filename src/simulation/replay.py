@@ -0,0 +1,173 @@
+"""Rebuilds and renders a completed simulation run from its event trace.
+
+The Replay plays back an events.EventWriter trace without running the model.
+It acts as a presenter for the FrameView, so frames can be rendered offline at
+any cadence by choosing a render policy:
+
+    python replay.py path/to/trace [every_nth_year]
+
+The trace is replayed with the Config saved by its EventWriter. Traces written
+without one fall back to the current configuration files.
+"""
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+from gui.frame_view import FrameView
+from gui.render_policy import EveryNthYear
+from simulation import events
+from simulation.config import Config
+from simulation.environment import Environment
+from simulation.household import Household, HouseholdConstants
+from simulation import simulation_driver
+
+logger = logging.getLogger(__name__)
+
+
+class Replay:
+    """Replays an event trace and presents each observed year.
+
+    Attributes:
+        constants: HouseholdConstants of the traced run.
+        environment: Environment whose fertility_map is rebuilt from the trace.
+        records: Memory mapped event records.
+        households: Dictionary mapping actor numbers to dictionaries of
+            household attributes.
+        generation: Year of the most recently replayed census.
+        num_generations: Number of years contained in the trace.
+    """
+
+    def __init__(self, trace_path, river_map, fertility_map, const_config):
+        """Initialises the replay from a trace and the run's original maps.
+
+        Args:
+            trace_path: Path to a trace written by an events.EventWriter.
+            river_map: river_map the run was started with.
+            fertility_map: fertility_map the run was started with.
+            const_config: Constant configuration of the traced run.
+        """
+        shape, self.records = events.read_trace(trace_path)
+        self.constants = HouseholdConstants.from_config(const_config)
+        self.environment = Environment(river_map, np.copy(fertility_map), shape, const_config)
+        self.households = {}
+        self.generation = 0
+        self.num_generations = int(self.records['year'][-1]) + 1 if len(self.records) else 0
+
+    def years(self, chunk_records=65536):
+        """Applies the trace and yields the year of every census.
+
+        The state presented by statistics and fertility_map corresponds to the
+        point in the year at which the simulation notified its presenter.
+        """
+        for start in range(0, len(self.records), chunk_records):
+            for record in self.records[start:start + chunk_records].tolist():
+                year, kind, actor, target, x, y, amount, value = record
+                if kind == events.CENSUS:
+                    self.generation = year
+                    yield year
+                else:
+                    self.apply(kind, actor, target, x, y, amount, value)
+
+    def apply(self, kind, actor, target, x, y, amount, value):
+        """Applies a single event record to the replayed state."""
+        households = self.households
+        if kind == events.SPAWN:
+            households[actor] = {'id': actor, 'x_pos': x, 'y_pos': y, 'grain': amount,
+                                 'num_workers': value}
+        elif kind == events.ATTRIBUTE:
+            households[actor][events.ATTRIBUTES[target]] = value
+        elif kind == events.HARVEST:
+            households[actor]['interaction'] = 0
+            self.harvest(households[actor], (x, y), amount, value)
+        elif kind == events.CONSUME:
+            households[actor]['grain'] = amount
+            households[actor]['num_workers'] = value
+        elif kind == events.PLUNDER:
+            rival = households[target]
+            rival['grain'] -= amount
+            households[actor]['grain'] += amount
+            rival['num_workers'] -= value
+            households[actor]['num_workers'] += value * self.constants.SURVIVAL_PROBABILITY
+        elif kind == events.COLLABORATE:
+            households[actor]['worker_capability'] += amount
+        elif kind == events.DEATH:
+            del households[actor]
+        elif kind == events.RELOCATE:
+            households[actor]['x_pos'] = x
+            households[actor]['y_pos'] = y
+        elif kind == events.GROW:
+            households[actor]['num_workers'] = value
+        elif kind == events.FLOOD:
+            self.environment.fertility_map = np.copy(self.environment.flood_map)
+            self.environment.touch(self.environment.dirty_tiles)
+            self.environment.dirty_tiles[:] = False
+        elif kind == events.REGENERATE:
+            self.environment.regenerate()
+
+    def harvest(self, household, field_coord, harvest, claimed_area):
+        """Depletes the fertility of a field exactly as Household.farm does."""
+        x_start, y_start, x_end, y_end = Household.field_bounds((field_coord, claimed_area),
+                                                                self.environment.shape)
+        fertility_map = self.environment.fertility_map
+        fertility = fertility_map[y_start:y_end, x_start:x_end]
+        available_harvest = (fertility * self.constants.MAX_POTENTIAL_YIELD).sum()
+        if available_harvest:
+            percentage_unharvested = (available_harvest - harvest) / available_harvest
+            fertility_map[y_start:y_end, x_start:x_end] = fertility * percentage_unharvested
+            self.environment.mark_dirty(x_start, y_start, x_end, y_end)
+        household['grain'] += harvest
+
+    def statistics(self):
+        """Returns the replayed household attributes as a pandas DataFrame."""
+        columns = ['x_pos', 'y_pos', 'knowledge_radius'] + Household.columns
+        rows = [dict(house, knowledge_radius=self.constants.KNOWLEDGE_RATIO * house['num_workers'])
+                for house in self.households.values()]
+        return pd.DataFrame(rows, columns=columns)
+
+    def river_map(self):
+        """Returns the river_map of the replayed run."""
+        return self.environment.river_map
+
+    def fertility_map(self):
+        """Returns the replayed fertility_map."""
+        return self.environment.fertility_map
+
+    def get_generation(self):
+        """Returns the year of the most recently replayed census."""
+        return self.generation
+
+    def get_num_generations(self):
+        """Returns the number of years contained in the trace."""
+        return self.num_generations
+
+    def render(self, render_policy=None):
+        """Replays the whole trace and renders frames through a FrameView.
+
+        Returns:
+            List of the years for which frames were saved.
+        """
+        frame_view = FrameView(self, render_policy)
+        for _ in self.years():
+            frame_view.update()
+        return frame_view.frames
+
+
+def main():
+    trace_path = sys.argv[1]
+    every_nth_year = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    config = events.read_config(trace_path)
+    if config is None:
+        logger.warning('%s has no saved config, replaying with the configuration files',
+                       trace_path)
+        config = Config.load('../var_config.yml', '../const_config.yml')
+    river_map, _ = simulation_driver.setup_map('../../resources/maps/river_map.png')
+    fertility_map, _ = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+    replay = Replay(trace_path, river_map, fertility_map, config)
+    frames = replay.render(EveryNthYear(every_nth_year))
+    print('Rendered {0} frames'.format(len(frames)))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,9 @@
 Prior to the start of the simulation, the relevant start parameters are read in
 and objects initialised.
 """
+import logging
 import math
+import os
 import uuid
 import time
 import cProfile
@@ -11,12 +13,28 @@ import pstats
 import io
 
 import matplotlib.image as mpimg
+import numpy as np
 import yaml
 
-from simulation.environment import Environment
+from simulation.environment import Environment, cached_distance_to_river
 from gui.presenter import Presenter
-from simulation.household import Household
+from simulation.household import Household, HouseholdConstants
 from model.agent_model import AgentModel
+from simulation import kernels
+from simulation.lifecycle import HouseholdLifecycle
+from simulation.config import Config
+from simulation import branching
+from simulation import memory
+from simulation import monitoring
+from simulation.harvest import HarvestScheduler, OwnershipHarvester
+from simulation import precision
+
+logger = logging.getLogger(__name__)
+
+
+def _grain(household):
+    """Returns the grain of a household, used as the annual sort key."""
+    return household.grain
 
 
 class Simulation:
@@ -30,14 +48,34 @@ class Simulation:
 
     Attributes:
         households: List of Household objects.
+        lifecycle: HouseholdLifecycle that owns the households list and removes
+            dead households at the end of each phase.
         environment: Singleton object that encapsulates the features of the
             underlying landscape upon which the simulation takes place.
         num_generations: An integer that refers to the number of generations
             in the simulation.
+        observers: List of objects with an observe(simulation) method that
+            are notified once the interactions of every year have completed.
+        engine: Optional kernels.ArrayEngine that runs the farm and interaction
+            phases over array-backed households. None uses the Household
+            methods directly.
+        events: Optional events.EventWriter that records every state change.
+        stopping: List of stopping.StoppingCriterion objects checked by run at
+            the end of every year.
+        stop_reason: Why the last call to run stopped early ('extinction',
+            'generation_limit' or the reason of a stopping criterion), or None.
+        phase_times: Dictionary mapping the phases of the last completed year
+            ('farm', 'interact', 'observe', 'growth', 'environment') to their
+            durations in seconds. A new dictionary is assigned every year.
+        scheduler: Optional harvest.HarvestScheduler that harvests
+            non-overlapping fields concurrently in the farm phase, or a
+            harvest.OwnershipHarvester. It takes precedence over the engine's
+            farm phase.
     """
 
 
-    def __init__(self, households, environment, num_generations):
+    def __init__(self, households, environment, num_generations, observers=None,
+                 engine=None, events=None, stopping=None, scheduler=None):
         """Initialises simualtion attributes upon instantiation.
 
         Args:
@@ -46,11 +84,54 @@ class Simulation:
                 underlying landscape upon which the simulation takes place.
             num_generations: An integer that refers to the number of generations
                 in the simulation.
+            observers: Optional list of objects with an observe(simulation)
+                method, e.g. a HistoryWriter.
+            engine: Optional kernels.ArrayEngine for the farm and interaction
+                phases.
+            events: Optional events.EventWriter that records every state
+                change. Events are only recorded by the Household based path,
+                so it cannot be combined with an engine.
+            stopping: Optional list of stopping.StoppingCriterion objects.
+            scheduler: Optional harvest.HarvestScheduler or
+                harvest.OwnershipHarvester for the farm phase.
         """
-        self.households = households
+        if engine is not None and events is not None:
+            raise ValueError('Event tracing requires the Household based path (engine=None)')
+        self.lifecycle = HouseholdLifecycle(households)
         self.environment = environment
         self.num_generations = num_generations
         self.generation = 0
+        self.observers = list(observers) if observers else []
+        self.engine = engine
+        self.events = events
+        self.stopping = list(stopping) if stopping else []
+        self.stop_reason = None
+        self.phase_times = {}
+        self.scheduler = scheduler
+        self._snapshot = None
+        self._observing = False
+        if events is not None:
+            for house in households:
+                events.spawn(self.generation, house)
+
+    @property
+    def households(self):
+        """Accesses the list of living households."""
+        return self.lifecycle.households
+
+    @households.setter
+    def households(self, households):
+        """Replaces the list of households."""
+        self.lifecycle = HouseholdLifecycle(households)
+
+    def add_household(self, household):
+        """Adds a new household in O(1), reusing the slot of a dead household.
+
+        Households added during a phase take part from the next phase onwards.
+        """
+        self.lifecycle.insert(household)
+        if self.events is not None:
+            self.events.spawn(self.generation, household)
 
     def run_year_simulation(self, presenter):
         """Runs the ancient egypt simulation for a year.
@@ -65,41 +146,257 @@ class Simulation:
             presenter: A singleton object that controls the flow of information
                 to and from the relevant views.
         """
-        if self.generation < self.num_generations or self.households:
-            self.households.sort(key=lambda x: x.grain, reverse=True)
-            for house in self.households:
+        if self.generation < self.num_generations:
+            self.step(presenter, self.observers)
+
+    def run(self, n_years=None, observers=None):
+        """Runs the simulation for many years in a single call.
+
+        The run stops after n_years, at num_generations, once no households
+        remain or once one of the stopping criteria is met, whichever comes
+        first. The reason is recorded in stop_reason. No presenter is involved;
+        the observers (including those of the simulation) are notified every
+        year whose generation is a multiple of their cadence attribute
+        (default 1).
+
+        Args:
+            n_years: Maximum number of years to simulate. Defaults to all the
+                remaining generations.
+            observers: Optional list of additional observers for this run.
+
+        Returns:
+            The number of years that were simulated.
+        """
+        observers = self.observers + list(observers or [])
+        end = self.num_generations
+        if n_years is not None:
+            end = min(end, self.generation + n_years)
+        start = self.generation
+        self.stop_reason = None
+        while self.generation < end and self.num_households():
+            self.step(None, observers)
+            for criterion in self.stopping:
+                if criterion.should_stop(self):
+                    self.stop_reason = criterion.reason
+                    return self.generation - start
+        if not self.num_households():
+            self.stop_reason = 'extinction'
+        elif self.generation >= self.num_generations:
+            self.stop_reason = 'generation_limit'
+        return self.generation - start
+
+    def num_households(self):
+        """Returns the number of living households."""
+        return len(self.households)
+
+    def summary(self):
+        """Returns a dictionary summarising the current state of the run."""
+        return {'generation': self.generation,
+                'num_households': self.num_households(),
+                'population': sum(house.num_workers for house in self.households),
+                'total_grain': float(sum(house.grain for house in self.households)),
+                'stop_reason': self.stop_reason}
+
+    def branch(self, overrides, n_years=None, collect=None, seed=None, observers=None,
+               max_workers=None):
+        """Forks a what-if branch from the current state for every set of overrides.
+
+        Each branch runs in a forked child process with its own overrides and
+        random stream, sharing the maps with this simulation copy-on-write.
+        This simulation is not modified. See branching.branch for details.
+
+        Args:
+            overrides: List of dictionaries of config keys (e.g.
+                flood_frequency) and values, one per branch.
+            n_years: Maximum number of years each branch runs for.
+            collect: Callable returning the result of a finished branch.
+                Defaults to summary.
+            seed: Optional seed that makes the branches reproducible.
+            observers: Optional callable returning the observers of a branch
+                given its index.
+            max_workers: Maximum number of branches run at the same time.
+
+        Returns:
+            List of the branch results in the order of overrides.
+        """
+        return branching.branch(self, overrides, n_years, collect, seed, observers,
+                                max_workers)
+
+    def memory_report(self, presenter=None):
+        """Returns a memory.MemoryReport of the simulation's subsystems.
+
+        Args:
+            presenter: Optional presenter whose statistics are included.
+        """
+        return memory.memory_report(self, presenter)
+
+    def step(self, presenter=None, observers=()):
+        """Advances the simulation by exactly one year.
+
+        Args:
+            presenter: Optional presenter whose update method is called once
+                the interactions of the year have completed.
+            observers: Observers notified at the same point, subject to their
+                cadence.
+        """
+        clock = time.perf_counter
+        start = clock()
+        self.farm_phase()
+        farmed = clock()
+        self.interact()
+        interacted = clock()
+        if self.events is not None:
+            self.events.census(self.generation)
+        if presenter is not None:
+            presenter.update()
+        self.notify(observers)
+        observed = clock()
+        self.growth_phase()
+        grown = clock()
+        self.environment_phase()
+        self.phase_times = {'farm': farmed - start, 'interact': interacted - farmed,
+                            'observe': observed - interacted, 'growth': grown - observed,
+                            'environment': clock() - grown}
+        self.generation += 1
+
+    def farm_phase(self):
+        """Lets every household claim a field, farm it and consume grain.
+
+        Households farm in descending order of grain. Households without
+        workers are removed at the end of the phase.
+        """
+        self.households.sort(key=_grain, reverse=True)
+        if self.engine is not None and self.scheduler is None:
+            self.households = self.engine.farm_phase(self.households, self.environment)
+            return
+        events = self.events
+        lifecycle = self.lifecycle
+        if self.scheduler is not None:
+            # Claims only draw random numbers, so drawing them all first keeps
+            # the random stream of the sequential path.
+            claimed_fields = []
+            for house in lifecycle.households:
+                house.interaction = 0
+                claimed_fields.append(house.claim_field(self.environment))
+            harvests = self.scheduler.harvest(lifecycle.households, claimed_fields,
+                                              self.environment)
+        for index in range(len(lifecycle)):
+            house = lifecycle.households[index]
+            if self.scheduler is not None:
+                claimed_field, harvest = claimed_fields[index], harvests[index]
+            else:
                 house.interaction = 0
                 claimed_field = house.claim_field(self.environment)
-                house.farm(claimed_field, self.environment)
-                house.consume_grain()
-                if house.num_workers <= 0:
-                    self.households.remove(house)
+                harvest = house.farm(claimed_field, self.environment)
+            house.consume_grain()
+            if events is not None:
+                events.harvest(self.generation, house, claimed_field, harvest)
+                events.consume(self.generation, house)
+            if house.num_workers <= 0:
+                lifecycle.kill(index)
+                if events is not None:
+                    events.death(self.generation, house)
+        lifecycle.compact()
+
+    def growth_phase(self):
+        """Grows, varies and relocates every household at the end of a year."""
+        for house in self.households:
+            house.grow()
+            house.generational_changeover()
+            house.relocate(self.environment)
+            if self.events is not None:
+                self.record_growth(house)
+
+    def environment_phase(self):
+        """Regenerates the landscape and floods it if a flood is due."""
+        regenerated = self.environment.regenerate()
+        if regenerated and self.events is not None:
+            self.events.regenerate(self.generation)
+        flooded = self.environment.flood(self.generation)
+        if flooded and self.events is not None:
+            self.events.flood(self.generation)
+
+    def notify(self, observers):
+        """Notifies the observers that are due in the current generation.
+
+        A single snapshot is shared by all observers notified in the same year.
+        """
+        self._snapshot = None
+        self._observing = True
+        try:
+            for observer in observers:
+                if self.generation % getattr(observer, 'cadence', 1) == 0:
+                    observer.observe(self)
+        finally:
+            self._observing = False
+            self._snapshot = None
+
+    def record_growth(self, house):
+        """Records the end of year growth, changeover and relocation of a household."""
+        self.events.grow(self.generation, house)
+        for attr in ('worker_capability', 'competency', 'ambition'):
+            self.events.attribute(self.generation, house, attr)
+        self.events.relocate(self.generation, house)
+
+    def snapshot(self):
+        """Returns the household columns of the current year as numpy arrays.
 
-            self.interact()
-            presenter.update()
-            for house in self.households:
-                house.grow()
-                house.generational_changeover()
-                house.relocate(self.environment)
-
-            self.environment.flood(self.generation)
-            self.generation += 1
-
-    def interact(self):
-        """Initiates interactions between all intersecting households."""
-        remaining = []
-        for index_1 in range(len(self.households)):
-            for index_2 in range(index_1, len(self.households)):
-                house_1 = self.households[index_1]
-                house_2 = self.households[index_2]
-                if house_1.id is house_2.id:
-                    continue
-                intersection = self.intersect(house_1, house_2)
-                if house_1.num_workers > 0 and house_2.num_workers > 0 and intersection:
+        Returns:
+            A dictionary mapping column names to numpy.ndarrays with one entry
+            per household. Household ids are stored as 16 byte strings. While
+            observers are being notified the same dictionary is returned to all
+            of them and must not be modified.
+        """
+        if self._observing and self._snapshot is not None:
+            return self._snapshot
+        households = self.households
+        count = len(households)
+        columns = {
+            'id': np.array([house.id.bytes for house in households], dtype='S16'),
+            'x_pos': np.fromiter((house.position[0] for house in households),
+                                 dtype=np.int64, count=count),
+            'y_pos': np.fromiter((house.position[1] for house in households),
+                                 dtype=np.int64, count=count),
+            'interaction': np.fromiter((house.interaction for house in households),
+                                       dtype=np.int8, count=count),
+        }
+        for column in ('num_workers', 'grain', 'worker_capability', 'competency', 'ambition'):
+            columns[column] = np.fromiter((getattr(house, column) for house in households),
+                                          dtype=np.float64, count=count)
+        if self._observing:
+            self._snapshot = columns
+        return columns
+
+    def interact(self, num_owned=None):
+        """Initiates interactions between all intersecting households.
+
+        Args:
+            num_owned: Optional number of leading households owned by this
+                simulation. The remaining households are only interacted with
+                by owned households, not with each other. Used to interact
+                with the households of a neighbouring strip (see
+                decomposition.py).
+        """
+        if self.engine is not None and num_owned is None:
+            self.households = self.engine.interact(self.households)
+            return
+        households = self.households
+        if num_owned is None:
+            num_owned = len(households)
+        for index_1 in range(num_owned):
+            house_1 = households[index_1]
+            for index_2 in range(index_1 + 1, len(households)):
+                house_2 = households[index_2]
+                if house_1.num_workers <= 0:
+                    break
+                if house_2.num_workers > 0 and self.intersect(house_1, house_2):
                     self.interaction(house_1, house_2)
-            if house_1.num_workers > 0:
-                remaining.append(house_1)
-        self.households = remaining
+        for index, house in enumerate(households):
+            if house.num_workers <= 0:
+                self.lifecycle.kill(index)
+                if self.events is not None:
+                    self.events.death(self.generation, house)
+        self.lifecycle.compact()
 
     def intersect(self, house_1, house_2):
         """Determines whether two households intersect.
@@ -133,7 +430,9 @@ class Simulation:
         """
         action_1 = house_1.strategy(house_2)
         action_2 = house_2.strategy(house_1)
-        if action_1 < 0 and action_2 < 0:
+        if self.events is not None:
+            self.traced_interaction(house_1, house_2, action_1, action_2)
+        elif action_1 < 0 and action_2 < 0:
             house_1.plunder(house_2); house_2.plunder(house_1)
         elif action_1 < 0 and action_2 >= 0:
             house_1.plunder(house_2)
@@ -142,9 +441,32 @@ class Simulation:
         elif action_1 > 0 and action_2 > 0:
             house_1.collaborate(house_2); house_2.collaborate(house_1)
 
+    def traced_interaction(self, house_1, house_2, action_1, action_2):
+        """Carries out an interaction while recording its events.
+
+        The actions are applied in the same order as in interaction.
+        """
+        events = self.events
+        events.attribute(self.generation, house_1, 'interaction')
+        events.attribute(self.generation, house_2, 'interaction')
+        for actor, rival, action in ((house_1, house_2, action_1), (house_2, house_1, action_2)):
+            if action < 0:
+                grain, num_workers = rival.grain, rival.num_workers
+                actor.plunder(rival)
+                events.plunder(self.generation, actor, rival, grain - rival.grain,
+                               num_workers - rival.num_workers)
+        if action_1 > 0 and action_2 > 0:
+            for actor, partner in ((house_1, house_2), (house_2, house_1)):
+                capability = actor.worker_capability
+                actor.collaborate(partner)
+                events.collaborate(self.generation, actor, partner,
+                                   actor.worker_capability - capability)
+
 
 def load_config(config_file):
-    """Loads and returns the global configuration dictionary.
+    """Loads and returns a configuration dictionary.
+
+    Use config.Config.load to obtain the validated configuration of a run.
 
     Args:
         config_file: Path to a yaml configuration file.
@@ -156,15 +478,17 @@ def load_config(config_file):
     with open(config_file, 'r') as stream:
         try:
             return yaml.safe_load(stream)
-        except yaml.YAMLError as exc:
-            print(exc)
+        except yaml.YAMLError:
+            logger.exception('Failed to parse config %s', config_file)
+            raise
 
 
-def setup_map(map_file, myLogger):
+def setup_map(map_file, map_logger=None):
     """Reads and returns a numpy array its shape from a picture file.
 
     Args:
         map_file: Path to a map picture file.
+        map_logger: Optional logging.Logger. Defaults to the module logger.
 
     Returns:
         A tuple containing a numpy.ndarray and a shape tuple. Each value in the
@@ -172,69 +496,136 @@ def setup_map(map_file, myLogger):
         supplied images are grayscale and, hence, the pixel values will be
         between 0.0 and 1.0.
     """
-
-    myLogger.info('Reading in map image into a numy array')
+    (map_logger or logger).info('Reading %s into a numpy array', map_file)
     np_map = mpimg.imread(map_file)
     shape = np_map.shape
     return np_map, shape
 
 
-def setup_households(env, var_config, const_config):
+def setup_river_distance(river_map, map_file):
+    """Returns the distance_to_river field of a river map, cached on disk.
+
+    The field is stored as a .npy file next to map_file and recomputed when the
+    cache is missing, older than the map or of a different shape.
+
+    Args:
+        river_map: numpy.ndarray read from map_file.
+        map_file: Path to the river map picture file.
+
+    Returns:
+        A numpy.ndarray with the distance in pixels to the nearest river pixel.
+    """
+    cache_file = os.path.splitext(map_file)[0] + '_distance.npy'
+    try:
+        if os.path.getmtime(cache_file) >= os.path.getmtime(map_file):
+            distance = np.load(cache_file)
+            if distance.shape == river_map.shape[:2]:
+                return distance
+    except (OSError, ValueError, EOFError):
+        pass
+    distance = cached_distance_to_river(river_map)
+    # Written to a temporary file first, so processes sharing the cache never
+    # read a partially written file.
+    temp_file = '{0}.{1}.tmp'.format(cache_file, os.getpid())
+    try:
+        with open(temp_file, 'wb') as cache:
+            np.save(cache, distance)
+        os.replace(temp_file, cache_file)
+    except OSError:
+        pass
+    return distance
+
+
+def setup_region_map(region_file):
+    """Reads and returns an integer region label raster.
+
+    Args:
+        region_file: Path to a .npy file of integer labels, or to a grayscale
+            picture file whose pixel values (0 to 255) are the labels.
+
+    Returns:
+        An integer numpy.ndarray of region labels.
+    """
+    if region_file.endswith('.npy'):
+        return np.load(region_file)
+    region_img = mpimg.imread(region_file)
+    if region_img.ndim == 3:
+        region_img = region_img[:, :, 0]
+    if np.issubdtype(region_img.dtype, np.floating):
+        region_img = np.rint(region_img * 255)
+    return region_img.astype(np.int32)
+
+
+def setup_households(env, var_config, const_config=None):
     """Creates and returns a list of household objects.
 
+    All households share a single HouseholdConstants object and, since the
+    AgentModel holds no per household state, a single AgentModel.
+
     Args:
-        var_config: Path to a config file containing simulation parameters that
+        var_config: Config, or dictionary of the simulation parameters that
             will vary throughout the simulation.
-        const_config: Path to a config file containing simulation parameters
-            that remain constant throughout the simulation.
+        const_config: Dictionary of the simulation parameters that remain
+            constant throughout the simulation. Defaults to var_config, which
+            must then be a Config.
 
     Returns:
         A list of Household objects.
     """
+    if const_config is None:
+        const_config = var_config
     households = []
+    model = AgentModel()
+    constants = HouseholdConstants.from_config(const_config)
+    household_config = var_config['households']
+    num_workers = household_config['num_workers']
+    grain = household_config['grain']
+    worker_capability = household_config['worker_capability']
+    min_competency = household_config['min_competency']
+    min_ambition = household_config['min_ambition']
     for _ in range(var_config['num_households']):
-        model = AgentModel()
         id = uuid.uuid1()
-        household_config = var_config['households']
-        num_workers = household_config['num_workers']
-        grain = household_config['grain']
-        worker_capability = household_config['worker_capability']
-        min_competency = household_config['min_competency']
-        min_ambition = household_config['min_ambition']
         household = Household(model, id, num_workers, grain, worker_capability,
-                              min_competency, min_ambition, const_config, env)
+                              min_competency, min_ambition, constants, env)
         households.append(household)
     return households
 
-def load_config(config_file):
-    """Loads and returns the global configuration dictionary.
-
-    Args:
-        config_file: Path to a yaml configuration file.
-
-    Returns:
-        A dictionary where the keys are simulation parameters and the
-        corresponding values are user-specified inputs to the simulation.
-    """
-    with open(config_file, 'r') as stream:
-        try:
-            return yaml.safe_load(stream)
-        except yaml.YAMLError:
-            myLogger.exception('Failed to parse config')
-
 
 def main():
+    logging.basicConfig(level=logging.INFO)
 
-    var_config = load_config('../var_config.yml')
-    const_config = load_config('../const_config.yml')
+    config = Config.load('../var_config.yml', '../const_config.yml')
     river_map, map_shape = setup_map('../../resources/maps/river_map.png')
     fertility_map, map_shape = setup_map('../../resources/maps/fertility_map.png')
-
-    num_generations = const_config['num_generations']
-    environment = Environment(river_map, fertility_map, map_shape, const_config)
-    households = setup_households(environment, var_config, const_config)
-    simulation = Simulation(households, environment, num_generations)
+    river_distance = setup_river_distance(river_map, '../../resources/maps/river_map.png')
+
+    environment = Environment(river_map, fertility_map, map_shape, config, river_distance)
+    policy = precision.SINGLE if config.single_precision else None
+    if policy is not None:
+        policy.apply(environment)
+        if not config.array_engine:
+            logger.warning('single_precision without array_engine only shrinks the maps; '
+                           'the Household objects keep Python floats')
+    households = setup_households(environment, config)
+    scheduler = None
+    if config.field_ownership:
+        scheduler = OwnershipHarvester()
+    elif config.harvest_threads:
+        scheduler = HarvestScheduler(config.harvest_threads)
+    simulation = Simulation(households, environment, config.num_generations,
+                            engine=kernels.default_engine(config, policy), scheduler=scheduler)
     presenter = Presenter(simulation)
+    if config.memory_budget:
+        budget = memory.MemoryBudget(config.memory_budget * 2**20)
+        budget.apply(simulation, presenter)
+        for downgrade in budget.downgrades:
+            logger.warning('Memory budget: %s', downgrade)
+    logger.info('Memory report:\n%s', presenter.memory_report())
+    if config.metrics_port:
+        endpoint = monitoring.MetricsEndpoint(port=config.metrics_port)
+        endpoint.start()
+        simulation.observers.append(endpoint)
+        logger.info('Serving live metrics on http://127.0.0.1:%d/metrics', endpoint.port)
 
     pr = cProfile.Profile()
     pr.enable()
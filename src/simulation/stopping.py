@@ -0,0 +1,96 @@
+"""Criteria that end a simulation run before num_generations is reached.
+
+A criterion is checked by Simulation.run at the end of every simulated year.
+The reason of the first criterion that is met is recorded in the simulation's
+summary.
+"""
+from abc import ABC, abstractmethod
+from collections import deque
+
+import numpy as np
+
+from simulation.metrics import GiniCoefficient
+
+
+class StoppingCriterion(ABC):
+    """Base class of all stopping criteria.
+
+    Subclasses must override should_stop.
+
+    Attributes:
+        reason: Short description recorded when the criterion stops a run.
+    """
+
+    reason = 'stopped'
+
+    @abstractmethod
+    def should_stop(self, simulation):
+        """Returns whether the run should stop after the current year."""
+
+
+class Extinction(StoppingCriterion):
+    """Stops the run once no households remain."""
+
+    reason = 'extinction'
+
+    def should_stop(self, simulation):
+        """Overrides superclass method."""
+        return not simulation.num_households()
+
+
+class SteadyState(StoppingCriterion):
+    """Stops the run once population and gini-coefficient have settled.
+
+    The run is considered stationary when, over the last window years, the
+    coefficient of variation of the total population is below
+    population_tolerance and the standard deviation of the gini-coefficient is
+    below gini_tolerance.
+    """
+
+    reason = 'steady_state'
+
+    def __init__(self, window=100, population_tolerance=0.01, gini_tolerance=0.01):
+        self.window = window
+        self.population_tolerance = population_tolerance
+        self.gini_tolerance = gini_tolerance
+        self._population = deque(maxlen=window)
+        self._gini = deque(maxlen=window)
+        self._gini_coefficient = GiniCoefficient()
+
+    def should_stop(self, simulation):
+        """Overrides superclass method."""
+        households = simulation.households
+        count = len(households)
+        workers = np.fromiter((house.num_workers for house in households),
+                              dtype=np.float64, count=count)
+        grain = np.fromiter((house.grain for house in households), dtype=np.float64, count=count)
+        self._population.append(workers.sum())
+        self._gini.append(self._gini_coefficient(grain))
+        if len(self._population) < self.window:
+            return False
+        population = np.array(self._population)
+        mean_population = population.mean()
+        if not mean_population:
+            return False
+        return (population.std() / mean_population < self.population_tolerance
+                and np.std(self._gini) < self.gini_tolerance)
+
+
+class Dominance(StoppingCriterion):
+    """Stops the run once a single household holds most of an attribute.
+
+    By default the run stops when one household has at least share of all the
+    workers of the simulation.
+    """
+
+    reason = 'dominance'
+
+    def __init__(self, share=0.9, attribute='num_workers'):
+        self.share = share
+        self.attribute = attribute
+
+    def should_stop(self, simulation):
+        """Overrides superclass method."""
+        values = [getattr(house, self.attribute) for house in simulation.households]
+        total = sum(values)
+        return total > 0 and max(values) >= self.share * total
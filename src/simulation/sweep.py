@@ -0,0 +1,380 @@
+"""Distributes parameter sweeps over worker processes on any number of nodes.
+
+A Coordinator holds a queue of (config, seed) jobs and listens on a TCP port.
+Workers connect to it, run each job they are handed as a headless Simulation
+and send back its summary. Coordinator and workers exchange JSON messages, each
+prefixed by its length as a 4 byte big-endian integer:
+
+    worker -> coordinator   hello, heartbeat, result, error
+    coordinator -> worker   job, stop
+
+A busy worker sends a heartbeat every few seconds. If its connection is lost or
+no message arrives within the heartbeat timeout, its job is handed to another
+worker, up to max_attempts times. A job that raises an exception is recorded as
+a failure and is not retried, because the exception would recur.
+
+    python sweep.py coordinator port num_seeds [results.json]
+    python sweep.py worker host port
+"""
+import collections
+import functools
+import json
+import logging
+import os
+import random
+import selectors
+import socket
+import struct
+import sys
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+import numpy as np
+
+from simulation.config import Config
+from simulation.environment import Environment
+from simulation import kernels
+from simulation import simulation_driver
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('!I')
+
+
+class SweepJob(namedtuple('SweepJob', ['job_id', 'config', 'seed'])):
+    """A single run of a sweep.
+
+    Attributes:
+        job_id: Integer that identifies the job.
+        config: Dictionary of the run's configuration, as returned by
+            Config.to_dict.
+        seed: Seed of the run's random stream.
+    """
+
+    __slots__ = ()
+
+
+def sweep_jobs(config, seeds, overrides=None):
+    """Returns a SweepJob for every seed of every set of overrides.
+
+    Args:
+        config: Base Config of the sweep.
+        seeds: Iterable of seeds.
+        overrides: Optional list of override dictionaries accepted by
+            Config.replace. Defaults to the base config alone.
+    """
+    jobs = []
+    for override in overrides or [{}]:
+        run_config = config.replace(**override).to_dict()
+        for seed in seeds:
+            jobs.append(SweepJob(len(jobs), run_config, seed))
+    return jobs
+
+
+def send_message(sock, message):
+    """Sends a JSON message prefixed by its length."""
+    body = json.dumps(message).encode()
+    sock.sendall(HEADER.pack(len(body)) + body)
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data.extend(chunk)
+    return bytes(data)
+
+
+def recv_message(sock):
+    """Receives a length-prefixed JSON message, or returns None at end of stream."""
+    header = _recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    body = _recv_exactly(sock, HEADER.unpack(header)[0])
+    return None if body is None else json.loads(body)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_maps(river_map_file, fertility_map_file):
+    """Reads the maps of a worker once per process."""
+    river_map, map_shape = simulation_driver.setup_map(river_map_file)
+    fertility_map, map_shape = simulation_driver.setup_map(fertility_map_file)
+    river_distance = simulation_driver.setup_river_distance(river_map, river_map_file)
+    return river_map, fertility_map, map_shape, river_distance
+
+
+def run_job(job, river_map_file='../../resources/maps/river_map.png',
+            fertility_map_file='../../resources/maps/fertility_map.png'):
+    """Runs the Simulation of a job message headless and returns its summary."""
+    config = Config.from_dicts(job['config'])
+    random.seed(job['seed'])
+    river_map, fertility_map, map_shape, river_distance = _load_maps(river_map_file,
+                                                                     fertility_map_file)
+    environment = Environment(river_map, np.copy(fertility_map), map_shape, config,
+                              river_distance)
+    households = simulation_driver.setup_households(environment, config)
+    simulation = simulation_driver.Simulation(households, environment, config.num_generations,
+                                              engine=kernels.default_engine(config))
+    simulation.run()
+    return simulation.summary()
+
+
+class SweepWorker:
+    """Runs the jobs handed out by a Coordinator.
+
+    Attributes:
+        host: Host name of the coordinator.
+        port: Port of the coordinator.
+        run: Callable that receives a job message (with job_id, config, seed
+            and attempt keys) and returns its JSON serialisable result.
+        heartbeat_interval: Seconds between heartbeats while a job runs, or
+            None to send no heartbeats.
+        name: Name reported to the coordinator.
+        completed: Number of jobs completed by the last serve.
+    """
+
+    def __init__(self, host, port, run=run_job, heartbeat_interval=2.0, name=None):
+        self.host = host
+        self.port = port
+        self.run = run
+        self.heartbeat_interval = heartbeat_interval
+        self.name = name or '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        self.completed = 0
+
+    def serve(self):
+        """Runs jobs until the coordinator stops the worker or disconnects."""
+        self.completed = 0
+        with socket.create_connection((self.host, self.port)) as sock:
+            lock = threading.Lock()
+            try:
+                send_message(sock, {'type': 'hello', 'worker': self.name})
+                while True:
+                    message = recv_message(sock)
+                    if message is None or message['type'] == 'stop':
+                        break
+                    reply = self.run_message(sock, lock, message)
+                    with lock:
+                        send_message(sock, reply)
+                    self.completed += 1
+            except OSError as error:
+                logger.warning('Lost the coordinator: %s', error)
+
+    def run_message(self, sock, lock, message):
+        """Runs a job message while sending heartbeats and returns the reply."""
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(self.heartbeat_interval):
+                try:
+                    with lock:
+                        send_message(sock, {'type': 'heartbeat', 'job_id': message['job_id']})
+                except OSError:
+                    return
+
+        thread = None
+        if self.heartbeat_interval:
+            thread = threading.Thread(target=heartbeat, daemon=True, name='sweep-heartbeat')
+            thread.start()
+        try:
+            return {'type': 'result', 'job_id': message['job_id'],
+                    'result': self.run(message)}
+        except Exception:
+            return {'type': 'error', 'job_id': message['job_id'],
+                    'error': traceback.format_exc()}
+        finally:
+            done.set()
+            if thread is not None:
+                thread.join()
+
+
+class _Connection:
+    """State of a worker connection held by the Coordinator."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+        self.name = None
+        self.job = None
+        self.attempt = 0
+        self.last_seen = time.monotonic()
+
+    def messages(self):
+        """Yields the complete messages in the receive buffer."""
+        while len(self.buffer) >= HEADER.size:
+            size = HEADER.unpack_from(self.buffer)[0]
+            if len(self.buffer) < HEADER.size + size:
+                return
+            body = bytes(self.buffer[HEADER.size:HEADER.size + size])
+            del self.buffer[:HEADER.size + size]
+            yield json.loads(body)
+
+
+class Coordinator:
+    """Hands out sweep jobs to workers over TCP and collects their results.
+
+    Attributes:
+        jobs: List of SweepJob objects.
+        host: Interface the coordinator listens on.
+        port: Port the coordinator listens on; 0 picks a free port on bind.
+        heartbeat_timeout: Seconds a busy worker may stay silent before its
+            job is handed to another worker.
+        max_attempts: Maximum number of times a job is handed out.
+        results: Dictionary mapping job ids to results.
+        failures: Dictionary mapping job ids to the reasons they failed.
+        attempts: Dictionary mapping job ids to the number of times they were
+            handed out.
+    """
+
+    def __init__(self, jobs, host='127.0.0.1', port=0, heartbeat_timeout=10.0,
+                 max_attempts=3):
+        self.jobs = list(jobs)
+        self.host = host
+        self.port = port
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.results = {}
+        self.failures = {}
+        self.attempts = collections.Counter()
+        self._listener = None
+        self._pending = None
+        self._selector = None
+        self._connections = {}
+
+    def bind(self):
+        """Starts listening and returns the bound port."""
+        if self._listener is None:
+            self._listener = socket.create_server((self.host, self.port))
+            self.port = self._listener.getsockname()[1]
+        return self.port
+
+    def run(self, timeout=None):
+        """Serves workers until every job has a result or has failed.
+
+        Args:
+            timeout: Optional maximum number of seconds to serve for.
+
+        Returns:
+            Dictionary mapping job ids to results.
+
+        Raises:
+            TimeoutError: If the jobs are not finished within timeout.
+        """
+        self.bind()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._pending = collections.deque((job, 0) for job in self.jobs)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._connections = {}
+        try:
+            while self._pending or self.busy():
+                for conn in list(self._connections.values()):
+                    if conn.job is None and conn.name is not None and self._pending:
+                        self.dispatch(conn, *self._pending.popleft())
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError('Sweep did not finish within {0} s'.format(timeout))
+                events = self._selector.select(timeout=min(1.0, self.heartbeat_timeout / 4))
+                for key, _ in events:
+                    if key.fileobj is self._listener:
+                        sock, _ = self._listener.accept()
+                        self._connections[sock] = _Connection(sock)
+                        self._selector.register(sock, selectors.EVENT_READ)
+                    else:
+                        self.receive(self._connections[key.fileobj])
+                now = time.monotonic()
+                for conn in list(self._connections.values()):
+                    if conn.job is not None and now - conn.last_seen > self.heartbeat_timeout:
+                        logger.warning('Worker %s timed out on job %d', conn.name,
+                                       conn.job.job_id)
+                        self.drop(conn)
+        finally:
+            for conn in self._connections.values():
+                try:
+                    send_message(conn.sock, {'type': 'stop'})
+                except OSError:
+                    pass
+                conn.sock.close()
+            self._selector.close()
+            self.close()
+        return self.results
+
+    def close(self):
+        """Stops listening."""
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def busy(self):
+        """Returns whether any worker is running a job."""
+        return any(conn.job is not None for conn in self._connections.values())
+
+    def dispatch(self, conn, job, attempt):
+        """Sends a job to an idle worker."""
+        conn.job, conn.attempt, conn.last_seen = job, attempt, time.monotonic()
+        self.attempts[job.job_id] += 1
+        try:
+            send_message(conn.sock, {'type': 'job', 'job_id': job.job_id, 'config': job.config,
+                                     'seed': job.seed, 'attempt': attempt})
+        except OSError:
+            self.drop(conn)
+
+    def receive(self, conn):
+        """Reads from a worker connection and handles its complete messages."""
+        try:
+            data = conn.sock.recv(65536)
+        except OSError:
+            data = b''
+        if not data:
+            self.drop(conn)
+            return
+        conn.buffer.extend(data)
+        conn.last_seen = time.monotonic()
+        for message in conn.messages():
+            if message['type'] == 'hello':
+                conn.name = message['worker']
+            elif message['type'] == 'result' and conn.job is not None:
+                self.results[conn.job.job_id] = message['result']
+                conn.job = None
+            elif message['type'] == 'error' and conn.job is not None:
+                logger.error('Job %d failed on %s:\n%s', conn.job.job_id, conn.name,
+                             message['error'])
+                self.failures[conn.job.job_id] = message['error']
+                conn.job = None
+
+    def drop(self, conn):
+        """Closes a lost worker connection and hands its job out again."""
+        self._selector.unregister(conn.sock)
+        conn.sock.close()
+        del self._connections[conn.sock]
+        if conn.job is None:
+            return
+        job, attempt = conn.job, conn.attempt + 1
+        conn.job = None
+        if attempt < self.max_attempts:
+            self._pending.append((job, attempt))
+        else:
+            self.failures[job.job_id] = 'Worker lost {0} times'.format(attempt)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1] == 'coordinator':
+        port, num_seeds = int(sys.argv[2]), int(sys.argv[3])
+        output = sys.argv[4] if len(sys.argv) > 4 else 'sweep_results.json'
+        config = Config.load('../var_config.yml', '../const_config.yml')
+        coordinator = Coordinator(sweep_jobs(config, range(num_seeds)), host='0.0.0.0',
+                                  port=port)
+        logger.info('Coordinating %d jobs on port %d', len(coordinator.jobs), coordinator.bind())
+        coordinator.run()
+        with open(output, 'w') as results_file:
+            json.dump({'results': coordinator.results, 'failures': coordinator.failures},
+                      results_file, indent=2)
+    else:
+        SweepWorker(sys.argv[2], int(sys.argv[3])).serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Generates synthetic Nile valley maps of any size.
+
+The generated river_map and fertility_map have the same format as the maps
+read by simulation_driver.setup_map: float32 arrays in which river pixels are
+1.0 and fertility lies between 0.0 and 1.0. The river runs from the top to the
+bottom of the map along a meandering centre line made of a few random
+sinusoids, with a slowly varying width. Fertility is 0.0 on the river and
+decays exponentially with the horizontal distance from the nearest bank.
+
+The maps are generated in blocks of rows and can be written straight to .npy
+files through memory maps, so maps of 10^9 pixels can be produced without
+holding them in memory.
+
+    python synthetic.py rows cols directory [seed]
+"""
+import os
+import sys
+
+import numpy as np
+
+
+class SyntheticNile:
+    """Describes a synthetic river valley independently of its resolution.
+
+    All lengths are fractions of the map width, so the same seed produces the
+    same valley at every resolution.
+
+    Attributes:
+        seed: Seed of the random meanders.
+        river_width: Mean width of the river.
+        meander: Amplitude of the meanders.
+        decay: Distance from the banks at which fertility falls by 1/e.
+        peak_fertility: Fertility next to the banks.
+        desert: Fertility below which land is barren (0.0).
+    """
+
+    NUM_WAVES = 4
+
+    def __init__(self, seed=None, river_width=0.04, meander=0.12, decay=0.6,
+                 peak_fertility=0.65, desert=0.05):
+        self.seed = seed
+        self.river_width = river_width
+        self.meander = meander
+        self.decay = decay
+        self.peak_fertility = peak_fertility
+        self.desert = desert
+        rng = np.random.default_rng(seed)
+        weights = rng.uniform(0.5, 1.0, self.NUM_WAVES)
+        self._amplitudes = weights / weights.sum()
+        self._frequencies = rng.uniform(0.5, 4.0, self.NUM_WAVES)
+        self._phases = rng.uniform(0, 2 * np.pi, self.NUM_WAVES)
+        self._width_frequency = rng.uniform(1.0, 3.0)
+        self._width_phase = rng.uniform(0, 2 * np.pi)
+
+    def banks(self, rows, nrows, ncols):
+        """Returns the left and right bank columns of the given rows."""
+        along = (np.asarray(rows, dtype=np.float64) / nrows)[:, None]
+        waves = np.sin(2 * np.pi * self._frequencies * along + self._phases)
+        centre = ncols * (0.5 + self.meander * (waves * self._amplitudes).sum(axis=1))
+        width = ncols * self.river_width * (1 + 0.5 * np.sin(
+            2 * np.pi * self._width_frequency * along[:, 0] + self._width_phase))
+        width = np.maximum(width, 1.0)
+        return centre - width / 2, centre + width / 2
+
+    def fill(self, river_map, fertility_map, block_rows=1024):
+        """Generates the maps into preallocated (e.g. memory mapped) arrays."""
+        nrows, ncols = river_map.shape
+        cols = np.arange(ncols, dtype=np.float64)[None, :]
+        for start in range(0, nrows, block_rows):
+            stop = min(nrows, start + block_rows)
+            left, right = self.banks(np.arange(start, stop), nrows, ncols)
+            distance = np.maximum(left[:, None] - cols, cols - right[:, None])
+            river = distance <= 0
+            fertility = self.peak_fertility * np.exp(-distance / (self.decay * ncols))
+            fertility[river | (fertility < self.desert)] = 0
+            river_map[start:stop] = river
+            fertility_map[start:stop] = fertility
+
+    def generate(self, shape, directory=None):
+        """Returns a (river_map, fertility_map, shape) tuple for an Environment.
+
+        Args:
+            shape: Tuple of the number of rows and columns.
+            directory: Optional directory in which the maps are created as
+                memory mapped river_map.npy and fertility_map.npy files.
+        """
+        shape = tuple(int(size) for size in shape)
+        if directory is None:
+            river_map = np.empty(shape, dtype=np.float32)
+            fertility_map = np.empty(shape, dtype=np.float32)
+        else:
+            os.makedirs(directory, exist_ok=True)
+            river_map = np.lib.format.open_memmap(os.path.join(directory, 'river_map.npy'),
+                                                  mode='w+', dtype=np.float32, shape=shape)
+            fertility_map = np.lib.format.open_memmap(
+                os.path.join(directory, 'fertility_map.npy'), mode='w+', dtype=np.float32,
+                shape=shape)
+        self.fill(river_map, fertility_map)
+        return river_map, fertility_map, shape
+
+
+def synthetic_maps(shape, seed=None, directory=None, **options):
+    """Returns a synthetic (river_map, fertility_map, shape) tuple.
+
+    The result can be passed straight to Environment, e.g.
+    Environment(*synthetic_maps((6000, 4000), seed=1), const_config).
+
+    Args:
+        shape: Tuple of the number of rows and columns.
+        seed: Seed that determines the valley.
+        directory: Optional directory for memory mapped .npy maps.
+        options: Further SyntheticNile parameters.
+    """
+    return SyntheticNile(seed, **options).generate(shape, directory)
+
+
+def main():
+    nrows, ncols, directory = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3]
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    synthetic_maps((nrows, ncols), seed, directory)
+    print('Wrote {0}x{1} maps to {2}'.format(nrows, ncols, directory))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+from unittest import TestCase, main
+
+import numpy as np
+
+from simulation.branching import apply_overrides
+from simulation.config import Config
+from simulation.environment import Environment, silt_diffusion
+from simulation.simulation_driver import Simulation
+from simulation import simulation_driver
+
+
+def collect(simulation):
+    return {'generation': simulation.generation,
+            'flood_frequency': simulation.environment.FLOOD_FREQ,
+            'growth_rate': simulation.households[0].constants.GROWTH_RATE
+            if simulation.households else None,
+            'grain': sorted(house.grain for house in simulation.households)}
+
+
+class BranchingTest(TestCase):
+
+    def setUp(self):
+        config = Config.load('../var_config.yml', '../const_config.yml')
+        river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+        self.environment = Environment(river_map, fertility_map, map_shape, config)
+        households = simulation_driver.setup_households(self.environment, config)
+        self.simulation = Simulation(households, self.environment, 20)
+        self.simulation.run(3)
+
+    def test_branch(self):
+        grain = sorted(house.grain for house in self.simulation.households)
+        overrides = [{}, {'flood_frequency': 2}, {'growth_rate': 0.5, 'num_generations': 5}]
+        results = self.simulation.branch(overrides, n_years=4, collect=collect, seed=7,
+                                         max_workers=2)
+        assert [result['generation'] for result in results] == [7, 7, 5]
+        assert [result['flood_frequency'] for result in results] == [0, 2, 0]
+        assert results[2]['growth_rate'] in (0.5, None)
+
+        assert self.simulation.generation == 3
+        assert self.environment.FLOOD_FREQ == 0
+        assert sorted(house.grain for house in self.simulation.households) == grain
+
+        again = self.simulation.branch(overrides, n_years=4, collect=collect, seed=7)
+        assert again == results
+
+    def test_default_summary(self):
+        results = self.simulation.branch([{}], n_years=1)
+        assert results[0]['generation'] == 4
+
+    def test_invalid_overrides(self):
+        with self.assertRaises(ValueError):
+            self.simulation.branch([{'river_map': None}])
+        with self.assertRaises(ValueError):
+            self.simulation.branch([{}, {'survival_probability': 5}])
+        with self.assertRaises(ValueError):
+            self.simulation.branch([{'flood_frequency': 1.5}])
+
+    def test_silt_uses_configured_spread(self):
+        config = Config.load('../var_config.yml', '../const_config.yml', silt_spread=3)
+        environment = Environment(self.environment.river_map, self.environment.fertility_map,
+                                  self.environment.shape, config)
+        simulation = Simulation([], environment, 20)
+        apply_overrides(simulation, {'silt_rate': 0.2})
+        assert environment.SILT_RATE == 0.2
+        assert np.array_equal(environment.silt_map, silt_diffusion(environment.river_map, 3))
+        apply_overrides(simulation, {'silt_spread': 6})
+        assert np.array_equal(environment.silt_map, silt_diffusion(environment.river_map, 6))
+
+    def test_failing_branch(self):
+        def fail(simulation):
+            raise KeyError('boom')
+        with self.assertRaises(RuntimeError):
+            self.simulation.branch([{}, {}], n_years=1, collect=fail)
+
+
+if __name__ == '__main__':
+    main()
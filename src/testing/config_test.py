@@ -0,0 +1,76 @@
+from unittest import TestCase, main
+
+from simulation.config import Config, HouseholdConfig
+from simulation.environment import Environment
+from simulation.household import HouseholdConstants
+from simulation import simulation_driver
+
+
+class ConfigTest(TestCase):
+
+    def setUp(self):
+        self.config = Config.load('../var_config.yml', '../const_config.yml')
+
+    def test_load(self):
+        var_config = simulation_driver.load_config('../var_config.yml')
+        const_config = simulation_driver.load_config('../const_config.yml')
+        for key, value in const_config.items():
+            assert self.config[key] == value
+        assert self.config.num_households == var_config['num_households']
+        assert isinstance(self.config.households, HouseholdConfig)
+        assert self.config['households']['grain'] == var_config['households']['grain']
+        assert isinstance(self.config.num_generations, int)
+        assert isinstance(self.config.worker_appetite, float)
+        assert self.config.get('missing', 3) == 3
+        assert 'silt_rate' in self.config
+        assert self.config.to_dict()['households'] == var_config['households']
+
+    def test_immutable_and_hashable(self):
+        with self.assertRaises(AttributeError):
+            self.config.num_generations = 5
+        copy = Config.load('../var_config.yml', '../const_config.yml')
+        assert copy == self.config and hash(copy) == hash(self.config)
+        assert len({self.config, copy}) == 1
+        changed = self.config.replace(num_generations=5)
+        assert changed.num_generations == 5
+
+    def test_overrides(self):
+        config = Config.load('../var_config.yml', '../const_config.yml', silt_rate=0.5,
+                             households={'grain': 10}, households__min_ambition=0.5)
+        assert config.silt_rate == 0.5
+        assert config.households.grain == 10.0
+        assert config.households.min_ambition == 0.5
+        assert config.households.num_workers == self.config.households.num_workers
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            self.config.replace(num_generations=2.5)
+        with self.assertRaises(ValueError):
+            self.config.replace(survival_probability=1.5)
+        with self.assertRaises(ValueError):
+            self.config.replace(claim_ratio='20')
+        with self.assertRaises(ValueError):
+            self.config.replace(unknown_key=1)
+        with self.assertRaises(ValueError):
+            self.config.replace(flood_frequency=True)
+        assert self.config.replace(single_precision=True).single_precision == 1
+        assert self.config.replace(array_engine=False).array_engine == 0
+        with self.assertRaises(ValueError):
+            self.config.replace(households__min_competency=-0.1)
+        config = self.config.to_dict()
+        del config['knowledge_ratio']
+        with self.assertRaises(ValueError):
+            Config.from_dicts(config)
+
+    def test_components(self):
+        river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+        environment = Environment(river_map, fertility_map, map_shape, self.config)
+        households = simulation_driver.setup_households(environment, self.config)
+        assert len(households) == self.config.num_households
+        assert households[0].constants == HouseholdConstants.from_config(self.config)
+        assert households[0].grain == self.config.households.grain
+
+
+if __name__ == '__main__':
+    main()
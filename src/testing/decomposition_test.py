@@ -0,0 +1,124 @@
+from unittest import TestCase, main
+import uuid
+
+import numpy as np
+
+from model.agent_model import AgentModel
+from simulation.decomposition import DecomposedSimulation, field_reach, strip_bounds
+from simulation.environment import Environment
+from simulation.household import Household
+from simulation import simulation_driver
+
+
+class CollaborativeModel(AgentModel):
+    """AgentModel that always collaborates and never moves."""
+
+    def relocate(self, knowledge_radius, current_position, environment):
+        return current_position
+
+    def strategy(self, household_id):
+        return 1
+
+
+class InteractionRecorder:
+
+    def __init__(self):
+        self.interactions = []
+        self.positions = []
+
+    def observe(self, simulation):
+        snapshot = simulation.snapshot()
+        self.interactions.append(snapshot['interaction'].tolist())
+        self.positions.append(snapshot['y_pos'].tolist())
+
+
+class DecomposedSimulationTest(TestCase):
+
+    def setUp(self):
+        self.var_config = simulation_driver.load_config('../var_config.yml')
+        self.const_config = simulation_driver.load_config('../const_config.yml')
+        river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+        self.environment = Environment(river_map, fertility_map, map_shape, self.const_config)
+
+    def test_strip_bounds(self):
+        assert strip_bounds(600, 4) == [0, 150, 300, 450]
+        assert strip_bounds(10, 3) == [0, 3, 6]
+
+    def test_run(self):
+        self.var_config['num_households'] = 120
+        households = simulation_driver.setup_households(self.environment, self.var_config,
+                                                        self.const_config)
+        ids = {house.id for house in households}
+        with DecomposedSimulation(households, self.environment, 5, num_strips=3) as simulation:
+            assert simulation.row_starts == [0, 200, 400]
+            commands = []
+            broadcast = simulation.broadcast
+            def recording_broadcast(command, *args):
+                commands.append(command)
+                return broadcast(command, *args)
+            simulation.broadcast = recording_broadcast
+            years = simulation.run()
+            summary = simulation.summary()
+            assert 'households' not in commands
+            assert years == simulation.generation
+            households = simulation.households
+            assert len({house.id for house in households}) == len(households)
+            assert {house.id for house in households} <= ids
+            assert all(house.num_workers > 0 and house.grain >= 0 for house in households)
+            snapshot = simulation.snapshot()
+            assert len(snapshot['id']) == len(households)
+            assert summary['num_households'] == simulation.num_households() == len(households)
+            assert np.isclose(summary['population'], sum(house.num_workers for house in households))
+        fertility_map = self.environment.fertility_map
+        assert fertility_map.base is None
+        assert np.all(fertility_map <= self.environment.flood_map + 1e-6)
+        assert not np.array_equal(fertility_map, self.environment.flood_map)
+
+    def test_interaction_across_boundary(self):
+        model = CollaborativeModel()
+        river_map = self.environment.river_map
+        x_pos = int(np.nonzero((river_map[290:310] == 0).all(axis=0))[0][0])
+        households = []
+        for y_pos, capability in ((295, 1000), (305, 3000)):
+            house = Household(model, uuid.uuid4(), 15, 3000, capability, 0.2, 0.2,
+                              self.const_config, self.environment)
+            house.position = (x_pos, y_pos)
+            households.append(house)
+        recorder = InteractionRecorder()
+        with DecomposedSimulation(households, self.environment, 3, num_strips=2,
+                                  observers=[recorder]) as simulation:
+            assert simulation.strip_of(295) == 0 and simulation.strip_of(305) == 1
+            simulation.run()
+        assert recorder.interactions == [[1, 1]] * 3
+        assert recorder.positions == [[295, 305]] * 3
+
+    def test_strips_must_separate_fields(self):
+        self.var_config['num_households'] = 30
+        households = simulation_driver.setup_households(self.environment, self.var_config,
+                                                        self.const_config)
+        # 15 workers reach 26 rows, so strips must be 52 rows tall.
+        assert field_reach(households[0].constants, 15) == 26
+        with self.assertRaises(ValueError):
+            DecomposedSimulation(households, self.environment, 1, num_strips=12)
+        with DecomposedSimulation(households, self.environment, 1, num_strips=11) as simulation:
+            assert simulation.farm_rounds(15) == [[0, 2, 4, 6, 8, 10], [1, 3, 5, 7, 9]]
+            assert simulation.farm_rounds(30) == [[index] for index in range(11)]
+
+    def test_fields_cross_strip_boundary(self):
+        river_map = self.environment.river_map
+        x_pos = int(np.nonzero((river_map[250:350] == 0).all(axis=0))[0][0])
+        house = Household(CollaborativeModel(), uuid.uuid4(), 15, 3000, 1000, 1, 1,
+                          self.const_config, self.environment)
+        house.position = (x_pos, 299)
+        flood_map = self.environment.flood_map
+        with DecomposedSimulation([house], self.environment, 3, num_strips=4) as simulation:
+            assert simulation.strip_of(299) == 1 and simulation.strip_of(300) == 2
+            simulation.run()
+        # The only household lives in strip 1, but its field (centred at or
+        # below its row) reaches into the rows of strip 2.
+        harvested = np.nonzero((self.environment.fertility_map < flood_map - 1e-6).any(axis=1))[0]
+        assert len(harvested) and harvested.max() >= 300
+
+if __name__ == '__main__':
+    main()
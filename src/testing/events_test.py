@@ -0,0 +1,81 @@
+import os
+import tempfile
+from unittest import TestCase, main
+
+import numpy as np
+
+from simulation import events
+from simulation.config import Config
+from simulation.environment import Environment
+from simulation.replay import Replay
+from simulation.simulation_driver import Simulation
+from simulation import simulation_driver
+
+
+class EventTraceTest(TestCase):
+
+    def setUp(self):
+        var_config = simulation_driver.load_config('../var_config.yml')
+        self.const_config = simulation_driver.load_config('../const_config.yml')
+        self.const_config.update({'flood_frequency': 7, 'regeneration_rate': 0.2,
+                                  'silt_rate': 0.05})
+        self.river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        self.fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+
+        self.environment = Environment(self.river_map, np.copy(self.fertility_map), map_shape,
+                                       self.const_config)
+        self.households = simulation_driver.setup_households(self.environment, var_config,
+                                                             self.const_config)
+        self.directory = tempfile.TemporaryDirectory()
+        self.trace_path = os.path.join(self.directory.name, 'run.trace')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_replay_matches_simulation(self):
+        class Presenter:
+            def update(self):
+                pass
+
+        recorded = {}
+        class Recorder:
+            def observe(self, simulation):
+                snapshot = simulation.snapshot()
+                order = np.argsort([writer.actors[house.id] for house in simulation.households])
+                recorded[simulation.generation] = (
+                    {column: values[order] for column, values in snapshot.items()},
+                    np.copy(simulation.environment.fertility_map))
+
+        writer = events.EventWriter(self.trace_path, self.environment.shape, buffer_records=100)
+        simulation = Simulation(self.households, self.environment, 30,
+                                observers=[Recorder()], events=writer)
+        for _ in range(30):
+            simulation.run_year_simulation(Presenter())
+        writer.close()
+
+        _, records = events.read_trace(self.trace_path)
+        assert np.count_nonzero(records['kind'] == events.CENSUS) == 30
+
+        replay = Replay(self.trace_path, self.river_map, self.fertility_map, self.const_config)
+        replayed_years = []
+        for year in replay.years():
+            replayed_years.append(year)
+            snapshot, fertility_map = recorded[year]
+            statistics = replay.statistics().sort_values('id')
+            for column in ('x_pos', 'y_pos', 'num_workers', 'grain', 'worker_capability',
+                           'competency', 'ambition', 'interaction'):
+                np.testing.assert_allclose(statistics[column].to_numpy(dtype=np.float64),
+                                           snapshot[column], rtol=1e-6)
+            np.testing.assert_allclose(replay.fertility_map(), fertility_map, rtol=1e-5, atol=1e-6)
+        assert replayed_years == list(range(30))
+
+    def test_trace_saves_run_config(self):
+        config = Config.load('../var_config.yml', '../const_config.yml', flood_frequency=7)
+        events.EventWriter(self.trace_path, self.environment.shape, config=config).close()
+        assert events.read_config(self.trace_path) == config
+
+        events.EventWriter(self.trace_path + '2', self.environment.shape).close()
+        assert events.read_config(self.trace_path + '2') is None
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import tempfile
+from unittest import TestCase, main
+
+from simulation.decomposition import DecomposedSimulation
+from simulation.golden import GoldenTrace, compare_seeds, PHASES
+from simulation.harvest import HarvestScheduler
+from simulation.kernels import ArrayEngine
+from simulation.simulation_driver import Simulation
+from simulation import golden
+
+
+class LateHarvestSimulation(Simulation):
+    """Simulation whose farm phase gives every household extra grain in year 2."""
+
+    def farm_phase(self):
+        super().farm_phase()
+        if self.generation == 2:
+            for house in self.households:
+                house.grain += 1
+
+
+class BarrenSimulation(Simulation):
+    """Simulation whose fields yield nothing."""
+
+    def farm_phase(self):
+        self.environment.fertility_map[:] = 0
+        super().farm_phase()
+
+
+def build(simulation_class=Simulation, **options):
+    def factory(seed):
+        reference = golden.reference_simulation(seed, 5)
+        return simulation_class(reference.households, reference.environment, 5, **options)
+    return factory
+
+
+class GoldenTraceTest(TestCase):
+
+    def setUp(self):
+        self.golden = GoldenTrace.from_factory(build(), 3, 5)
+
+    def test_records_every_phase(self):
+        assert [(record.year, record.phase) for record in self.golden.records] == [
+            (year, phase) for year in range(5) for phase in PHASES]
+        assert len({record.state_hash for record in self.golden.records}) > 1
+
+    def test_reference_is_reproducible(self):
+        assert self.golden.compare(GoldenTrace.from_factory(build(), 3, 5)) is None
+        other_seed = GoldenTrace.from_factory(build(), 4, 5)
+        assert self.golden.compare(other_seed) is not None
+
+    def test_reports_first_divergence(self):
+        divergence = self.golden.compare(GoldenTrace.from_factory(build(LateHarvestSimulation),
+                                                                  3, 5))
+        assert (divergence.year, divergence.phase, divergence.field) == (2, 'farm', 'grain')
+        assert divergence.actual > divergence.expected
+
+    def test_harvest_scheduler_is_exact(self):
+        with HarvestScheduler(max_workers=3, min_batch=1) as scheduler:
+            trace = GoldenTrace.from_factory(build(scheduler=scheduler), 3, 5)
+        assert self.golden.compare(trace) is None
+
+    def test_array_engine_within_tolerance(self):
+        trace = GoldenTrace.from_factory(build(engine=ArrayEngine()), 3, 5)
+        assert self.golden.compare(trace, rtol=1e-5) is None
+
+    def test_decomposed_simulation_statistically(self):
+        def decomposed(seed):
+            reference = golden.reference_simulation(seed, 5)
+            simulation = DecomposedSimulation(reference.households, reference.environment, 5,
+                                              num_strips=2)
+            self.addCleanup(simulation.close)
+            return simulation
+        assert compare_seeds(build(), decomposed, range(16), 3) is None
+        assert compare_seeds(build(), build(BarrenSimulation), range(4), 3) is not None
+
+    def test_check_engines(self):
+        assert golden.check(self.golden, 'scheduler') is None
+        assert golden.check(self.golden, 'array') is None
+        with self.assertRaises(ValueError):
+            golden.check(self.golden, 'reference')
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trace.json')
+            self.golden.save(path)
+            loaded = GoldenTrace.load(path)
+        assert loaded.seed == 3 and loaded.records == self.golden.records
+
+
+if __name__ == '__main__':
+    main()
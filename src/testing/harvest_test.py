@@ -0,0 +1,124 @@
+import copy
+import random
+from unittest import TestCase, main
+
+import numpy as np
+
+from simulation.config import Config
+from simulation.environment import Environment
+from simulation.harvest import HarvestScheduler, OwnershipHarvester, field_levels
+from simulation.simulation_driver import Simulation
+from simulation import simulation_driver
+
+
+class HarvestSchedulerTest(TestCase):
+
+    def setUp(self):
+        config = Config.load('../var_config.yml', '../const_config.yml', num_households=300)
+        river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+        random.seed(11)
+        self.environment = Environment(river_map, fertility_map, map_shape, config)
+        self.households = simulation_driver.setup_households(self.environment, config)
+
+    def test_levels_separate_overlapping_fields(self):
+        bounds = [(0, 0, 10, 10), (20, 20, 30, 30), (5, 5, 15, 15), (9, 9, 25, 25),
+                  (40, 40, 40, 50), (50, 0, 60, 10)]
+        levels = field_levels(bounds, (100, 100))
+        assert list(levels) == [0, 0, 1, 2, 0, 0]
+        raster = np.zeros((100, 100), dtype=np.int32)
+        assert np.array_equal(field_levels(bounds, (100, 100), raster), levels)
+        assert not raster.any()
+        for index_1, bounds_1 in enumerate(bounds):
+            for index_2 in range(index_1 + 1, len(bounds)):
+                bounds_2 = bounds[index_2]
+                overlap = (bounds_1[0] < bounds_2[2] and bounds_2[0] < bounds_1[2]
+                           and bounds_1[1] < bounds_2[3] and bounds_2[1] < bounds_1[3])
+                if overlap:
+                    assert levels[index_1] < levels[index_2]
+
+    def test_matches_sequential_farm_phase(self):
+        sequential = Simulation(*copy.deepcopy((self.households, self.environment)), 10)
+        scheduler = HarvestScheduler(max_workers=4, min_batch=1)
+        parallel = Simulation(*copy.deepcopy((self.households, self.environment)), 10,
+                              scheduler=scheduler)
+        with scheduler:
+            for year in range(10):
+                for simulation in (sequential, parallel):
+                    random.seed(year)
+                    simulation.farm_phase()
+                    simulation.interact()
+                    simulation.growth_phase()
+                    simulation.environment_phase()
+                assert scheduler.num_levels > 1
+                assert [house.id for house in sequential.households] == [
+                    house.id for house in parallel.households]
+                for column in ('num_workers', 'grain', 'worker_capability'):
+                    assert [getattr(house, column) for house in sequential.households] == [
+                        getattr(house, column) for house in parallel.households]
+                assert np.array_equal(sequential.environment.fertility_map,
+                                      parallel.environment.fertility_map)
+                assert np.array_equal(sequential.environment.dirty_tiles,
+                                      parallel.environment.dirty_tiles)
+
+
+class OwnershipHarvesterTest(TestCase):
+
+    def setUp(self):
+        config = Config.load('../var_config.yml', '../const_config.yml', num_households=300)
+        river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+        random.seed(11)
+        self.environment = Environment(river_map, fertility_map, map_shape, config)
+        self.households = simulation_driver.setup_households(self.environment, config)
+
+    def test_first_claimant_owns_shared_pixels(self):
+        environment = self.environment
+        assert environment.owner(10, 10) == -1
+        environment.assign_fields([0, 5, 40], [0, 5, 40], [10, 15, 40], [10, 15, 50])
+        assert environment.owner(7, 7) == 0
+        assert environment.owner(12, 12) == 1
+        assert environment.owner(40, 45) == -1
+        assert list(environment.owners([0, 9, 10, 14, 15], [0, 9, 10, 14, 15])) == [
+            0, 0, 1, 1, -1]
+        assert np.array_equal(np.bincount(environment.ownership[environment.ownership >= 0]),
+                              [100, 100 - 25])
+        environment.assign_fields([10], [10], [20], [20])
+        assert environment.owner(7, 7) == -1 and environment.owner(12, 12) == 0
+        assert np.count_nonzero(environment.ownership >= 0) == 100
+
+    def test_matches_farm_on_disjoint_fields(self):
+        households = self.households[:20]
+        # A row of disjoint 8x8 fields along the top of the map.
+        claimed_fields = [((8 + 10 * index, 12), 80) for index in range(len(households))]
+        farmers, environment = copy.deepcopy((households, self.environment))
+        expected = [house.farm(claimed_field, environment)
+                    for house, claimed_field in zip(farmers, claimed_fields)]
+        harvests = OwnershipHarvester().harvest(households, claimed_fields, self.environment)
+        assert np.allclose(harvests, expected)
+        assert np.allclose([house.grain for house in households],
+                           [house.grain for house in farmers])
+        assert np.allclose(self.environment.fertility_map, environment.fertility_map)
+        assert np.array_equal(self.environment.dirty_tiles, environment.dirty_tiles)
+
+    def test_later_claimant_loses_shared_pixels(self):
+        households = self.households[:2]
+        for house in households:
+            house.grain, house.num_workers, house.worker_capability = 0, 1000, 1000
+        claimed_fields = [((30, 30), 400), ((40, 30), 400)]
+        harvests = OwnershipHarvester().harvest(households, claimed_fields, self.environment)
+        assert np.isclose(harvests[0], 2 * harvests[1], rtol=0.2)
+        assert self.environment.owner(35, 30) == 0
+        assert self.environment.owner(45, 30) == 1
+
+    def test_simulation_runs_with_ownership(self):
+        simulation = Simulation(self.households, self.environment, 5,
+                                scheduler=OwnershipHarvester())
+        simulation.run()
+        assert simulation.generation == 5
+        assert simulation.households
+        assert simulation.environment.ownership.min() == -1
+
+
+if __name__ == '__main__':
+    main()
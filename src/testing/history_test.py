@@ -0,0 +1,57 @@
+import tempfile
+from unittest import TestCase, main
+
+import numpy as np
+
+from simulation.environment import Environment
+from simulation.history import HistoryReader, HistoryWriter
+from simulation.simulation_driver import Simulation
+from simulation import simulation_driver
+
+
+class HistoryTest(TestCase):
+
+    def setUp(self):
+        var_config = simulation_driver.load_config('../var_config.yml')
+        const_config = simulation_driver.load_config('../const_config.yml')
+        river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+
+        self.environment = Environment(river_map, fertility_map, map_shape, const_config)
+        self.households = simulation_driver.setup_households(self.environment, var_config, const_config)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_history_round_trip(self):
+        class Presenter:
+            def update(self):
+                pass
+
+        recorded = {}
+        class Recorder:
+            def observe(self, simulation):
+                if simulation.households:
+                    recorded[simulation.generation] = simulation.snapshot()
+
+        writer = HistoryWriter(self.directory.name, chunk_rows=40)
+        simulation = Simulation(self.households, self.environment, 20,
+                                observers=[writer, Recorder()])
+        for _ in range(20):
+            simulation.run_year_simulation(Presenter())
+        writer.close()
+
+        reader = HistoryReader(self.directory.name)
+        assert len(reader.chunks) > 1
+        for generation, snapshot in recorded.items():
+            stored = reader.generation(generation)
+            for column in HistoryWriter.COLUMNS:
+                assert np.array_equal(stored[column], snapshot[column])
+
+        grain = reader.column('grain', 5, 10)
+        expected = np.concatenate([recorded[g]['grain'] for g in range(5, 10) if g in recorded])
+        assert np.array_equal(grain, expected)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import copy
+import random
+from unittest import TestCase, main
+
+import numpy as np
+
+from simulation.environment import Environment
+from simulation.kernels import ArrayEngine, default_engine
+from simulation.simulation_driver import Simulation
+from simulation import simulation_driver
+
+
+class KernelEquivalenceTest(TestCase):
+
+    def setUp(self):
+        var_config = simulation_driver.load_config('../var_config.yml')
+        const_config = simulation_driver.load_config('../const_config.yml')
+        river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+
+        random.seed(7)
+        self.environment = Environment(river_map, fertility_map, map_shape, const_config)
+        self.households = simulation_driver.setup_households(self.environment, var_config, const_config)
+
+    def assert_equivalent(self, households_1, households_2):
+        assert [house.id for house in households_1] == [house.id for house in households_2]
+        for column in ('num_workers', 'grain', 'worker_capability'):
+            values_1 = [getattr(house, column) for house in households_1]
+            values_2 = [getattr(house, column) for house in households_2]
+            np.testing.assert_allclose(values_1, values_2, rtol=1e-5)
+
+    def test_farm_and_interaction_kernels(self):
+        reference = copy.deepcopy((self.households, self.environment))
+        kernel = copy.deepcopy((self.households, self.environment))
+        engine = ArrayEngine()
+
+        for year in range(30):
+            random.seed(year)
+            households, environment = reference
+            households.sort(key=lambda x: x.grain, reverse=True)
+            for house in households:
+                house.interaction = 0
+                house.farm(house.claim_field(environment), environment)
+                house.consume_grain()
+            simulation = Simulation(households, environment, 30)
+            simulation.interact()
+            reference = (simulation.households, environment)
+
+            random.seed(year)
+            households, environment = kernel
+            households.sort(key=lambda x: x.grain, reverse=True)
+            households = engine.farm_phase(households, environment)
+            households = engine.interact(households)
+            kernel = (households, environment)
+
+            self.assert_equivalent(reference[0], kernel[0])
+            np.testing.assert_allclose(reference[1].fertility_map, kernel[1].fertility_map,
+                                       rtol=1e-5, atol=1e-6)
+            assert np.array_equal(reference[1].dirty_tiles, kernel[1].dirty_tiles)
+
+    def test_engine_is_opt_in(self):
+        assert default_engine({}) is None
+        assert default_engine({'array_engine': 0}) is None
+        assert isinstance(default_engine({'array_engine': 1}), ArrayEngine)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+from unittest import TestCase, main
+
+from simulation.environment import Environment
+from simulation.lifecycle import HouseholdLifecycle
+from simulation.simulation_driver import Simulation
+from simulation import simulation_driver
+
+
+class HouseholdLifecycleTest(TestCase):
+
+    def test_kill_insert_compact(self):
+        lifecycle = HouseholdLifecycle(['a', 'b', 'c', 'd'])
+        assert lifecycle.kill(1) == 'b'
+        lifecycle.kill(2)
+        assert lifecycle.insert('e') == 2
+        assert [house for _, house in lifecycle.alive()] == ['a', 'e', 'd']
+        households = lifecycle.households
+        assert lifecycle.compact() is households
+        assert households == ['a', 'e', 'd']
+        assert lifecycle.insert('f') == 3
+
+    def test_deaths_do_not_skip_households(self):
+        var_config = simulation_driver.load_config('../var_config.yml')
+        const_config = simulation_driver.load_config('../const_config.yml')
+        river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+        environment = Environment(river_map, fertility_map, map_shape, const_config)
+        households = simulation_driver.setup_households(environment, var_config, const_config)
+
+        starving = households[::2]
+        for house in starving:
+            house.num_workers = 1
+            house.grain = 0
+            house.competency = 0
+            house.ambition = 0
+            house.worker_capability = 0
+        for house in households[1::2]:
+            house.grain = 1000000
+        for house in households:
+            house.interaction = 5
+
+        class Presenter:
+            def update(self):
+                pass
+
+        simulation = Simulation(list(households), environment, 1)
+        simulation.run_year_simulation(Presenter())
+        assert all(house not in simulation.households for house in starving)
+        assert all(house.interaction != 5 for house in simulation.households)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+from unittest import TestCase, main
+import tempfile
+import tracemalloc
+
+from gui.render_policy import EveryNthYear, NeverRender, RenderPolicy
+from simulation.config import Config
+from simulation.environment import Environment
+from simulation.history import HistoryWriter
+from simulation.memory import HISTORY_ROW_BYTES, MemoryBudget
+from simulation.metrics import MetricsEngine
+from simulation.simulation_driver import Simulation
+from simulation import simulation_driver
+
+
+class FrameView:
+    def __init__(self):
+        self.render_policy = RenderPolicy()
+        self.pop_df = None
+        self.gini_df = None
+        self.frames = []
+
+
+class Presenter:
+    def __init__(self):
+        self.frame_view = FrameView()
+
+    def set_render_policy(self, render_policy):
+        self.frame_view.render_policy = render_policy
+
+
+class MemoryTest(TestCase):
+
+    def setUp(self):
+        config = Config.load('../var_config.yml', '../const_config.yml')
+        river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+        self.environment = Environment(river_map, fertility_map, map_shape, config)
+        self.households = simulation_driver.setup_households(self.environment, config)
+        self.directory = tempfile.TemporaryDirectory()
+        self.history = HistoryWriter(self.directory.name, chunk_rows=100000)
+        self.simulation = Simulation(self.households, self.environment, 20,
+                                     observers=[self.history, MetricsEngine()])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_memory_report(self):
+        tracemalloc.start()
+        try:
+            self.simulation.run(5)
+            report = self.simulation.memory_report()
+        finally:
+            tracemalloc.stop()
+        fertility_map = self.environment.fertility_map
+        assert report.subsystems['environment.fertility_map'] == fertility_map.nbytes
+        assert report.subsystems['households'] > 0
+        assert report.subsystems['observer.HistoryWriter'] > 0
+        assert report.subsystems['observer.MetricsEngine'] > 0
+        assert report.total == sum(report.subsystems.values())
+        assert report.traced_current is not None and report.traced_peak >= report.traced_current
+        assert 'total' in str(report) and report.as_dict()['total'] == report.total
+
+    def test_budget_downgrades(self):
+        presenter = Presenter()
+        budget = MemoryBudget(2**40)
+        budget.apply(self.simulation, presenter)
+        assert budget.downgrades == []
+
+        # Shrinking the history buffer is enough for a small excess.
+        projection = budget.projection(self.simulation, presenter)
+        budget = MemoryBudget(sum(projection.values()) - 10**6)
+        budget.apply(self.simulation, presenter)
+        assert 1000 < self.history.chunk_rows < 100000
+        assert type(presenter.frame_view.render_policy) is RenderPolicy
+        self.history.chunk_rows = 100000
+
+        # Frames are rendered less often before rendering is switched off.
+        spare = 2 * HISTORY_ROW_BYTES * (100000 - 1000)
+        every_4th = budget.projection(self.simulation, presenter, EveryNthYear(4))
+        budget = MemoryBudget(sum(every_4th.values()) - spare)
+        budget.apply(self.simulation, presenter)
+        assert isinstance(presenter.frame_view.render_policy, EveryNthYear)
+        assert presenter.frame_view.render_policy.n == 4
+        assert budget.downgrades == ['rendering every 4 years',
+                                     'history chunk_rows reduced to 1000']
+        presenter.set_render_policy(RenderPolicy())
+        self.history.chunk_rows = 100000
+
+        without_render = sum(projection.values()) - projection['render']
+        budget = MemoryBudget(without_render)
+        projection = budget.apply(self.simulation, presenter)
+        assert self.history.chunk_rows == 100000
+        assert isinstance(presenter.frame_view.render_policy, NeverRender)
+        assert budget.downgrades == ['rendering disabled']
+        assert 'render' not in projection
+        assert sum(projection.values()) <= without_render
+
+    def test_budget_refuses(self):
+        with self.assertRaises(MemoryError):
+            MemoryBudget(1024).apply(self.simulation)
+        assert self.history.chunk_rows == 100000
+
+
+if __name__ == '__main__':
+    main()
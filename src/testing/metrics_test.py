@@ -0,0 +1,75 @@
+from unittest import TestCase, main
+
+import numpy as np
+
+from simulation.environment import Environment, band_regions
+from simulation.metrics import MetricsEngine, RegionStatistics, gini
+from simulation.simulation_driver import Simulation
+from simulation import simulation_driver
+
+
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        var_config = simulation_driver.load_config('../var_config.yml')
+        const_config = simulation_driver.load_config('../const_config.yml')
+        river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+
+        self.environment = Environment(river_map, fertility_map, map_shape, const_config)
+        self.households = simulation_driver.setup_households(self.environment, var_config, const_config)
+
+    def test_gini(self):
+        assert gini(np.full(10, 5.0)) == 0.0
+        assert np.isclose(gini(np.array([0, 0, 0, 10.0])), 0.75)
+        assert gini(np.zeros(4)) == 1.0
+        assert gini(np.zeros(0)) == 1.0
+
+    def test_metrics_engine(self):
+        class Presenter:
+            def update(self):
+                pass
+
+        engine = MetricsEngine(cadence={'density': 5})
+        simulation = Simulation(self.households, self.environment, 20, observers=[engine])
+        for _ in range(20):
+            simulation.run_year_simulation(Presenter())
+
+        generations, population = engine.series('population')
+        assert len(generations) == 20
+        assert np.all(population >= 0)
+        _, gini_values = engine.series('gini')
+        assert np.all((gini_values >= 0) & (gini_values <= 1))
+        density_generations, _ = engine.series('density')
+        assert list(density_generations) == [0, 5, 10, 15]
+        households = dict(engine.records['num_households'])
+        for generation, density in engine.records['density']:
+            assert density.sum() == households[generation]
+
+    def test_region_statistics(self):
+        region_map = band_regions(self.environment.shape, 4)
+        region_map[:10] = -1
+        self.environment.load_regions(region_map)
+        assert self.environment.num_regions == 4
+        recorder = RegionStatistics(cadence=2)
+        simulation = Simulation(self.households, self.environment, 6, observers=[recorder])
+        simulation.run()
+
+        generations, population = recorder.series('population')
+        assert list(generations) == [0, 2, 4]
+        assert population.shape == (3, 4)
+        snapshot = simulation.snapshot()
+        statistics = recorder.compute(snapshot, self.environment)
+        labels = region_map[snapshot['y_pos'], snapshot['x_pos']]
+        for region in range(4):
+            inside = labels == region
+            assert statistics['num_households'][region] == inside.sum()
+            assert np.isclose(statistics['grain'][region], snapshot['grain'][inside].sum())
+            fertility = self.environment.fertility_map[region_map == region].sum()
+            assert np.isclose(statistics['fertility'][region], fertility, rtol=1e-5)
+        assert np.all((statistics['remaining_fertility'] >= 0)
+                      & (statistics['remaining_fertility'] <= 1 + 1e-6))
+
+
+if __name__ == "__main__":
+    main()
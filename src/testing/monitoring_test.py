@@ -0,0 +1,53 @@
+from unittest import TestCase, main
+import json
+import urllib.request
+
+from simulation.config import Config
+from simulation.environment import Environment
+from simulation.monitoring import MetricsEndpoint
+from simulation.simulation_driver import Simulation
+from simulation import simulation_driver
+
+
+class MetricsEndpointTest(TestCase):
+
+    def setUp(self):
+        config = Config.load('../var_config.yml', '../const_config.yml')
+        river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+        environment = Environment(river_map, fertility_map, map_shape, config)
+        households = simulation_driver.setup_households(environment, config)
+        self.simulation = Simulation(households, environment, 10)
+
+    def fetch(self, port, path):
+        with urllib.request.urlopen('http://127.0.0.1:{0}{1}'.format(port, path)) as response:
+            return response.headers['Content-Type'], response.read().decode()
+
+    def test_endpoint(self):
+        with MetricsEndpoint() as endpoint:
+            content_type, body = self.fetch(endpoint.port, '/metrics.json')
+            assert json.loads(body) == {}
+            self.simulation.run(5, observers=[endpoint])
+
+            content_type, body = self.fetch(endpoint.port, '/metrics.json')
+            assert content_type == 'application/json'
+            metrics = json.loads(body)
+            assert metrics['generation'] == 4
+            assert metrics['num_households'] == len(self.simulation.households)
+            assert metrics['years_per_second'] > 0
+            assert set(metrics['phase_seconds']) == {'farm', 'interact', 'observe', 'growth',
+                                                     'environment'}
+            assert metrics['memory_accounted_bytes'] > 0
+
+            content_type, body = self.fetch(endpoint.port, '/metrics')
+            assert content_type.startswith('text/plain')
+            lines = body.splitlines()
+            assert 'egypt_generation 4.0' in lines
+            assert any(line.startswith('egypt_phase_seconds{phase="farm"} ') for line in lines)
+            assert '# TYPE egypt_population gauge' in lines
+            with self.assertRaises(urllib.error.HTTPError):
+                self.fetch(endpoint.port, '/missing')
+
+
+if __name__ == '__main__':
+    main()
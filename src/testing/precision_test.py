@@ -0,0 +1,59 @@
+import random
+from unittest import TestCase, main
+
+import numpy as np
+
+from simulation.kernels import ArrayEngine, HouseholdArrays
+from simulation.precision import DOUBLE, SINGLE, accuracy_report
+from simulation.simulation_driver import Simulation
+from simulation import golden
+
+
+def build(seed, policy):
+    reference = golden.reference_simulation(seed, 10)
+    policy.apply(reference.environment)
+    return Simulation(reference.households, reference.environment, 10,
+                      engine=ArrayEngine(policy))
+
+
+class PrecisionPolicyTest(TestCase):
+
+    def setUp(self):
+        random.seed(2)
+        self.simulation = golden.reference_simulation(2, 10)
+
+    def test_apply_converts_maps(self):
+        environment = self.simulation.environment
+        single_bytes = SINGLE.apply(environment).fertility_map.nbytes
+        assert environment.fertility_map.dtype == environment.flood_map.dtype == np.float32
+        DOUBLE.apply(environment)
+        assert environment.fertility_map.dtype == environment.river_map.dtype == np.float64
+        assert environment.fertility_map.nbytes == 2 * single_bytes
+
+    def test_single_precision_columns(self):
+        arrays = HouseholdArrays(self.simulation.households, SINGLE)
+        assert arrays.num_workers.dtype == np.int64
+        assert arrays.grain.dtype == arrays.competency.dtype == np.float32
+        assert HouseholdArrays(self.simulation.households).grain.dtype == np.float64
+
+    def test_integer_worker_counts(self):
+        simulation = build(2, SINGLE)
+        for _ in range(10):
+            simulation.step()
+            assert all(type(house.num_workers) is int for house in simulation.households)
+
+    def test_accuracy_report(self):
+        report = accuracy_report(build, SINGLE, DOUBLE, seeds=range(2), n_years=3)
+        assert report.expected.shape == report.actual.shape == (2, 3, len(golden.AGGREGATES))
+        assert report.map_bytes['double'] == 2 * report.map_bytes['single']
+        errors = report.relative_errors()
+        # The first harvest only differs by rounding.
+        assert errors[:, 0, golden.AGGREGATES.index('fertility')].max() < 1e-4
+        assert report.as_dict()['policy'] == 'single'
+        assert 'num_households' in str(report)
+        exact = accuracy_report(build, DOUBLE, DOUBLE, seeds=range(2), n_years=2)
+        assert not exact.relative_errors().any()
+
+
+if __name__ == '__main__':
+    main()
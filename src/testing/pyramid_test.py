@@ -0,0 +1,86 @@
+import random
+from unittest import TestCase, main
+
+import numpy as np
+
+from gui.pyramid import FertilityPyramid, Viewport, build_levels
+from gui.rasterizer import Rasterizer
+from simulation.config import Config
+from simulation.environment import Environment
+from simulation.simulation_driver import Simulation
+from simulation.synthetic import synthetic_maps
+from simulation import simulation_driver
+
+
+class FertilityPyramidTest(TestCase):
+
+    def setUp(self):
+        config = Config.load('../var_config.yml', '../const_config.yml', num_households=40,
+                             flood_frequency=3)
+        random.seed(5)
+        self.environment = Environment(*synthetic_maps((1500, 700), seed=5), config)
+        households = simulation_driver.setup_households(self.environment, config)
+        self.simulation = Simulation(households, self.environment, 10)
+        self.pyramid = FertilityPyramid(self.environment, tile_size=128)
+
+    def assert_matches_rebuild(self):
+        rebuilt = build_levels(self.environment.fertility_map, self.pyramid.tile_size)
+        assert len(rebuilt) == self.pyramid.num_levels - 1
+        for level, expected in zip(self.pyramid.levels[1:], rebuilt):
+            assert np.array_equal(level, expected)
+
+    def test_levels(self):
+        shapes = [level.shape for level in self.pyramid.levels]
+        assert shapes == [(1500, 700), (750, 350), (375, 175), (188, 88), (94, 44)]
+        assert np.isclose(self.pyramid.levels[1][0, 0],
+                          self.environment.fertility_map[:2, :2].mean())
+
+    def test_incremental_refresh_matches_rebuild(self):
+        num_tiles = self.environment.dirty_tiles.size
+        for year in range(6):
+            self.simulation.farm_phase()
+            assert 0 < self.pyramid.refresh(self.environment) < num_tiles
+            self.assert_matches_rebuild()
+            self.simulation.interact()
+            self.simulation.growth_phase()
+            self.simulation.environment_phase()
+            self.simulation.generation += 1
+            # Years 0 and 3 end with a flood, which restores the harvested tiles.
+            changed = self.pyramid.refresh(self.environment)
+            assert changed > 0 if year in (0, 3) else changed == 0
+            self.assert_matches_rebuild()
+
+    def test_view_fetches_visible_tiles(self):
+        image = self.pyramid.view(0, 0, 700, 1500, 140, 300)
+        assert image.shape == (300, 140, 3) and image.dtype == np.uint8
+        # The whole map at a fifth of its size comes from the six tiles of the
+        # 375x175 fertility and river levels.
+        assert self.pyramid.tiles_fetched == 12
+        self.pyramid.view(150, 300, 214, 364, 64, 64)
+        assert self.pyramid.tiles_fetched == 2
+
+    def test_full_resolution_view_matches_frames(self):
+        image = self.pyramid.view(300, 500, 420, 560, 120, 60)
+        background = Rasterizer(self.environment.river_map).background(
+            self.environment.fertility_map)
+        assert np.array_equal(image, background[500:560, 300:420])
+
+
+class ViewportTest(TestCase):
+
+    def test_zoom_and_pan(self):
+        viewport = Viewport((1500, 700), 280, 600)
+        assert viewport.bounds() == (0, 0, 700, 1500)
+        viewport.zoom(5, 0, 0)
+        # The top left corner stays under the pointer.
+        assert viewport.bounds() == (0, 0, 140, 300)
+        viewport.pan(-140, -300)
+        assert viewport.bounds() == (70, 150, 210, 450)
+        viewport.pan(-10**6, -10**6)
+        assert viewport.bounds() == (560, 1200, 700, 1500)
+        viewport.zoom(0.01)
+        assert viewport.bounds() == (0, 0, 700, 1500)
+
+
+if __name__ == '__main__':
+    main()
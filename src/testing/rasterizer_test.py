@@ -0,0 +1,92 @@
+from unittest import TestCase, main
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from gui.frame_view import FrameView
+from gui.rasterizer import Rasterizer
+from simulation.config import Config
+from simulation.environment import Environment
+from simulation.simulation_driver import Simulation
+from simulation import simulation_driver
+
+
+class RasterizerTest(TestCase):
+
+    def setUp(self):
+        self.config = Config.load('../var_config.yml', '../const_config.yml')
+        self.river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        self.fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_background_matches_frame_view(self):
+        rows, cols = slice(280, 330), slice(150, 260)
+        river_map = self.river_map[rows, cols]
+        fertility_map = self.fertility_map[rows, cols]
+        frame_view = FrameView(None)
+        display = frame_view.fertility_img(fertility_map) + frame_view.river_img(river_map)
+        display[(display == 0).all(axis=2)] = 255
+        background = Rasterizer(river_map, self.directory.name).background(fertility_map)
+        assert np.array_equal(background, np.minimum(display, 255))
+
+    def test_household_discs(self):
+        rasterizer = Rasterizer(self.river_map, self.directory.name)
+        columns = {'x_pos': np.array([50, 300]), 'y_pos': np.array([40, 500]),
+                   'knowledge_radius': np.array([6.0, 3.0]), 'num_workers': np.array([5, 5]),
+                   'grain': np.array([100.0, 500.0]), 'competency': np.array([0.5, 0.2]),
+                   'ambition': np.array([0.5, 0.8]), 'interaction': np.array([-1, 0])}
+        background = rasterizer.background(self.fertility_map)
+        image = rasterizer.render(columns, self.fertility_map)
+        assert image.shape == background.shape and image.dtype == np.uint8
+        colours, alpha = rasterizer.household_colours(columns)
+        assert np.allclose(alpha, [0.2, 1.0])
+        # The second household is opaque: its centre has the fill colour and
+        # its edge (no interaction) the same colour.
+        assert np.array_equal(image[500, 300], np.rint(colours[1] * 255))
+        assert np.array_equal(image[500, 303], np.rint(colours[1] * 255))
+        # The first household blends a red edge over the background.
+        edge = image[40, 56].astype(float)
+        expected = background[40, 56] * 0.8 + np.array([255, 0, 0]) * 0.2
+        assert np.allclose(edge, expected, atol=1)
+        assert np.array_equal(image[40, 70], background[40, 70])
+
+    def test_households_without_workers(self):
+        rasterizer = Rasterizer(self.river_map, self.directory.name)
+        columns = {'x_pos': np.array([50, 300, 200]), 'y_pos': np.array([40, 500, 100]),
+                   'knowledge_radius': np.array([6.0, 3.0, 2.0]),
+                   'num_workers': np.array([5, 5, 0]), 'grain': np.array([100.0, 500.0, 50.0]),
+                   'competency': np.array([0.5, 0.2, 0.3]), 'ambition': np.array([0.5, 0.8, 0.3]),
+                   'interaction': np.array([-1, 0, 1])}
+        colours, alpha = rasterizer.household_colours(columns)
+        assert np.allclose(alpha, [0.36, 1.0, 0.2])
+        assert np.isfinite(rasterizer.render(columns, self.fertility_map)).all()
+
+    def test_does_not_import_pyplot(self):
+        code = 'import sys, gui.rasterizer; sys.exit("matplotlib.pyplot" in sys.modules)'
+        assert subprocess.run([sys.executable, '-c', code], cwd='..',
+                              env=dict(os.environ, PYTHONPATH='.')).returncode == 0
+
+    def test_observer_writes_frames(self):
+        environment = Environment(self.river_map, self.fertility_map, self.river_map.shape,
+                                  self.config)
+        households = simulation_driver.setup_households(environment, self.config)
+        png = Rasterizer(self.river_map, self.directory.name, cadence=2)
+        raw = Rasterizer(self.river_map, os.path.join(self.directory.name, 'raw'), 'raw')
+        simulation = Simulation(households, environment, 4, observers=[png, raw])
+        simulation.run()
+        assert png.frames == [0, 2] and raw.frames == [0, 1, 2, 3]
+        image = np.asarray(Image.open(os.path.join(self.directory.name, 'yr_2.png')))
+        assert image.shape == self.river_map.shape + (3,)
+        size = os.path.getsize(os.path.join(self.directory.name, 'raw', 'yr_3.rgb'))
+        assert size == self.river_map.size * 3
+
+
+if __name__ == '__main__':
+    main()
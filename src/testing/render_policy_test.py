@@ -0,0 +1,37 @@
+from unittest import TestCase, main
+
+import pandas as pd
+
+from gui.render_policy import (AnyOf, EveryNthYear, FinalYear, GiniThreshold,
+                               PopulationCrash)
+
+
+class FrameView:
+    def __init__(self, population, gini):
+        self.pop_df = pd.DataFrame({'generation': range(len(population)),
+                                    'population': population})
+        self.gini_df = pd.DataFrame({'generation': range(len(gini)),
+                                     'gini-coefficient': gini})
+
+
+class RenderPolicyTest(TestCase):
+
+    def test_cadence_policies(self):
+        frame_view = FrameView([], [])
+        every_tenth = [gen for gen in range(100)
+                       if EveryNthYear(10).should_render(gen, 100, frame_view)]
+        assert every_tenth == list(range(0, 100, 10)) + [99]
+        final = [gen for gen in range(100) if FinalYear().should_render(gen, 100, frame_view)]
+        assert final == [99]
+
+    def test_trigger_policies(self):
+        crash = PopulationCrash(0.5)
+        assert not crash.should_render(1, 100, FrameView([100, 60], [0.1, 0.1]))
+        assert crash.should_render(1, 100, FrameView([100, 40], [0.1, 0.1]))
+        threshold = GiniThreshold(0.5)
+        assert threshold.should_render(1, 100, FrameView([1, 1], [0.4, 0.6]))
+        assert not threshold.should_render(2, 100, FrameView([1, 1, 1], [0.4, 0.6, 0.7]))
+        assert AnyOf(FinalYear(), crash).should_render(99, 100, FrameView([1, 1], [0, 0]))
+
+if __name__ == "__main__":
+    main()
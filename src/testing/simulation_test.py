@@ -1,15 +1,18 @@
+import random
 from unittest import TestCase, main
 
 import numpy as np
 
-from simulation.environment import Environment
+from simulation.environment import Environment, cached_distance_to_river, distance_to_river
 from simulation.household import Household
 from simulation.simulation_driver import Simulation
+from simulation import memory
 from simulation import simulation_driver
 
 class SimulationClassTest(TestCase):
 
     def setUp(self):
+        random.seed(3)
         var_config = simulation_driver.load_config('../var_config.yml')
         const_config = simulation_driver.load_config('../const_config.yml')
         river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
@@ -83,6 +86,71 @@ class SimulationClassTest(TestCase):
             self.environment.flood(generation)
             assert np.array_equal(self.environment.fertility_map, original_fertility_map)
 
+    def test_environment_river_distance(self):
+        river_map = self.environment.river_map
+        distance = self.environment.river_distance
+        assert distance.shape == self.environment.shape
+        assert np.all(distance[river_map > 0] == 0)
+        river_rows, river_cols = np.nonzero(river_map > 0)
+        rng = np.random.default_rng(0)
+        x_pos = rng.integers(0, self.environment.shape[1], 50)
+        y_pos = rng.integers(0, self.environment.shape[0], 50)
+        expected = [np.sqrt(((river_cols - x)**2 + (river_rows - y)**2).min())
+                    for x, y in zip(x_pos, y_pos)]
+        assert np.allclose(self.environment.river_distances(x_pos, y_pos), expected)
+        assert np.isclose(self.environment.distance_to_river(x_pos[0], y_pos[0]), expected[0])
+        assert np.allclose(distance_to_river(np.copy(river_map)), distance)
+
+    def test_distance_to_river_in_row_blocks(self):
+        rng = np.random.default_rng(1)
+        river_map = (rng.random((37, 53)) < 0.02).astype(np.float32)
+        river_rows, river_cols = np.nonzero(river_map)
+        rows, cols = np.indices(river_map.shape)
+        expected = np.sqrt(((rows[..., None] - river_rows)**2
+                            + (cols[..., None] - river_cols)**2).min(axis=-1))
+        assert np.allclose(distance_to_river(river_map, chunk_size=100), expected)
+        assert np.all(np.isinf(distance_to_river(np.zeros((3, 4)))))
+
+    def test_river_distance_cache_is_bounded(self):
+        def river_map(col):
+            river_map = np.zeros((8, 8))
+            river_map[:, col] = 1
+            return river_map
+
+        distance = cached_distance_to_river(river_map(3))
+        assert cached_distance_to_river(river_map(3) * 2) is distance
+        assert np.array_equal(distance, distance_to_river(river_map(3)))
+        for col in range(4, 8):
+            cached_distance_to_river(river_map(col))
+        assert cached_distance_to_river(river_map(3)) is not distance
+
+    def test_river_distance_is_computed_on_first_access(self):
+        environment = Environment(self.environment.river_map, self.environment.fertility_map,
+                                  self.environment.shape, {'flood_frequency': 0})
+        assert memory.environment_bytes(environment)['river_distance'] == 0
+        assert environment.distance_to_river(0, 0) >= 0
+        assert memory.environment_bytes(environment)['river_distance'] > 0
+
+    def test_environment_regenerate(self):
+        const_config = simulation_driver.load_config('../const_config.yml')
+        const_config.update({'regeneration_rate': 0.5, 'silt_rate': 0.1, 'silt_spread': 10})
+        environment = Environment(self.environment.river_map, np.copy(self.environment.flood_map),
+                                  self.environment.shape, const_config)
+        pristine = np.copy(environment.fertility_map)
+        environment.fertility_map[100:140, 100:140] *= 0.2
+        environment.mark_dirty(100, 100, 140, 140)
+        assert environment.dirty_tiles.sum() == 4
+        deficit = (pristine - environment.fertility_map).sum()
+        for _ in range(200):
+            environment.regenerate()
+            remaining = (pristine - environment.fertility_map).sum()
+            assert 0 <= remaining <= deficit
+            deficit = remaining
+        assert np.all(environment.fertility_map <= pristine)
+        assert np.allclose(environment.fertility_map, pristine, atol=1e-5)
+        assert not environment.dirty_tiles.any()
+        assert not environment.regenerate()
+
 
 class SimulationIntegrationTest(TestCase):
 
@@ -112,5 +180,26 @@ class SimulationIntegrationTest(TestCase):
         for _ in range(1000):
             self.simulation.run_year_simulation(presenter)
 
+    def test_run(self):
+        class Observer:
+            cadence = 10
+            def __init__(self):
+                self.generations = []
+            def observe(self, simulation):
+                self.generations.append(simulation.generation)
+
+        observer = Observer()
+        years = self.simulation.run(25, observers=[observer])
+        assert years == 25 and self.simulation.generation == 25
+        assert observer.generations == [0, 10, 20]
+        self.simulation.run(observers=[observer])
+        assert self.simulation.generation == self.simulation.num_generations or \
+            not self.simulation.households
+        assert self.simulation.run() == 0
+
+        self.simulation.households = []
+        self.simulation.generation = 0
+        assert self.simulation.run() == 0
+
 if __name__ == "__main__":
     main()
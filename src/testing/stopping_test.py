@@ -0,0 +1,58 @@
+import random
+from unittest import TestCase, main
+
+from simulation.environment import Environment
+from simulation.simulation_driver import Simulation
+from simulation.stopping import Dominance, Extinction, SteadyState, StoppingCriterion
+from simulation import simulation_driver
+
+
+class StoppingCriteriaTest(TestCase):
+
+    def setUp(self):
+        var_config = simulation_driver.load_config('../var_config.yml')
+        const_config = simulation_driver.load_config('../const_config.yml')
+        river_map, map_shape = simulation_driver.setup_map('../../resources/maps/river_map.png')
+        fertility_map, map_shape = simulation_driver.setup_map('../../resources/maps/fertility_map.png')
+
+        random.seed(3)
+        self.environment = Environment(river_map, fertility_map, map_shape, const_config)
+        self.households = simulation_driver.setup_households(self.environment, var_config, const_config)
+
+    def test_generation_limit(self):
+        simulation = Simulation(self.households, self.environment, 10, stopping=[Extinction()])
+        assert simulation.run() == 10
+        assert simulation.generation == 10
+        assert simulation.households
+        assert simulation.summary()['stop_reason'] == 'generation_limit'
+
+    def test_criterion_must_override_should_stop(self):
+        with self.assertRaises(TypeError):
+            StoppingCriterion()
+
+    def test_extinction(self):
+        for house in self.households:
+            house.num_workers = 1
+            house.grain = 0
+            house.competency = 0
+            house.ambition = 0
+            house.worker_capability = 0
+        simulation = Simulation(self.households, self.environment, 100)
+        assert simulation.run() == 1
+        assert simulation.summary()['stop_reason'] == 'extinction'
+
+    def test_steady_state_and_dominance(self):
+        simulation = Simulation(self.households, self.environment, 1000,
+                                stopping=[SteadyState(window=5, population_tolerance=1,
+                                                      gini_tolerance=1)])
+        assert simulation.run() == 5
+        assert simulation.stop_reason == 'steady_state'
+
+        simulation = Simulation(self.households, self.environment, 1000)
+        assert not Dominance(0.9).should_stop(simulation)
+        self.households[0].num_workers = 10**6
+        assert Dominance(0.9).should_stop(simulation)
+        assert not Dominance(0.9, attribute='grain').should_stop(simulation)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import json
+import multiprocessing
+import os
+import time
+from unittest import TestCase, main
+
+from simulation import kernels
+from simulation.config import Config
+from simulation.sweep import Coordinator, SweepWorker, run_job, sweep_jobs
+
+
+def echo(job):
+    return {'job_id': job['job_id'], 'seed': job['seed'],
+            'num_generations': job['config']['num_generations']}
+
+
+def crash_first_attempt(job):
+    if job['attempt'] == 0:
+        os._exit(1)
+    return echo(job)
+
+
+def crash(job):
+    os._exit(1)
+
+
+def stall_first_attempt(job):
+    if job['attempt'] == 0:
+        time.sleep(30)
+    return echo(job)
+
+
+def fail_odd_seeds(job):
+    if job['seed'] % 2:
+        raise ValueError('odd seed')
+    return echo(job)
+
+
+def serve(coordinator, run, heartbeat_interval):
+    # Forked workers must not keep the coordinator's listening socket open.
+    coordinator.close()
+    SweepWorker('127.0.0.1', coordinator.port, run=run,
+                heartbeat_interval=heartbeat_interval).serve()
+
+
+class SweepTest(TestCase):
+
+    def setUp(self):
+        self.config = Config.load('../var_config.yml', '../const_config.yml', num_generations=3,
+                                  num_households=10)
+        self.context = multiprocessing.get_context('fork')
+        self.processes = []
+
+    def tearDown(self):
+        for process in self.processes:
+            process.terminate()
+            process.join()
+
+    def run_sweep(self, coordinator, run, num_workers=3, heartbeat_interval=0.1):
+        coordinator.bind()
+        for _ in range(num_workers):
+            process = self.context.Process(target=serve,
+                                           args=(coordinator, run, heartbeat_interval),
+                                           daemon=True)
+            process.start()
+            self.processes.append(process)
+        return coordinator.run(timeout=60)
+
+    def test_sweep_jobs(self):
+        jobs = sweep_jobs(self.config, range(3), [{}, {'growth_rate': 0.05}])
+        assert [job.job_id for job in jobs] == list(range(6))
+        assert [job.seed for job in jobs] == [0, 1, 2, 0, 1, 2]
+        assert jobs[4].config['growth_rate'] == 0.05
+        assert Config.from_dicts(jobs[0].config) == self.config
+
+    def test_runs_every_job(self):
+        jobs = sweep_jobs(self.config, range(8))
+        results = self.run_sweep(Coordinator(jobs), echo)
+        assert sorted(results) == list(range(8))
+        assert all(results[job.job_id]['seed'] == job.seed for job in jobs)
+        # Workers stop once the sweep is over. Workers that start after the
+        # coordinator has finished cannot connect and exit with an error.
+        for process in self.processes:
+            process.join(10)
+            assert process.exitcode is not None
+
+    def test_retries_lost_workers(self):
+        jobs = sweep_jobs(self.config, range(2))
+        coordinator = Coordinator(jobs)
+        results = self.run_sweep(coordinator, crash_first_attempt, num_workers=4)
+        assert sorted(results) == [0, 1]
+        assert coordinator.attempts == {0: 2, 1: 2}
+
+    def test_retries_after_heartbeat_timeout(self):
+        jobs = sweep_jobs(self.config, range(2))
+        coordinator = Coordinator(jobs, heartbeat_timeout=0.5)
+        results = self.run_sweep(coordinator, stall_first_attempt, num_workers=4,
+                                 heartbeat_interval=None)
+        assert sorted(results) == [0, 1]
+        assert coordinator.attempts == {0: 2, 1: 2}
+
+    def test_gives_up_after_max_attempts(self):
+        jobs = sweep_jobs(self.config, range(1))
+        coordinator = Coordinator(jobs, max_attempts=2)
+        results = self.run_sweep(coordinator, crash, num_workers=3)
+        assert results == {} and 0 in coordinator.failures
+
+    def test_records_job_errors(self):
+        jobs = sweep_jobs(self.config, range(4))
+        coordinator = Coordinator(jobs)
+        results = self.run_sweep(coordinator, fail_odd_seeds, num_workers=2)
+        assert sorted(results) == [0, 2]
+        assert sorted(coordinator.failures) == [1, 3]
+        assert 'odd seed' in coordinator.failures[1]
+
+    def test_simulation_jobs_are_reproducible(self):
+        jobs = sweep_jobs(self.config, [5, 5])
+        results = self.run_sweep(Coordinator(jobs), run_job, num_workers=2)
+        expected = run_job(dict(jobs[0]._asdict(), attempt=0))
+        assert results[0] == results[1] == expected
+        assert expected['generation'] == 3
+
+    def test_job_config_selects_engine(self):
+        jobs = sweep_jobs(self.config, [5], [{}, {'array_engine': 1}])
+        engines = [kernels.default_engine(Config.from_dicts(job.config)) for job in jobs]
+        assert engines[0] is None and isinstance(engines[1], kernels.ArrayEngine)
+        for job in jobs:
+            summary = run_job(dict(job._asdict(), attempt=0))
+            assert json.loads(json.dumps(summary)) == summary
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+from unittest import TestCase, main
+import tempfile
+
+import numpy as np
+
+from simulation.config import Config
+from simulation.environment import Environment
+from simulation.simulation_driver import Simulation
+from simulation.synthetic import SyntheticNile, synthetic_maps
+from simulation import simulation_driver
+
+
+class SyntheticTest(TestCase):
+
+    def test_maps_match_setup_map(self):
+        river_map, fertility_map, shape = synthetic_maps((300, 200), seed=3)
+        assert shape == (300, 200)
+        assert river_map.shape == fertility_map.shape == shape
+        assert river_map.dtype == fertility_map.dtype == np.float32
+        assert set(np.unique(river_map)) == {0.0, 1.0}
+        assert fertility_map.min() == 0.0 and fertility_map.max() <= 1.0
+        assert not fertility_map[river_map == 1.0].any()
+
+    def test_seed_determines_valley(self):
+        first = synthetic_maps((120, 80), seed=7)
+        second = synthetic_maps((120, 80), seed=7)
+        other = synthetic_maps((120, 80), seed=8)
+        assert np.array_equal(first[0], second[0]) and np.array_equal(first[1], second[1])
+        assert not np.array_equal(first[0], other[0])
+
+    def test_single_meandering_river(self):
+        river_map, _, _ = synthetic_maps((400, 300), seed=1)
+        # Every row crosses the river exactly once.
+        starts = np.diff(river_map, axis=1) == 1.0
+        assert np.array_equal(starts.sum(axis=1), np.ones(400))
+        centres = np.array([np.flatnonzero(row).mean() for row in river_map])
+        assert centres.max() - centres.min() > 10
+
+    def test_fertility_decays_from_banks(self):
+        nile = SyntheticNile(seed=2)
+        _, fertility_map, _ = nile.generate((50, 400))
+        left, right = nile.banks(np.arange(50), 50, 400)
+        row = fertility_map[25]
+        land = np.flatnonzero(np.arange(400) > right[25])
+        assert np.all(np.diff(row[land]) <= 0)
+        assert row[land[0]] > row[land[-1]]
+
+    def test_memory_mapped_maps(self):
+        with tempfile.TemporaryDirectory() as directory:
+            river_map, fertility_map, shape = synthetic_maps((64, 32), seed=5,
+                                                             directory=directory)
+            in_memory = synthetic_maps((64, 32), seed=5)
+            assert isinstance(river_map, np.memmap)
+            assert np.array_equal(river_map, in_memory[0])
+            assert np.array_equal(np.load(directory + '/fertility_map.npy'), in_memory[1])
+            del river_map, fertility_map
+
+    def test_runs_in_environment(self):
+        config = Config.load('../var_config.yml', '../const_config.yml')
+        environment = Environment(*synthetic_maps((150, 100), seed=4), config)
+        households = simulation_driver.setup_households(environment, config)
+        for house in households:
+            assert environment.river_map[house.position[1], house.position[0]] == 0.0
+        simulation = Simulation(households, environment, 5)
+        simulation.run()
+        assert simulation.generation == 5
+
+
+if __name__ == '__main__':
+    main()